@@ -0,0 +1,296 @@
+"""Pickle-free bundle of a trained model and its vectorizer, loadable with NumPy only.
+
+Importing this module and loading a bundle does not import sklearn, so serving can
+start without unpickling sklearn objects.
+"""
+
+import json
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import typer
+from loguru import logger
+
+from model_training.config import MODELS_DIR, PROJ_ROOT, REPORTS_DIR
+from model_training.scoring import NaiveBayesScorer
+from model_training.string_table import decode_strings, encode_strings
+
+app = typer.Typer()
+
+BUNDLE_FORMAT = 1
+# Same as features.BOW_PATH, which is not imported because features imports sklearn
+BOW_PATH = MODELS_DIR / "c1_BoW_Sentiment_Model.pkl"
+
+# CountVectorizer settings the bundle tokenizer reproduces
+_SUPPORTED_VECTORIZER = {
+    "analyzer": "word",
+    "ngram_range": (1, 1),
+    "binary": False,
+    "strip_accents": None,
+    "stop_words": None,
+    "preprocessor": None,
+    "tokenizer": None,
+}
+
+
+def bundle_dir(version, models_dir=MODELS_DIR):
+    """Location of the bundle of a model version."""
+    return Path(models_dir) / version / f"{version}_bundle"
+
+
+def export_bundle(classifier, vectorizer, output_dir, version):
+    """
+    Writes a GaussianNB model and its CountVectorizer as a bundle.
+
+    The bundle is a directory of uncompressed .npy arrays plus a manifest.json: the
+    classes, class priors, per-class means and variances, and the vocabulary as a
+    sorted string table.
+
+    input:
+    - classifier: fitted GaussianNB
+    - vectorizer: fitted CountVectorizer with default tokenization
+    - output_dir: str, the bundle directory, replaced if it exists
+    - version: str, model version recorded in the manifest
+    output:
+    - output_dir: Path, the bundle directory
+    """
+    params = vectorizer.get_params()
+    unsupported = {
+        name: params.get(name)
+        for name, value in _SUPPORTED_VECTORIZER.items()
+        if params.get(name) != value
+    }
+    if unsupported or not hasattr(vectorizer, "vocabulary_"):
+        raise ValueError(
+            "Only fitted CountVectorizers with default tokenization can be bundled, "
+            f"got {type(vectorizer).__name__} with {unsupported}"
+        )
+
+    terms = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+    if terms != sorted(terms):
+        raise ValueError("Vectorizer columns are not in sorted vocabulary order")
+    if classifier.theta_.shape[1] != len(terms):
+        raise ValueError(
+            f"Model has {classifier.theta_.shape[1]} features but the vectorizer "
+            f"{len(terms)}"
+        )
+    terms_data, terms_offsets = encode_strings(terms)
+
+    output_dir = Path(output_dir)
+    if output_dir.exists():
+        shutil.rmtree(output_dir)
+    output_dir.mkdir(parents=True)
+
+    arrays = {
+        "classes": np.asarray(classifier.classes_),
+        "class_prior": classifier.class_prior_,
+        "theta": classifier.theta_,
+        "var": classifier.var_,
+        "terms_data": terms_data,
+        "terms_offsets": terms_offsets,
+    }
+    for name, array in arrays.items():
+        np.save(output_dir / f"{name}.npy", np.ascontiguousarray(array))
+
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "version": version,
+        "model": type(classifier).__name__,
+        "n_features": len(terms),
+        "lowercase": params["lowercase"],
+        "token_pattern": params["token_pattern"],
+        "arrays": sorted(arrays),
+    }
+    with open(output_dir / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"Exported bundle of {version} to {output_dir}")
+    return output_dir
+
+
+class Bundle:
+    """
+    A loaded bundle: vectorizes preprocessed reviews and predicts with NumPy only.
+
+    The arrays are memory-mapped, so processes loading the same bundle share one
+    page-cached copy.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / "manifest.json", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest["format"] != BUNDLE_FORMAT:
+            raise ValueError(
+                f"Unsupported bundle format {self.manifest['format']} in {self.path}"
+            )
+
+        arrays = {
+            name: np.load(self.path / f"{name}.npy", mmap_mode="r")
+            for name in self.manifest["arrays"]
+        }
+        self.classes = np.asarray(arrays["classes"])
+        self.terms_data = arrays["terms_data"]
+        self.terms_offsets = arrays["terms_offsets"]
+        self.scorer = NaiveBayesScorer(
+            self.classes, arrays["class_prior"], arrays["theta"], arrays["var"]
+        )
+        self._token_pattern = re.compile(self.manifest["token_pattern"])
+        self._index = None
+
+    @property
+    def version(self):
+        """Model version of the bundle."""
+        return self.manifest["version"]
+
+    @property
+    def index(self):
+        """Column of every vocabulary term, decoded from the string table once."""
+        if self._index is None:
+            terms = decode_strings(self.terms_data, self.terms_offsets)
+            self._index = {term: column for column, term in enumerate(terms)}
+        return self._index
+
+    def transform(self, corpus):
+        """
+        Counts the vocabulary terms of preprocessed reviews, as CountVectorizer does.
+
+        input:
+        - corpus: list, preprocessed reviews
+        output:
+        - x: dense float64 array of term counts, one row per review
+        """
+        index = self.index
+        rows, columns = [], []
+        for row, text in enumerate(corpus):
+            if self.manifest["lowercase"]:
+                text = text.lower()
+            for token in self._token_pattern.findall(text):
+                column = index.get(token)
+                if column is not None:
+                    rows.append(row)
+                    columns.append(column)
+
+        x = np.zeros((len(corpus), self.manifest["n_features"]))
+        np.add.at(x, (rows, columns), 1)
+        return x
+
+    def predict(self, x):
+        """Return the predicted class of every row of a feature matrix."""
+        return self.scorer.predict(x)
+
+    def predict_proba(self, x):
+        """Return the class probabilities of every row of a feature matrix."""
+        return self.scorer.predict_proba(x)
+
+    def predict_texts(self, corpus):
+        """Return the predicted class of every preprocessed review."""
+        return self.predict(self.transform(corpus))
+
+
+def load_bundle(path):
+    """Loads a bundle written by export_bundle."""
+    return Bundle(path)
+
+
+_JOBLIB_LOAD = """
+import pickle, sys, time
+start = time.perf_counter()
+import joblib
+model = joblib.load(sys.argv[1])
+with open(sys.argv[2], "rb") as f:
+    vectorizer = pickle.load(f)
+print(time.perf_counter() - start)
+"""
+
+_BUNDLE_LOAD = """
+import sys, time
+start = time.perf_counter()
+from model_training.bundle import load_bundle
+bundle = load_bundle(sys.argv[1])
+bundle.index
+print(time.perf_counter() - start)
+"""
+
+
+def _cold_load_seconds(script, args, repeats):
+    """Run a load script in fresh interpreters and return the measured times."""
+    times = []
+    for _ in range(repeats):
+        result = subprocess.run(
+            [sys.executable, "-c", script, *map(str, args)],
+            capture_output=True,
+            check=True,
+            text=True,
+            cwd=PROJ_ROOT,
+        )
+        times.append(float(result.stdout.strip().splitlines()[-1]))
+    return times
+
+
+def benchmark_cold_load(model_path, bow_path, path, repeats=5):
+    """
+    Compares the cold load time of the joblib/pickle artifacts and of the bundle.
+
+    Every load runs in a fresh Python process and includes the imports it needs.
+
+    input:
+    - model_path: str, the joblib model file
+    - bow_path: str, the pickled vectorizer
+    - path: str, the bundle directory
+    - repeats: int, number of fresh processes per format
+    output:
+    - results: dict, per format the median and all load times in seconds
+    """
+    results = {
+        "joblib": _cold_load_seconds(_JOBLIB_LOAD, [model_path, bow_path], repeats),
+        "bundle": _cold_load_seconds(_BUNDLE_LOAD, [path], repeats),
+    }
+    return {
+        name: {"median_seconds": statistics.median(times), "seconds": times}
+        for name, times in results.items()
+    }
+
+
+@app.command("export")
+def export_command(
+    version: str = typer.Option(..., help="Model version name (e.g., v1.0.0)"),
+    bow_path: Path = BOW_PATH,
+):
+    """Export a trained model version and the BoW vectorizer as a bundle."""
+    # pylint: disable-next=import-outside-toplevel
+    from model_training.registry import default_registry
+
+    classifier, vectorizer = default_registry().load(version, bow_path)
+    export_bundle(classifier, vectorizer, bundle_dir(version), version)
+
+
+@app.command("bench")
+def bench_command(
+    version: str = typer.Option(..., help="Model version name (e.g., v1.0.0)"),
+    bow_path: Path = BOW_PATH,
+    repeats: int = typer.Option(5, help="Fresh processes per format"),
+    output_path: Path = REPORTS_DIR / "bundle_load_benchmark.json",
+):
+    """Benchmark the cold load time of the bundle against joblib and pickle."""
+    # pylint: disable-next=import-outside-toplevel
+    from model_training.registry import model_path as version_model_path
+
+    model_path = version_model_path(version)
+    results = benchmark_cold_load(model_path, bow_path, bundle_dir(version), repeats)
+    for name, result in results.items():
+        logger.info(
+            f"{name}: {result['median_seconds'] * 1000:.1f} ms median cold load"
+        )
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    logger.info(f"Benchmark saved to {output_path}")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,157 @@
+"""Evaluate many model versions on one shared test set, with significance tests."""
+
+import itertools
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import joblib
+import numpy as np
+import typer
+from loguru import logger
+from scipy import sparse as sp
+
+from model_training.config import MODELS_DIR, PROCESSED_DATA_DIR, REPORTS_DIR
+from model_training.evaluate import predict_in_blocks
+from model_training.features import load_features
+from model_training.metrics import binary_metrics, confusion_counts, mcnemar_test
+from model_training.registry import model_path
+
+app = typer.Typer()
+
+# Test features opened once per pool worker, see _init_worker
+_WORKER_FEATURES = None
+
+_CSR_ARRAYS = ("data", "indices", "indptr")
+
+
+def share_sparse(x, directory):
+    """Saves the arrays of a CSR matrix as .npy files that workers can memory-map."""
+    for name in _CSR_ARRAYS:
+        np.save(Path(directory) / f"{name}.npy", getattr(x, name))
+
+
+def _init_worker(features_path, shape=None):
+    """
+    Memory-map the test features once per pool worker.
+
+    input:
+    - features_path: str, a .npy file, or with shape the directory of share_sparse
+    - shape: tuple, shape of the shared CSR matrix
+    """
+    global _WORKER_FEATURES  # pylint: disable=global-statement
+    if shape is None:
+        _WORKER_FEATURES = load_features(features_path, mmap_mode="r")
+        return
+    arrays = [
+        np.load(Path(features_path) / f"{name}.npy", mmap_mode="r")
+        for name in _CSR_ARRAYS
+    ]
+    _WORKER_FEATURES = sp.csr_matrix(tuple(arrays), shape=shape, copy=False)
+
+
+def _predict_model(path):
+    """Predict the shared test set with one model file inside a pool worker."""
+    classifier = joblib.load(path)
+    return predict_in_blocks(classifier, _WORKER_FEATURES), classifier.classes_
+
+
+def compare_predictions(y_test, predictions, labels):
+    """
+    Builds the metrics table and the pairwise McNemar tests of many versions.
+
+    input:
+    - y_test: array, true test labels
+    - predictions: dict, the predicted labels of the test set by version
+    - labels: sorted array of the labels
+    output:
+    - comparison: dict with the metrics of every version and one McNemar test per
+      pair of versions
+    """
+    y_test = np.asarray(y_test)
+    correct = {version: y_pred == y_test for version, y_pred in predictions.items()}
+    table = {
+        version: binary_metrics(confusion_counts(y_test, y_pred, labels))
+        for version, y_pred in predictions.items()
+    }
+    pairwise = [
+        {"a": a, "b": b, **mcnemar_test(correct[a], correct[b])}
+        for a, b in itertools.combinations(predictions, 2)
+    ]
+    return {"rows": len(y_test), "metrics": table, "pairwise": pairwise}
+
+
+def compare_versions(versions, features_path, labels_path, workers=1, models_dir=None):
+    """
+    Scores every version on the same test set, one version per worker process.
+
+    The workers memory-map the test features, so the set is loaded once into the
+    page cache however many versions are scored. A sparse .npz file is loaded once and
+    its CSR arrays are shared with the workers as memory-mapped .npy files.
+
+    input:
+    - versions: list, model versions in models_dir
+    - features_path: str, the test features, .npy or .npz
+    - labels_path: str, the test labels
+    - workers: int, number of worker processes to use
+    - models_dir: str, directory with one subdirectory per version
+    output:
+    - comparison: dict from compare_predictions
+    """
+    # Resolve every version up front, so unknown versions fail before any scoring
+    paths = [model_path(v, models_dir or MODELS_DIR) for v in versions]
+    missing = [v for v, path in zip(versions, paths) if not path.exists()]
+    if missing:
+        raise KeyError(f"Model versions {missing} not found in {paths[0].parents[1]}")
+
+    y_test = np.load(labels_path)
+    with tempfile.TemporaryDirectory() as shared_dir:
+        initargs = (features_path, None)
+        if Path(features_path).suffix == ".npz":
+            x_test = load_features(features_path)
+            share_sparse(x_test, shared_dir)
+            initargs = (shared_dir, x_test.shape)
+            del x_test
+
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(versions)),
+            initializer=_init_worker,
+            initargs=initargs,
+        ) as pool:
+            results = list(pool.map(_predict_model, paths))
+
+    predictions = {version: y_pred for version, (y_pred, _) in zip(versions, results)}
+    labels = np.unique(np.concatenate([classes for _, classes in results]))
+    return compare_predictions(y_test, predictions, labels)
+
+
+@app.command()
+def main(
+    versions: list[str] = typer.Argument(..., help="Model versions to compare"),
+    features_path: Path = PROCESSED_DATA_DIR / "features_test.npy",
+    labels_path: Path = PROCESSED_DATA_DIR / "labels_test.npy",
+    workers: int = typer.Option(os.cpu_count(), help="Number of worker processes"),
+    output_path: Path = REPORTS_DIR / "version_comparison.json",
+):
+    """CLI entry point for comparing model versions on the shared test set."""
+    comparison = compare_versions(versions, features_path, labels_path, workers)
+    for version, metrics in comparison["metrics"].items():
+        logger.info(
+            f"{version}: accuracy {metrics['accuracy']:.4f}, f1 {metrics['f1']:.4f}"
+        )
+    for test in comparison["pairwise"]:
+        logger.info(
+            f"{test['a']} vs {test['b']}: McNemar p = {test['p_value']:.4g} "
+            f"({test['only_a_correct']} rows only {test['a']} got right, "
+            f"{test['only_b_correct']} only {test['b']})"
+        )
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(comparison, f, indent=2)
+    logger.info(f"Comparison saved to {output_path}")
+
+
+if __name__ == "__main__":
+    app()
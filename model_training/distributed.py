@@ -0,0 +1,172 @@
+"""Map-reduce training of Gaussian Naive Bayes over shards of the training features."""
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import joblib
+import numpy as np
+import typer
+from loguru import logger
+
+from model_training.config import PROCESSED_DATA_DIR
+from model_training.ensure_versioning import Ensurance
+from model_training.features import load_features
+from model_training.naive_bayes import (
+    class_statistics,
+    empty_statistics,
+    load_statistics,
+    merge_statistics,
+    save_statistics,
+    to_gaussian_nb,
+)
+from model_training.registry import model_path as version_model_path
+from model_training.train import save_test_split, split_index
+
+app = typer.Typer()
+
+SHARD_STATS_DIR = PROCESSED_DATA_DIR / "shard_stats"
+
+
+def shard_stats_path(stats_dir, shard_index, num_shards):
+    """Location of the statistics of one shard."""
+    return Path(stats_dir) / f"shard_{shard_index:05d}_of_{num_shards:05d}.npz"
+
+
+# pylint: disable=too-many-arguments, too-many-positional-arguments
+def fit_shard(
+    features_path,
+    labels_path,
+    shard_index,
+    num_shards,
+    stats_dir=SHARD_STATS_DIR,
+    block_size=2048,
+):
+    """
+    Computes the per-class statistics of one shard of the training rows.
+
+    The rows are split as train.py splits them, and the training rows are divided into
+    num_shards contiguous ranges of the feature file, so every worker reads its own
+    part of the memory-mapped file.
+
+    input:
+    - features_path: str, the training features, .npy or .npz
+    - labels_path: str, the training labels
+    - shard_index: int, the shard to fit, from 0 to num_shards - 1
+    - num_shards: int, total number of shards
+    - stats_dir: str, where to write the shard statistics
+    - block_size: int, number of rows read at once
+    output:
+    - path: Path, where the shard statistics were written
+    """
+    x = load_features(features_path, mmap_mode="r")
+    y = np.load(labels_path)
+    train_index, _ = split_index(len(y))
+    classes = np.unique(y[train_index])
+    rows = np.array_split(np.sort(train_index), num_shards)[shard_index]
+
+    stats = empty_statistics(classes, x.shape[1])
+    for start in range(0, len(rows), block_size):
+        block_rows = rows[start : start + block_size]
+        stats = merge_statistics(
+            stats, class_statistics(x[block_rows], y[block_rows], classes, block_size)
+        )
+
+    path = shard_stats_path(stats_dir, shard_index, num_shards)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    save_statistics(path, stats)
+    logger.info(f"Fitted shard {shard_index + 1}/{num_shards} ({len(rows)} rows)")
+    return path
+
+
+def reduce_shards(stats_dir=SHARD_STATS_DIR, var_smoothing=1e-9):
+    """
+    Merges the statistics of all shards into one Gaussian Naive Bayes model.
+
+    input:
+    - stats_dir: str, directory with the statistics written by fit_shard
+    - var_smoothing: float, the var_smoothing of the model
+    output:
+    - classifier: GaussianNB, equal to a fit on all training rows
+    """
+    paths = sorted(Path(stats_dir).glob("shard_*_of_*.npz"))
+    if not paths:
+        raise FileNotFoundError(f"No shard statistics found in {stats_dir}")
+    num_shards = {int(path.stem.rsplit("_", 1)[1]) for path in paths}
+    if num_shards != {len(paths)}:
+        raise ValueError(
+            f"Found {len(paths)} shard statistics in {stats_dir}, expected "
+            f"{sorted(num_shards)}"
+        )
+
+    stats = load_statistics(paths[0])
+    for path in paths[1:]:
+        stats = merge_statistics(stats, load_statistics(path))
+    logger.info(f"Merged the statistics of {len(paths)} shards")
+    return to_gaussian_nb(stats, var_smoothing)
+
+
+def _fit_shard_job(args):
+    """Run fit_shard with a tuple of arguments inside a pool worker."""
+    return fit_shard(*args)
+
+
+@app.command("fit-shard")
+def fit_shard_command(
+    shard_index: int,
+    num_shards: int,
+    features_path: Path = PROCESSED_DATA_DIR / "features_train.npy",
+    labels_path: Path = PROCESSED_DATA_DIR / "labels_train.npy",
+    stats_dir: Path = SHARD_STATS_DIR,
+):
+    """Map step: fit one shard, e.g. on a node that shares the filesystem."""
+    fit_shard(features_path, labels_path, shard_index, num_shards, stats_dir)
+
+
+@app.command("reduce")
+def reduce_command(
+    version: str = None,
+    features_path: Path = PROCESSED_DATA_DIR / "features_train.npy",
+    labels_path: Path = PROCESSED_DATA_DIR / "labels_train.npy",
+    stats_dir: Path = SHARD_STATS_DIR,
+):
+    """Reduce step: merge the shard statistics and save the model and test split."""
+    version = version or Ensurance().return_version()
+    classifier = reduce_shards(stats_dir)
+
+    model_path = version_model_path(version)
+    model_path.parent.mkdir(parents=True, exist_ok=True)
+    joblib.dump(classifier, model_path)
+    logger.info(f"Model saved to {model_path}")
+
+    save_test_split(features_path, labels_path)
+
+
+@app.command("run")
+def run_command(
+    version: str = None,
+    workers: int = typer.Option(4, help="Number of local worker processes"),
+    features_path: Path = PROCESSED_DATA_DIR / "features_train.npy",
+    labels_path: Path = PROCESSED_DATA_DIR / "labels_train.npy",
+    stats_dir: Path = SHARD_STATS_DIR,
+):
+    """Run the map step in local worker processes, one shard each, then reduce."""
+    start = time.perf_counter()
+    for path in Path(stats_dir).glob("shard_*_of_*.npz"):
+        path.unlink()
+    jobs = [
+        (features_path, labels_path, shard_index, workers, stats_dir)
+        for shard_index in range(workers)
+    ]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(_fit_shard_job, jobs))
+    logger.info(
+        f"Map step with {workers} workers took {time.perf_counter() - start:.2f}s"
+    )
+
+    reduce_command(version, features_path, labels_path, stats_dir)
+    logger.info(f"Distributed training took {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    app()
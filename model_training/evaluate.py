@@ -4,99 +4,414 @@ from pathlib import Path
 
 import json
 import os
-import joblib
 import numpy as np
 import typer
 
 
 from loguru import logger
-from sklearn.metrics import accuracy_score, classification_report, confusion_matrix, precision_score, recall_score, f1_score, roc_auc_score
+from scipy import sparse as sp
+from sklearn.naive_bayes import GaussianNB
 
-from model_training.config import MODELS_DIR, PROCESSED_DATA_DIR, REPORTS_DIR
+from model_training.config import PROCESSED_DATA_DIR, REPORTS_DIR
+from model_training.feature_store import FeatureStore
+from model_training.features import (
+    BOW_PATH,
+    iter_row_blocks,
+    load_features,
+    load_texts,
+    text_paths,
+)
+from model_training.metrics import (
+    ConfusionAccumulator,
+    binary_metrics,
+    bootstrap_intervals,
+    classification_report_text,
+    curve_summary,
+    grouped_confusion,
+    per_class_metrics,
+    threshold_curves,
+)
+from model_training.registry import default_registry, metrics_path
+from model_training.scoring import NaiveBayesScorer
 
 app = typer.Typer()
 
 
-def save_confusion_matrix(y_true, y_pred, output_path):
+def save_confusion_matrix(cm, output_path):
     """
     Save confusion matrix of classifier on test data.
 
     input:
-    - y_true: array-like, true labels
-    - y_pred: array-like, predicted labels
+    - cm: array, confusion matrix with the true labels as rows
     - output_path: str, where to store the confusion matrix
     """
-    cm = confusion_matrix(y_true, y_pred)
     np.save(output_path, cm)
     logger.info(f"Confusion matrix saved to {output_path}")
 
 
-def save_classification_report(y_true, y_pred, output_path):
+def save_classification_report(cm, labels, output_path):
     """
     Save classification report to file.
 
     input:
-    - y_true: array-like, true labels
-    - y_pred: array-like, predicted labels
+    - cm: array, confusion matrix with the true labels as rows
+    - labels: array, the label of every row of the confusion matrix
     - output_path: str, where to store the classification report
     """
-    report = classification_report(y_true, y_pred)
+    report = classification_report_text(cm, labels)
     with open(output_path, "w", encoding="utf-8") as f:
         f.write(report)
     logger.info(f"Classification report saved to {output_path}")
 
 
-def evaluate_model(version, classifier, x_test, y_test):
+def as_scorer(classifier):
+    """
+    Returns the model used to score a classifier.
+
+    A GaussianNB is turned into a NaiveBayesScorer, whose per-class terms are computed
+    here once; callers scoring many blocks pass the result on instead of the
+    classifier. Any other model, or a scorer, is returned unchanged.
+    """
+    if isinstance(classifier, GaussianNB):
+        return NaiveBayesScorer.from_classifier(classifier)
+    return classifier
+
+
+def predict_in_blocks(classifier, x, block_size=2048):
+    """
+    Predict labels block by block, so sparse features are never fully densified.
+
+    GaussianNB models are scored with the sparse NaiveBayesScorer, which skips zero
+    counts and gives the same predictions as classifier.predict.
+
+    input:
+    - classifier: trained model, or its scorer from as_scorer
+    - x: array-like or sparse matrix, features
+    - block_size: int, number of rows predicted at once
+    output:
+    - y_pred: array, predicted labels
+    """
+    scorer = as_scorer(classifier)
+    if isinstance(scorer, NaiveBayesScorer):
+        return np.concatenate(
+            [
+                scorer.predict(sp.csr_matrix(x[start : start + block_size]))
+                for start in range(0, x.shape[0], block_size)
+            ]
+        )
+    return np.concatenate(
+        [classifier.predict(block) for block in iter_row_blocks(x, block_size)]
+    )
+
+
+def predict_proba_in_blocks(classifier, x, block_size=2048):
+    """
+    Predict class probabilities block by block, like predict_in_blocks.
+
+    input:
+    - classifier: trained model with predict_proba, or its scorer from as_scorer
+    - x: array-like or sparse matrix, features
+    - block_size: int, number of rows predicted at once
+    output:
+    - proba: array of shape (n_rows, n_classes), in the order of classifier.classes_
+    """
+    scorer = as_scorer(classifier)
+    if isinstance(scorer, NaiveBayesScorer):
+        return np.concatenate(
+            [
+                scorer.predict_proba(sp.csr_matrix(x[start : start + block_size]))
+                for start in range(0, x.shape[0], block_size)
+            ]
+        )
+    return np.concatenate(
+        [classifier.predict_proba(block) for block in iter_row_blocks(x, block_size)]
+    )
+
+
+def save_threshold_curves(curves, version):
+    """
+    Save the ROC and precision/recall curves next to the confusion matrix.
+
+    input:
+    - curves: dict from metrics.threshold_curves
+    - version: str, model version name
+    output:
+    - paths: tuple of the ROC and PR curve files
+    """
+    # Rows: threshold, fpr, tpr
+    roc_path = REPORTS_DIR / f"{version}_roc_curve.npy"
+    np.save(roc_path, np.stack([curves[k] for k in ("threshold", "fpr", "tpr")]))
+    # Rows: threshold, precision, recall, f1
+    pr_path = REPORTS_DIR / f"{version}_pr_curve.npy"
+    np.save(
+        pr_path,
+        np.stack([curves[k] for k in ("threshold", "precision", "recall", "f1")]),
+    )
+    logger.info(f"Threshold curves saved to {roc_path} and {pr_path}")
+    return roc_path, pr_path
+
+
+# Upper bounds (exclusive) of the review length buckets, in tokens
+LENGTH_EDGES = (4, 8, 16, 32)
+# Upper bounds (exclusive) of the buckets of the share of out-of-vocabulary tokens
+COVERAGE_EDGES = (0.1, 0.25, 0.5)
+# Scores reported per slice bucket next to the accuracy
+SCORES = ("precision", "recall", "f1")
+
+
+def bucket_slice(values, edges, unit=""):
+    """
+    Assigns every row to a bucket of a numeric value.
+
+    input:
+    - values: array, the value of every row
+    - edges: increasing bucket bounds, each the exclusive upper bound of a bucket
+    - unit: str, appended to the bounds in the bucket names
+    output:
+    - slice: tuple of the integer bucket code of every row and the bucket names
+    """
+    bounds = [f"{edge:g}{unit}" for edge in edges]
+    names = [f"<{bounds[0]}"]
+    names += [f"{low}-{high}" for low, high in zip(bounds, bounds[1:])]
+    names += [f">={bounds[-1]}"]
+    return np.digitize(values, edges), names
+
+
+def label_slice(y, labels):
+    """Slice of the rows by their true label."""
+    return np.searchsorted(labels, y), [str(label) for label in labels]
+
+
+def review_slices(x, corpus=None, analyzer=None):
+    """
+    Computes the length and vocabulary coverage slices of the test reviews once.
+
+    Without the preprocessed reviews, the length is the number of vocabulary tokens,
+    taken from the feature row sums, and there is no coverage slice.
+
+    input:
+    - x: array-like or sparse matrix, the term counts of the test reviews
+    - corpus: list, the preprocessed test reviews, aligned with the rows of x
+    - analyzer: function splitting a review into tokens, as the vectorizer does
+    output:
+    - slices: dict, per slice name the bucket code of every row and the bucket names
+    """
+    row_sums = [block.sum(axis=1) for block in iter_row_blocks(x, 4096)]
+    in_vocabulary = np.concatenate(row_sums) if row_sums else np.zeros(0)
+    if corpus is None:
+        return {"vocabulary tokens": bucket_slice(in_vocabulary, LENGTH_EDGES)}
+
+    tokens = np.fromiter((len(analyzer(text)) for text in corpus), np.int64)
+    out_of_vocabulary = np.divide(
+        tokens - in_vocabulary,
+        tokens,
+        out=np.zeros(len(tokens)),
+        where=tokens > 0,
+    )
+    return {
+        "length": bucket_slice(tokens, LENGTH_EDGES),
+        "out of vocabulary": bucket_slice(
+            out_of_vocabulary * 100, [edge * 100 for edge in COVERAGE_EDGES], "%"
+        ),
+    }
+
+
+def cross_slices(first, second):
+    """Combines two slices into one with a bucket per pair of buckets."""
+    (first_codes, first_names), (second_codes, second_names) = first, second
+    names = [f"{a} & {b}" for a in first_names for b in second_names]
+    return first_codes * len(second_names) + second_codes, names
+
+
+def slice_report(slice_cms, slices, labels=None):
+    """
+    Derives the metrics of every bucket of every slice.
+
+    Precision, recall and F1 are those of the positive class, except in buckets whose
+    rows all have the same true label, such as the label slices and the label half of
+    their crossed slices. There they are the scores of that label, since the positive
+    class scores of a bucket without positive rows are always 0.
+
+    input:
+    - slice_cms: dict, per slice name the confusion matrix of every bucket
+    - slices: dict, per slice name the codes and bucket names
+    - labels: sorted array of the labels, to name the class of single-label buckets
+    output:
+    - rows: list of dicts with the slice, bucket, number of rows, accuracy,
+      precision, recall and f1, for every non-empty bucket, and the class the scores
+      are of
+    """
+    rows = []
+    for name, cms in slice_cms.items():
+        metrics = binary_metrics(cms)
+        per_class = per_class_metrics(cms)
+        support = cms.sum(axis=2)
+        for bucket, bucket_name in enumerate(slices[name][1]):
+            if not support[bucket].any():
+                continue
+            present = np.flatnonzero(support[bucket])
+            if len(present) == 1:
+                index = present[0]
+                scores = {metric: per_class[metric][bucket, index] for metric in SCORES}
+            else:
+                index = cms.shape[-1] - 1
+                scores = {metric: metrics[metric][bucket] for metric in SCORES}
+            rows.append(
+                {
+                    "slice": name,
+                    "bucket": bucket_name,
+                    "rows": int(support[bucket].sum()),
+                    "class": str(labels[index]) if labels is not None else int(index),
+                    "accuracy": float(metrics["accuracy"][bucket]),
+                    **{metric: float(value) for metric, value in scores.items()},
+                }
+            )
+    return rows
+
+
+# pylint: disable=too-many-arguments, too-many-positional-arguments
+def score_blocks(
+    classifier, x_test, y_test, block_size=2048, curves=False, slices=None
+):
+    """
+    Predicts the test set block by block and accumulates its confusion matrices.
+
+    input:
+    - classifier: trained model
+    - x_test: array-like or sparse matrix, test features
+    - y_test: array-like, true test labels
+    - block_size: int, number of rows predicted at once
+    - curves: bool, also keep the predicted probability of the positive class
+    - slices: dict, per slice name the bucket code of every row and the bucket names
+    output:
+    - accumulator: ConfusionAccumulator of the whole test set
+    - scores: array, positive class probabilities, or None without curves
+    - slice_cms: dict, per slice name the confusion matrix of every bucket
+    """
+    slices = slices or {}
+    labels = classifier.classes_
+    # The per-class terms of the scorer are computed once for all blocks
+    scorer = as_scorer(classifier)
+    accumulator = ConfusionAccumulator(labels)
+    scores = []
+    slice_cms = {
+        name: np.zeros((len(names), len(labels), len(labels)), dtype=np.int64)
+        for name, (_, names) in slices.items()
+    }
+    for start in range(0, x_test.shape[0], block_size):
+        stop = start + block_size
+        if curves:
+            proba = predict_proba_in_blocks(scorer, x_test[start:stop])
+            y_pred = labels[np.argmax(proba, axis=1)]
+            scores.append(proba[:, -1])
+        else:
+            y_pred = predict_in_blocks(scorer, x_test[start:stop])
+        y_block = y_test[start:stop]
+        accumulator.update(y_block, y_pred)
+        for name, (codes, names) in slices.items():
+            slice_cms[name] += grouped_confusion(
+                codes[start:stop], len(names), y_block, y_pred, labels
+            )
+    return accumulator, np.concatenate(scores) if curves else None, slice_cms
+
+
+# pylint: disable=too-many-arguments, too-many-positional-arguments
+def evaluate_model(
+    version,
+    classifier,
+    x_test,
+    y_test,
+    block_size=2048,
+    curves=False,
+    bootstrap=0,
+    workers=1,
+    slices=None,
+):
     """
     Evaluate the trained model on test data.
 
+    The test set is predicted block by block and only the confusion matrix is kept,
+    so every metric and the report come from one pass over the labels.
+
     input:
     - version: str, model version name
     - classifier: trained model
-    - x_test: array-like, test features
+    - x_test: array-like or sparse matrix, test features
     - y_test: array-like, true test labels
+    - block_size: int, number of rows predicted at once
+    - curves: bool, also score the positive class with predict_proba and save the
+      ROC and precision/recall curves over every threshold
+    - bootstrap: int, number of bootstrap resamples of the test set for confidence
+      intervals, none if 0
+    - workers: int, number of processes drawing bootstrap resamples
+    - slices: dict, per slice name the bucket code of every row and the bucket names;
+      the metrics of every bucket are saved to reports/<version>_slices.json
     """
-    # Predict
-    y_pred = classifier.predict(x_test)
+    # Predict and count (true, predicted) pairs block by block
+    accumulator, scores, slice_cms = score_blocks(
+        classifier, x_test, y_test, block_size, curves, slices
+    )
+    cm = accumulator.matrix
 
     # Save confusion matrix and classification report
     cm_path = REPORTS_DIR / f"{version}_confusion_matrix.npy"
     report_path = REPORTS_DIR / f"{version}_classification_report.txt"
-    save_confusion_matrix(y_test, y_pred, cm_path)
-    save_classification_report(y_test, y_pred, report_path)
+    save_confusion_matrix(cm, cm_path)
+    save_classification_report(cm, accumulator.labels, report_path)
+
+    # Derive every metric from the confusion matrix
+    metrics = binary_metrics(cm)
 
     # Log accuracy: Correct predictions / total predictions
-    accuracy = accuracy_score(y_test, y_pred)
-    logger.info(f"Accuracy: {accuracy:.4f}")
+    logger.info(f"Accuracy: {metrics['accuracy']:.4f}")
 
     # Log precision: Of all predicted positives, how many were actually positive
-    precision = precision_score(y_test, y_pred)
-    logger.info(f"Precision: {precision:.4f}")
+    logger.info(f"Precision: {metrics['precision']:.4f}")
 
     # Log recall: Of all actual positives, how many did the model correctly predict
-    recall = recall_score(y_test, y_pred)
-    logger.info(f"Recall: {recall:.4f}")
+    logger.info(f"Recall: {metrics['recall']:.4f}")
 
     # Log F1: Harmonic mean of precision and recall, balances false positives & negatives
-    f1 = f1_score(y_test, y_pred)
-    logger.info(f"F1: {f1:.4f}")
+    logger.info(f"F1: {metrics['f1']:.4f}")
+
+    # Sweep every threshold of the positive class probability in one sorted pass
+    if curves:
+        sweep = threshold_curves(y_test, scores, pos_label=classifier.classes_[-1])
+        save_threshold_curves(sweep, version)
+        metrics.update(curve_summary(sweep))
+        logger.info(
+            f"Best threshold by F1: {metrics['best threshold']:.4f} "
+            f"(F1 {metrics['best threshold f1']:.4f})"
+        )
 
     # Log AUC-ROC: Measures separability between classes
-    roc_auc = roc_auc_score(y_test, y_pred)
-    logger.info(f"AUC ROC: {roc_auc:.4f}")
-
-    # Store accuracy in JSON
-    metrics = {
-        "accuracy":accuracy,
-        "precision": precision,
-        "recall": recall,
-        "f1": f1,
-        "AUC ROC": roc_auc
-    }
+    logger.info(f"AUC ROC: {metrics['AUC ROC']:.4f}")
+
+    # 95% confidence intervals from bootstrap resamples of the confusion matrix
+    if bootstrap:
+        intervals = bootstrap_intervals(cm, bootstrap, workers=workers)
+        if curves:
+            # The AUC ROC of the probabilities is not a function of the matrix
+            del intervals["AUC ROC"]
+        metrics["bootstrap resamples"] = bootstrap
+        metrics["confidence intervals"] = intervals
+        for name, (low, high) in intervals.items():
+            logger.info(f"{name} 95% CI: [{low:.4f}, {high:.4f}]")
+
+    # Metrics of every bucket of every slice, from the grouped confusion matrices
+    if slices:
+        slices_path = REPORTS_DIR / f"{version}_slices.json"
+        with open(slices_path, "w", encoding="utf-8") as f:
+            json.dump(slice_report(slice_cms, slices, classifier.classes_), f, indent=2)
+        logger.info(f"Slice report saved to {slices_path}")
+
     # Make sure the directory exists
     os.makedirs("experiments", exist_ok=True)
     with open("experiments/metrics.json", "w") as f:
         json.dump(metrics, f)
+    # Keep the metrics of every version for the model registry
+    with open(metrics_path(version), "w", encoding="utf-8") as f:
+        json.dump(metrics, f, indent=2)
 
 
 @app.command()
@@ -104,24 +419,76 @@ def main(
     version: str = typer.Option(..., help="Model version name (e.g., v1.0.0)"),
     features_path: Path = PROCESSED_DATA_DIR / "features_test.npy",
     labels_path: Path = PROCESSED_DATA_DIR / "labels_test.npy",
+    store_dir: Path = typer.Option(None, help="Read the test set from a feature store"),
+    curves: bool = typer.Option(
+        False, help="Save ROC and PR curves and pick a threshold from probabilities"
+    ),
+    bootstrap: int = typer.Option(
+        0, help="Bootstrap resamples for 95% confidence intervals, 0 for none"
+    ),
+    workers: int = typer.Option(1, help="Processes drawing bootstrap resamples"),
+    slices: bool = typer.Option(
+        False, help="Save metrics per label, length and vocabulary coverage bucket"
+    ),
+    texts_path: Path = typer.Option(
+        None,
+        help="TSV with the preprocessed test reviews, for the slices; "
+        "texts_test.tsv next to the test features by default",
+    ),
+    bow_path: Path = BOW_PATH,
 ):
     """
     CLI entry point for evaluating the sentiment analysis model.
 
-    Loads test data and model, evaluates, and saves reports.
+    Loads test data and model, evaluates, and saves reports. The test features can be
+    a dense .npy array, a sparse .npz matrix or the memory-mapped features_test array
+    of a feature store.
     """
     # Load test data
-    logger.info(f"Loading test data from {features_path} and {labels_path}")
-    x_test = np.load(features_path)
-    y_test = np.load(labels_path)
+    if store_dir:
+        logger.info(f"Loading test data from feature store {store_dir}")
+        store = FeatureStore(store_dir)
+        x_test = store.load("features_test")
+        y_test = np.asarray(store.load("labels_test"))
+    else:
+        logger.info(f"Loading test data from {features_path} and {labels_path}")
+        x_test = load_features(features_path)
+        y_test = np.load(labels_path)
 
     # Load model
-    model_path = MODELS_DIR / version / f"{version}_Sentiment_Model.pkl"
-    logger.info(f"Loading model from {model_path}")
-    classifier = joblib.load(model_path)
+    classifier = default_registry().model(version)
+
+    # Compute the slice of every test row once, as integer codes
+    row_slices = None
+    if slices:
+        corpus = analyzer = None
+        default_texts = text_paths(store_dir or features_path.parent)[1]
+        if texts_path or default_texts.exists():
+            corpus = load_texts(texts_path or default_texts)
+            if len(corpus) != len(y_test):
+                if texts_path:
+                    raise ValueError(f"{texts_path} does not match the test features")
+                logger.warning(f"{default_texts} does not match the test features")
+                corpus = None
+        if corpus is not None:
+            analyzer = default_registry().vectorizer(bow_path).build_analyzer()
+        by_label = label_slice(y_test, classifier.classes_)
+        row_slices = {"label": by_label}
+        for name, review_slice in review_slices(x_test, corpus, analyzer).items():
+            row_slices[name] = review_slice
+            row_slices[f"label & {name}"] = cross_slices(by_label, review_slice)
 
     # Evaluate
-    evaluate_model(version, classifier, x_test, y_test)
+    evaluate_model(
+        version,
+        classifier,
+        x_test,
+        y_test,
+        curves=curves,
+        bootstrap=bootstrap,
+        workers=workers,
+        slices=row_slices,
+    )
 
 
 if __name__ == "__main__":
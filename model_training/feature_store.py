@@ -0,0 +1,203 @@
+"""Sharded feature store with memory-mapped loading for train/test arrays."""
+
+import json
+import shutil
+from pathlib import Path
+
+import numpy as np
+from loguru import logger
+from scipy import sparse as sp
+
+from model_training.config import PROCESSED_DATA_DIR
+
+FEATURE_STORE_DIR = PROCESSED_DATA_DIR / "feature_store"
+MANIFEST_NAME = "manifest.json"
+
+
+class ShardedArray:
+    """
+    Read-only array over the memory-mapped shards of a stored array.
+
+    Rows are selected by an integer, a slice or an integer or boolean index array, and
+    only the selected rows are read. Rows within one shard are returned as a zero-copy
+    memory-mapped view; other selections copy just the selected rows. Converting the
+    whole array with np.asarray copies every shard.
+    """
+
+    def __init__(self, shards, shape, dtype):
+        self.shards = shards
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.offsets = np.cumsum([0] + [shard.shape[0] for shard in shards])
+
+    @property
+    def ndim(self):
+        """Number of dimensions, as for a numpy array."""
+        return len(self.shape)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        rows = self._rows(0, self.shape[0])
+        return rows if dtype is None else rows.astype(dtype)
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            return self[key[0]][(slice(None),) + key[1:]]
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.shape[0])
+            if step == 1:
+                return self._rows(start, max(stop, start))
+            key = np.arange(start, stop, step)
+        if np.ndim(key) == 0:
+            row = int(key) + (self.shape[0] if key < 0 else 0)
+            if not 0 <= row < self.shape[0]:
+                raise IndexError(f"Row {key} out of range for {self.shape[0]} rows")
+            shard = np.searchsorted(self.offsets, row, side="right") - 1
+            return self.shards[shard][row - self.offsets[shard]]
+        return self._take(np.asarray(key))
+
+    def _rows(self, start, stop):
+        """Return the consecutive rows start:stop."""
+        parts = []
+        for shard, offset in zip(self.shards, self.offsets):
+            rows = shard.shape[0]
+            if offset < stop and start < offset + rows:
+                parts.append(shard[max(start - offset, 0) : min(stop - offset, rows)])
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return np.empty((0,) + self.shape[1:], dtype=self.dtype)
+        return np.concatenate(parts)
+
+    def _take(self, index):
+        """Return the rows in an index array, reading every shard at most once."""
+        if index.dtype == bool:
+            index = np.flatnonzero(index)
+        index = np.where(index < 0, index + self.shape[0], index)
+        if index.size and (index.min() < 0 or index.max() >= self.shape[0]):
+            raise IndexError(f"Row index out of range for {self.shape[0]} rows")
+
+        out = np.empty((len(index),) + self.shape[1:], dtype=self.dtype)
+        shard_of = np.searchsorted(self.offsets, index, side="right") - 1
+        for shard in np.unique(shard_of):
+            selected = shard_of == shard
+            out[selected] = self.shards[shard][index[selected] - self.offsets[shard]]
+        return out
+
+
+class FeatureStore:
+    """
+    Stores arrays as fixed-dtype .npy shards plus a manifest.
+
+    Shards are opened with memory mapping, so several processes reading the same
+    store share one page-cached copy instead of each loading the arrays into RAM.
+    """
+
+    def __init__(self, root=FEATURE_STORE_DIR):
+        self.root = Path(root)
+
+    @property
+    def manifest_path(self):
+        """Location of the manifest describing every stored array."""
+        return self.root / MANIFEST_NAME
+
+    def manifest(self):
+        """Return the manifest, an empty one if nothing was stored yet."""
+        if not self.manifest_path.exists():
+            return {"arrays": {}}
+        with open(self.manifest_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def names(self):
+        """Return the names of the stored arrays."""
+        return sorted(self.manifest()["arrays"])
+
+    def entry(self, name):
+        """Return the manifest entry of a stored array."""
+        arrays = self.manifest()["arrays"]
+        if name not in arrays:
+            raise KeyError(f"Array {name!r} not found in feature store {self.root}")
+        return arrays[name]
+
+    def write(self, name, x, shard_rows=65536, dtype=None):
+        """
+        Stores an array as shards of at most shard_rows rows.
+
+        input:
+        - name: str, name of the array, e.g. features_train
+        - x: array-like or sparse matrix, the array to store; sparse matrices are
+          densified one shard at a time
+        - shard_rows: int, maximum number of rows per shard
+        - dtype: numpy dtype of the shards, the dtype of x by default
+        output:
+        - entry: dict, the manifest entry of the stored array
+        """
+        dtype = np.dtype(dtype or x.dtype)
+        array_dir = self.root / name
+        if array_dir.exists():
+            shutil.rmtree(array_dir)
+        array_dir.mkdir(parents=True)
+
+        shards = []
+        for index, start in enumerate(range(0, max(x.shape[0], 1), shard_rows)):
+            block = x[start : start + shard_rows]
+            block = block.toarray() if sp.issparse(block) else np.asarray(block)
+            file_name = f"{name}/shard_{index:05d}.npy"
+            np.save(self.root / file_name, block.astype(dtype, copy=False))
+            shards.append({"file": file_name, "rows": int(block.shape[0])})
+
+        entry = {"dtype": dtype.str, "shape": list(x.shape), "shards": shards}
+        manifest = self.manifest()
+        manifest["arrays"][name] = entry
+        with open(self.manifest_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        logger.info(
+            f"Stored {name} {tuple(x.shape)} in {len(shards)} shards in {self.root}"
+        )
+        return entry
+
+    def iter_shards(self, name):
+        """
+        Iterates over the shards of an array as read-only memory maps.
+
+        input:
+        - name: str, name of the array
+        output:
+        - generator of memory-mapped arrays, in row order
+        """
+        for shard in self.entry(name)["shards"]:
+            yield np.load(self.root / shard["file"], mmap_mode="r")
+
+    def view(self, name, start=0, stop=None):
+        """
+        Returns rows start:stop of an array.
+
+        The result is a zero-copy memory-mapped view when the rows lie within one
+        shard, otherwise only the overlapping parts of the shards are copied together.
+
+        input:
+        - name: str, name of the array
+        - start: int, first row
+        - stop: int, row after the last one, the end of the array by default
+        output:
+        - x: array, the requested rows
+        """
+        return self.load(name)[start:stop]
+
+    def load(self, name):
+        """
+        Opens a whole array without reading it.
+
+        input:
+        - name: str, name of the array
+        output:
+        - x: the memory-mapped shard if there is only one, else a ShardedArray over
+          the memory-mapped shards
+        """
+        entry = self.entry(name)
+        shards = list(self.iter_shards(name))
+        if len(shards) == 1:
+            return shards[0]
+        return ShardedArray(shards, entry["shape"], entry["dtype"])
@@ -1,50 +1,351 @@
 """Feature extraction and data splitting utilities for model training."""
 
+import os
 import pickle
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
 import typer
 from loguru import logger
-from sklearn.feature_extraction.text import CountVectorizer
+from scipy import sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer
 from sklearn.model_selection import train_test_split
 
 from model_training.config import MODELS_DIR, PROCESSED_DATA_DIR
+from model_training.feature_store import FeatureStore
+from model_training.vocabulary import (
+    IncrementalVocabulary,
+    check_appended,
+    count_terms,
+    incremental_vectorizer,
+    load_vocabulary,
+    remap_columns,
+    save_vocabulary,
+)
 
 app = typer.Typer()
 
+# Default locations of the train/test splits, in the order returned by split_data
+SPLIT_PATHS = (
+    PROCESSED_DATA_DIR / "features_train.npy",
+    PROCESSED_DATA_DIR / "features_test.npy",
+    PROCESSED_DATA_DIR / "labels_train.npy",
+    PROCESSED_DATA_DIR / "labels_test.npy",
+)
+BOW_PATH = MODELS_DIR / "c1_BoW_Sentiment_Model.pkl"
+# Preprocessed reviews of the splits, saved next to their features
+TEXT_NAMES = ("texts_train.tsv", "texts_test.tsv")
 
-def transform_data(dataset, bow_output_path):
+FEATURIZERS = ("count", "hashing")
+
+# Unsigned dtypes tried by compact_counts, smallest first
+COUNT_DTYPES = (np.uint8, np.uint16, np.uint32)
+
+
+def build_vectorizer(featurizer="count", n_features=4096):
+    """
+    Creates the vectorizer of a feature mode.
+
+    input:
+    - featurizer: str, "count" for the 1420-term vocabulary or "hashing" for a
+      stateless HashingVectorizer that needs no fit
+    - n_features: int, number of hash buckets of the hashing featurizer
+    output:
+    - vectorizer: CountVectorizer or HashingVectorizer
+    """
+    if featurizer == "count":
+        return CountVectorizer(max_features=1420)
+    if featurizer == "hashing":
+        # Raw counts, so the features mean the same as the CountVectorizer ones
+        return HashingVectorizer(
+            n_features=n_features, alternate_sign=False, norm=None, dtype=np.int64
+        )
+    raise ValueError(
+        f"Unknown featurizer {featurizer!r}, expected one of {FEATURIZERS}"
+    )
+
+
+def check_vocab_state(featurizer, vocab_state):
+    """
+    Rejects a vocabulary state file for a feature mode without a vocabulary.
+
+    input:
+    - featurizer: str, the feature mode, see build_vectorizer
+    - vocab_state: str, the vocabulary state file, or None
+    """
+    if vocab_state is not None and featurizer != "count":
+        raise ValueError(
+            f"A vocabulary state only applies to the count featurizer, not to "
+            f"{featurizer!r}; drop --vocab-state or use --featurizer count"
+        )
+
+
+def hash_transform(vectorizer, corpus, workers=1, chunk_size=10000):
     """
-    Transforms the dataset into a bag-of-words representation using CountVectorizer.
+    Transforms a corpus with a HashingVectorizer, chunk by chunk.
+
+    The chunks are independent, so with workers > 1 they are transformed in a process
+    pool; the result keeps the original row order.
+
+    input:
+    - vectorizer: HashingVectorizer, the stateless vectorizer
+    - corpus: list, the preprocessed text data
+    - workers: int, number of worker processes to use
+    - chunk_size: int, number of documents transformed at once
+    output:
+    - x: CSR matrix, the transformed feature set
+    """
+    chunks = [
+        corpus[start : start + chunk_size]
+        for start in range(0, len(corpus), chunk_size)
+    ]
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(vectorizer.transform, chunks))
+    else:
+        parts = [vectorizer.transform(chunk) for chunk in chunks]
+    return sp.vstack(parts, format="csr")
+
+
+def compact_counts(x, dtype="auto"):
+    """
+    Casts a count matrix to a compact integer dtype.
+
+    input:
+    - x: array-like or sparse matrix, non-negative integer counts
+    - dtype: str, "auto" for the smallest unsigned dtype that holds the largest
+      count, or an explicit dtype such as "uint8", "uint16" or "int64"
+    output:
+    - x: array-like or sparse matrix, the counts with the selected dtype
+    """
+    values = x.data if sp.issparse(x) else np.asarray(x)
+    max_count = int(values.max()) if values.size else 0
+    if values.size and values.min() < 0:
+        raise ValueError("Count features must be non-negative")
+
+    if dtype == "auto":
+        fitting = [t for t in COUNT_DTYPES if max_count <= np.iinfo(t).max]
+        target = np.dtype(fitting[0] if fitting else np.int64)
+    else:
+        target = np.dtype(dtype)
+        if max_count > np.iinfo(target).max:
+            raise ValueError(f"Largest count {max_count} overflows dtype {target}")
+
+    logger.info(f"Storing counts as {target} (largest count {max_count})")
+    return x.astype(target)
+
+
+# pylint: disable=too-many-arguments, too-many-positional-arguments
+def transform_data(
+    dataset, bow_output_path, sparse=False, vectorizer=None, workers=1, dtype="auto"
+):
+    """
+    Transforms the dataset into a bag-of-words representation.
 
     input:
     - dataset: DataFrame, the preprocessed dataset containing the text data and labels
-    - bow_output_path: str, where to store the CountVectorizer model
+    - bow_output_path: str, where to store the vectorizer model, None to not store it
+    - sparse: bool, return a CSR matrix instead of a dense array
+    - vectorizer: vectorizer from build_vectorizer, CountVectorizer(max_features=1420)
+      by default
+    - workers: int, number of worker processes used by the hashing featurizer
+    - dtype: str, dtype of the counts, see compact_counts
     output:
     - x: array-like, the transformed feature set
     - y: array-like, the target variable
     """
     corpus = dataset["Review"].tolist()
     y = dataset["Liked"].values
-    cv = CountVectorizer(max_features=1420)
-    x = cv.fit_transform(corpus).toarray()
+    cv = vectorizer if vectorizer is not None else build_vectorizer()
+    if isinstance(cv, HashingVectorizer):
+        x = hash_transform(cv, corpus, workers)
+    else:
+        x = cv.fit_transform(corpus)
+    return finish_features(x, cv, bow_output_path, sparse, dtype), y
+
+
+def finish_features(x, vectorizer, bow_output_path, sparse=False, dtype="auto"):
+    """
+    Compacts sparse counts, densifies them if asked and saves the vectorizer.
+
+    input:
+    - x: CSR matrix, the counts produced by vectorizer
+    - vectorizer: the vectorizer that produced x
+    - bow_output_path: str, where to store the vectorizer model, None to not store it
+    - sparse: bool, return a CSR matrix instead of a dense array
+    - dtype: str, dtype of the counts, see compact_counts
+    output:
+    - x: array-like or CSR matrix, the feature set
+    """
+    # Cast while still sparse, so no dense int64 matrix is ever built
+    x = compact_counts(x, dtype)
+    if not sparse:
+        x = x.toarray()
+
+    # Save vectorizer model
+    if bow_output_path is not None:
+        with open(bow_output_path, "wb") as f:
+            pickle.dump(vectorizer, f)
+        logger.info(f"Saved {type(vectorizer).__name__} model to {bow_output_path}")
+
+    return x
+
+
+class TextSpool:
+    """
+    Append-only temporary file of texts, read back by row number.
+
+    Only the end offset of every row is kept in memory, so texts that stream through
+    the spool are never all held at once.
+    """
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile()
+        self._ends = []
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._size = 0
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def offsets(self):
+        """Start offset of every row, followed by the end of the last one."""
+        if self._ends:
+            self._offsets = np.concatenate([self._offsets, *self._ends])
+            self._ends = []
+        return self._offsets
+
+    def extend(self, texts):
+        """Append texts to the end of the spool."""
+        data = [str(text).encode("utf-8") for text in texts]
+        lengths = np.fromiter(map(len, data), dtype=np.int64, count=len(data))
+        self._file.seek(0, os.SEEK_END)
+        self._file.write(b"".join(data))
+        self._ends.append(self._size + np.cumsum(lengths))
+        self._size += int(lengths.sum())
+
+    def take(self, index):
+        """Return the texts of the rows in index, in that order."""
+        offsets = self.offsets
+        texts = []
+        for row in index:
+            self._file.seek(offsets[row])
+            texts.append(self._file.read(offsets[row + 1] - offsets[row]).decode())
+        return texts
+
+    def close(self):
+        """Delete the spool file."""
+        self._file.close()
+
+
+class BlockVectorizer:
+    """
+    Vectorizes a preprocessed dataset that arrives block by block.
+
+    Only the sparse counts of a block are kept in memory. Its preprocessed text is
+    appended to a TextSpool on disk, to save the reviews of the splits, see
+    save_text_splits. A HashingVectorizer
+    transforms every block on arrival. For the count featurizer every block is counted
+    against its own terms while the term statistics of all blocks are accumulated;
+    finish then maps the block columns onto the top max_features terms, which gives
+    the counts of CountVectorizer(max_features) fitted on the whole corpus. With a
+    vocabulary state file the persisted statistics are updated instead, from the rows
+    after the ones already counted, like incremental_vectorizer does.
+
+    The split still needs all rows, so the whole feature matrix is built in finish;
+    save it sparse to keep that small.
+    """
+
+    def __init__(self, vectorizer=None, workers=1, state_path=None):
+        self.vectorizer = vectorizer if vectorizer is not None else build_vectorizer()
+        if state_path is not None and isinstance(self.vectorizer, HashingVectorizer):
+            check_vocab_state("hashing", state_path)
+        self.workers = workers
+        self.state_path = state_path
+        max_features = getattr(self.vectorizer, "max_features", 1420)
+        if state_path is not None:
+            self.vocabulary = load_vocabulary(state_path, max_features)
+        else:
+            self.vocabulary = IncrementalVocabulary(max_features)
+        # Rows whose terms are already in the persisted statistics
+        self.n_counted = self.vocabulary.n_docs
+        self.old_vocabulary = self.vocabulary.vocabulary()
+        self.n_rows = 0
+        self.blocks = []
+        self.labels = []
+        self.texts = TextSpool()
+
+    def add(self, dataset):
+        """
+        Vectorizes the next block of the dataset.
+
+        input:
+        - dataset: DataFrame, a preprocessed block with Review and Liked columns
+        """
+        corpus = dataset["Review"].tolist()
+        self.labels.append(dataset["Liked"].values)
+        self.texts.extend(corpus)
+        if isinstance(self.vectorizer, HashingVectorizer):
+            self.blocks.append((hash_transform(self.vectorizer, corpus, self.workers),))
+        else:
+            x, terms = count_terms(corpus)
+            already_counted = min(max(self.n_counted - self.n_rows, 0), len(corpus))
+            self.vocabulary.add_counts(x[already_counted:], terms)
+            self.blocks.append((x, terms))
+        self.n_rows += len(corpus)
+
+    def finish(self):
+        """
+        Combines the blocks seen so far.
 
-    # Save CountVectorizer model
-    with open(bow_output_path, "wb") as f:
-        pickle.dump(cv, f)
-    logger.info(f"Saved CountVectorizer model to {bow_output_path}")
+        output:
+        - vectorizer: the fitted vectorizer, to be saved with the features
+        - x: CSR matrix, the counts of all rows in arrival order
+        - y: array, the labels of all rows
+        """
+        y = np.concatenate(self.labels) if self.labels else np.array([], dtype=int)
+        if isinstance(self.vectorizer, HashingVectorizer):
+            parts = [x for x, in self.blocks]
+            x = (
+                sp.vstack(parts, format="csr")
+                if parts
+                else self.vectorizer.transform([])
+            )
+            return self.vectorizer, x, y
 
-    return x, y
+        if self.state_path is not None:
+            check_appended(self.n_rows, self.n_counted, self.state_path)
+            save_vocabulary(
+                self.vocabulary,
+                self.state_path,
+                self.old_vocabulary,
+                self.n_rows - self.n_counted,
+            )
+        vocabulary = self.vocabulary.vocabulary()
+        if not len(vocabulary):
+            raise ValueError("Empty vocabulary, the streamed reviews have no tokens")
+        x = sp.vstack(
+            [remap_columns(x, terms, vocabulary) for x, terms in self.blocks],
+            format="csr",
+        )
+        vectorizer = self.vocabulary.to_vectorizer()
+        # Fix the vocabulary, as after fit_transform, without tokenizing anything
+        vectorizer.fit([])
+        return vectorizer, x, y
 
 
 def split_data(x, y, test_size, random_state):
     """
     Splits the dataset into training and testing sets.
 
+    A sparse feature set is split by row indexing and stays sparse.
+
     input:
-    - x: array-like, feature set
+    - x: array-like or sparse matrix, feature set
     - y: array-like, target variable
     - test_size: int, size of test set
     - random_state: int, seed used when splitting
@@ -62,39 +363,254 @@ def split_data(x, y, test_size, random_state):
     return x_train, x_test, y_train, y_test
 
 
+def save_features(path, x):
+    """
+    Saves a feature set, as .npy for dense arrays and as CSR .npz for sparse matrices.
+
+    input:
+    - path: str, where to store the features, the suffix is replaced by .npz if sparse
+    - x: array-like or sparse matrix, the feature set
+    output:
+    - path: Path, where the features were stored
+    """
+    path = Path(path)
+    if sp.issparse(x):
+        path = path.with_suffix(".npz")
+        sp.save_npz(path, sp.csr_matrix(x))
+    else:
+        np.save(path, x)
+    return path
+
+
+def load_features(path, mmap_mode=None):
+    """
+    Loads a feature set saved by save_features.
+
+    input:
+    - path: str, a .npy file with a dense array or a .npz file with a sparse matrix
+    - mmap_mode: str, memory-map mode passed to np.load for dense arrays
+    output:
+    - x: array-like or CSR matrix, the feature set
+    """
+    path = Path(path)
+    if path.suffix == ".npz":
+        return sp.load_npz(path).tocsr()
+    return np.load(path, mmap_mode=mmap_mode)
+
+
+def iter_row_blocks(x, block_size):
+    """
+    Iterates over a feature set in dense blocks of rows.
+
+    Only one block of a sparse matrix is densified at a time.
+
+    input:
+    - x: array-like or sparse matrix, the feature set
+    - block_size: int, maximum number of rows per block
+    output:
+    - generator of dense arrays, in the original row order
+    """
+    for start in range(0, x.shape[0], block_size):
+        block = x[start : start + block_size]
+        yield block.toarray() if sp.issparse(block) else np.asarray(block)
+
+
+def gather_rows(x, index, out, block_size=4096):
+    """
+    Copies rows of a feature set to out, one block of rows at a time.
+
+    input:
+    - x: array-like or sparse matrix, the feature set, e.g. a memory-mapped array
+    - index: array, row numbers to copy; out[i] receives row index[i]
+    - out: array, where to copy the rows to, e.g. a memory-mapped .npy file
+    - block_size: int, number of rows copied at once
+    output:
+    - out: the filled array
+    """
+    for start in range(0, len(index), block_size):
+        block = x[index[start : start + block_size]]
+        out[start : start + block_size] = (
+            block.toarray() if sp.issparse(block) else block
+        )
+    return out
+
+
+def text_paths(directory):
+    """Return where the train and test reviews are saved in a directory."""
+    return tuple(Path(directory) / name for name in TEXT_NAMES)
+
+
+def save_texts(texts, path, append=False):
+    """Saves preprocessed reviews as a TSV with a Review column, or appends them."""
+    pd.DataFrame({"Review": list(texts)}).to_csv(
+        path, sep="\t", index=False, mode="a" if append else "w", header=not append
+    )
+
+
+def load_texts(path):
+    """Loads the preprocessed reviews saved by save_texts."""
+    return pd.read_csv(path, delimiter="\t")["Review"].fillna("").astype(str)
+
+
+def save_text_splits(
+    texts, test_size, random_state, directory=PROCESSED_DATA_DIR, chunk_size=10000
+):
+    """
+    Saves the preprocessed reviews of the train and test splits.
+
+    The rows are split as split_data splits the features with the same arguments, so
+    every review is saved in the order of its feature row. The reviews are written
+    chunk_size rows at a time, so a TextSpool is never read into memory in full.
+
+    input:
+    - texts: list or TextSpool, the preprocessed review of every feature row
+    - test_size: float, size of test set
+    - random_state: int, seed used when splitting
+    - directory: str, where to save texts_train.tsv and texts_test.tsv
+    - chunk_size: int, number of reviews written at once
+    """
+    if not isinstance(texts, TextSpool):
+        texts = pd.Series(texts, dtype=object)
+    indices = train_test_split(
+        np.arange(len(texts)), test_size=test_size, random_state=random_state
+    )
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    for index, path in zip(indices, text_paths(directory)):
+        # An empty split still gets its header
+        for start in range(0, max(len(index), 1), chunk_size):
+            chunk = texts.take(index[start : start + chunk_size])
+            save_texts(chunk, path, append=start > 0)
+    logger.info(f"Saved train and test reviews to {directory}")
+
+
+def save_splits(splits, paths=SPLIT_PATHS, store=None):
+    """
+    Saves the train and test splits.
+
+    input:
+    - splits: tuple, (x_train, x_test, y_train, y_test) as returned by split_data
+    - paths: tuple, where to store each of the arrays, in the same order
+    - store: FeatureStore, if given the arrays are stored there as shards instead,
+      named after the file names in paths
+    """
+    for array, path in zip(splits, paths):
+        if store is not None:
+            store.write(Path(path).stem, array)
+        else:
+            save_features(path, array)
+    location = store.root if store is not None else Path(paths[0]).parent
+    logger.info(f"Saved train and test features and labels to {location}")
+
+
+# pylint: disable=too-many-arguments, too-many-positional-arguments
+def vectorize_and_split(
+    dataset,
+    bow_output_path=BOW_PATH,
+    test_size=0.2,
+    random_state=1,
+    sparse=False,
+    vectorizer=None,
+    workers=1,
+    store=None,
+    dtype="auto",
+):
+    """
+    Vectorizes the preprocessed dataset, splits it and saves the results.
+
+    This is the part of the pipeline shared by the preprocessing and feature stages,
+    so an in-memory corpus is tokenized once without reloading it from disk. The
+    preprocessed reviews of both splits are saved next to the features, for the
+    evaluation slices.
+
+    input:
+    - dataset: DataFrame, the preprocessed dataset containing the text data and labels,
+      or a BlockVectorizer that has already vectorized the streamed blocks
+    - bow_output_path: str, where to store the CountVectorizer model
+    - test_size: float, size of test set
+    - random_state: int, seed used when splitting
+    - sparse: bool, keep the features as CSR matrices and save them as .npz
+    - vectorizer: vectorizer from build_vectorizer, CountVectorizer by default
+    - workers: int, number of worker processes used by the hashing featurizer
+    - store: FeatureStore, optional sharded store to save the splits to
+    - dtype: str, dtype of the counts, see compact_counts
+    """
+    logger.info("Converting text to BoW features...")
+    if isinstance(dataset, BlockVectorizer):
+        vectorizer, x, y = dataset.finish()
+        x = finish_features(x, vectorizer, bow_output_path, sparse, dtype)
+        texts = dataset.texts
+    else:
+        x, y = transform_data(
+            dataset, bow_output_path, sparse, vectorizer, workers, dtype
+        )
+        texts = dataset["Review"].tolist()
+    save_splits(split_data(x, y, test_size, random_state), store=store)
+    save_text_splits(
+        texts,
+        test_size,
+        random_state,
+        store.root if store is not None else Path(SPLIT_PATHS[1]).parent,
+    )
+
+
 # pylint: disable=too-many-arguments, too-many-positional-arguments
 @app.command()
 def main(
     input_path: Path = PROCESSED_DATA_DIR / "a1_RestaurantReviews_HistoricDump.tsv",
-    features_train_path: Path = PROCESSED_DATA_DIR / "features_train.npy",
-    features_test_path: Path = PROCESSED_DATA_DIR / "features_test.npy",
-    labels_train_path: Path = PROCESSED_DATA_DIR / "labels_train.npy",
-    labels_test_path: Path = PROCESSED_DATA_DIR / "labels_test.npy",
-    bow_output_path: Path = MODELS_DIR / "c1_BoW_Sentiment_Model.pkl",
+    features_train_path: Path = SPLIT_PATHS[0],
+    features_test_path: Path = SPLIT_PATHS[1],
+    labels_train_path: Path = SPLIT_PATHS[2],
+    labels_test_path: Path = SPLIT_PATHS[3],
+    bow_output_path: Path = BOW_PATH,
     test_size: float = 0.2,
     random_state: int = 1,
+    sparse: bool = typer.Option(False, help="Save features as sparse CSR .npz files"),
+    featurizer: str = typer.Option("count", help="Feature mode: count or hashing"),
+    n_features: int = typer.Option(
+        4096, help="Number of buckets of the hashing featurizer"
+    ),
+    workers: int = typer.Option(1, help="Worker processes of the hashing featurizer"),
+    store_dir: Path = typer.Option(
+        None, help="Save the splits to a feature store here"
+    ),
+    vocab_state: Path = typer.Option(
+        None, help="Update the count vocabulary incrementally from this state file"
+    ),
+    dtype: str = typer.Option("auto", help="Count dtype: auto, uint8, uint16 or int64"),
 ):
     """
     Main CLI entry point for feature extraction and data splitting.
 
     Loads the dataset, transforms it into features, splits into train/test, and saves
-    the resulting arrays and vectorizer.
+    the resulting arrays and vectorizer. The preprocessing stage already does this when
+    run with --save-npy, this command is for a separately preprocessed dataset.
     """
+    check_vocab_state(featurizer, vocab_state)
     logger.info(f"Loading dataset from: {input_path}")
     dataset = pd.read_csv(input_path, delimiter="\t", quoting=3)
 
     # Transform data
-    x, y = transform_data(dataset, bow_output_path)
+    if vocab_state:
+        vectorizer = incremental_vectorizer(dataset["Review"].tolist(), vocab_state)
+    else:
+        vectorizer = build_vectorizer(featurizer, n_features)
+    x, y = transform_data(dataset, bow_output_path, sparse, vectorizer, workers, dtype)
 
     # Split data
-    x_train, x_test, y_train, y_test = split_data(x, y, test_size, random_state)
+    splits = split_data(x, y, test_size, random_state)
 
     # Save splits
-    np.save(features_train_path, x_train)
-    np.save(features_test_path, x_test)
-    np.save(labels_train_path, y_train)
-    np.save(labels_test_path, y_test)
-    logger.info(f"Saved train and test features and labels to {PROCESSED_DATA_DIR}")
+    save_splits(
+        splits,
+        (features_train_path, features_test_path, labels_train_path, labels_test_path),
+        FeatureStore(store_dir) if store_dir else None,
+    )
+    save_text_splits(
+        dataset["Review"].tolist(),
+        test_size,
+        random_state,
+        store_dir or features_test_path.parent,
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,87 @@
+"""Compare the accuracy and throughput of the count and hashing featurizers."""
+
+import json
+import pickle
+import time
+from pathlib import Path
+
+import pandas as pd
+import typer
+from loguru import logger
+from sklearn.metrics import accuracy_score
+from sklearn.naive_bayes import GaussianNB
+
+from model_training.config import PROCESSED_DATA_DIR, REPORTS_DIR
+from model_training.evaluate import predict_in_blocks
+from model_training.features import (
+    FEATURIZERS,
+    build_vectorizer,
+    split_data,
+    transform_data,
+)
+from model_training.train import fit_in_blocks
+
+app = typer.Typer()
+
+
+def compare_featurizers(
+    dataset, n_features=4096, workers=1, test_size=0.2, random_state=1
+):
+    """
+    Fits a Gaussian Naive Bayes model on the features of every featurizer.
+
+    input:
+    - dataset: DataFrame, the preprocessed dataset containing the text data and labels
+    - n_features: int, number of buckets of the hashing featurizer
+    - workers: int, number of worker processes used by the hashing featurizer
+    - test_size: float, size of test set
+    - random_state: int, seed used when splitting
+    output:
+    - results: dict, per featurizer the accuracy, throughput and artifact size
+    """
+    results = {}
+    for featurizer in FEATURIZERS:
+        vectorizer = build_vectorizer(featurizer, n_features)
+
+        start = time.perf_counter()
+        x, y = transform_data(
+            dataset, None, sparse=True, vectorizer=vectorizer, workers=workers
+        )
+        elapsed = time.perf_counter() - start
+
+        x_train, x_test, y_train, y_test = split_data(x, y, test_size, random_state)
+        classifier = fit_in_blocks(GaussianNB(), x_train, y_train)
+        accuracy = accuracy_score(y_test, predict_in_blocks(classifier, x_test))
+
+        results[featurizer] = {
+            "n_features": x.shape[1],
+            "accuracy": accuracy,
+            "rows_per_sec": len(dataset) / elapsed if elapsed > 0 else float("inf"),
+            "artifact_bytes": len(pickle.dumps(vectorizer)),
+        }
+        logger.info(f"{featurizer}: {results[featurizer]}")
+
+    return results
+
+
+@app.command()
+def main(
+    input_path: Path = PROCESSED_DATA_DIR / "a1_RestaurantReviews_HistoricDump.tsv",
+    output_path: Path = REPORTS_DIR / "featurizer_comparison.json",
+    n_features: int = typer.Option(
+        4096, help="Number of buckets of the hashing featurizer"
+    ),
+    workers: int = typer.Option(1, help="Worker processes of the hashing featurizer"),
+):
+    """CLI entry point for comparing the featurizers on the preprocessed dataset."""
+    logger.info(f"Loading dataset from: {input_path}")
+    dataset = pd.read_csv(input_path, delimiter="\t", quoting=3)
+
+    results = compare_featurizers(dataset, n_features, workers)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    logger.info(f"Featurizer comparison saved to {output_path}")
+
+
+if __name__ == "__main__":
+    app()
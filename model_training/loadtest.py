@@ -0,0 +1,122 @@
+"""Load test for the local inference server: latency percentiles and throughput."""
+
+import asyncio
+import itertools
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import typer
+from loguru import logger
+
+from model_training.config import RAW_DATA_DIR, REPORTS_DIR
+
+app = typer.Typer()
+
+
+async def _request(reader, writer, host, body):
+    """Send one POST /predict over an open connection and return the response body."""
+    writer.write(
+        f"POST /predict HTTP/1.1\r\nHost: {host}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+
+    status = await reader.readline()
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    payload = await reader.readexactly(int(headers.get("content-length", 0)))
+    if b" 200 " not in status:
+        raise RuntimeError(f"Request failed: {status!r} {payload!r}")
+    return json.loads(payload)
+
+
+async def _client(host, port, bodies, latencies, results):
+    """Send requests one after another over one keep-alive connection."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for index, body in bodies:
+            start = time.perf_counter()
+            response = await _request(reader, writer, host, body)
+            latencies.append(time.perf_counter() - start)
+            results[index] = response["prediction"]
+    finally:
+        writer.close()
+
+
+# pylint: disable=too-many-arguments, too-many-positional-arguments
+async def run_load(
+    host, port, reviews, n_requests=1000, concurrency=32, text_field="Review"
+):
+    """
+    Sends n_requests predictions from concurrency connections at once.
+
+    input:
+    - host: str, host of the inference server
+    - port: int, port of the inference server
+    - reviews: list, raw reviews, cycled through for the request bodies
+    - n_requests: int, total number of requests
+    - concurrency: int, number of connections sending requests concurrently
+    - text_field: str, the field holding the review in the request body
+    output:
+    - report: dict with the request count, requests/sec and p50/p99 latency in ms
+    - predictions: list, the prediction of every request, in request order
+    """
+    bodies = [
+        (index, json.dumps({text_field: review}).encode("utf-8"))
+        for index, review in zip(range(n_requests), itertools.cycle(reviews))
+    ]
+    latencies = []
+    predictions = [None] * n_requests
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            _client(host, port, bodies[i::concurrency], latencies, predictions)
+            for i in range(concurrency)
+        )
+    )
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    report = {
+        "requests": n_requests,
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "requests_per_sec": n_requests / elapsed if elapsed > 0 else float("inf"),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+    }
+    return report, predictions
+
+
+# pylint: disable=too-many-arguments, too-many-positional-arguments
+@app.command()
+def main(
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    n_requests: int = typer.Option(2000, help="Total number of requests"),
+    concurrency: int = typer.Option(32, help="Concurrent connections"),
+    input_path: Path = RAW_DATA_DIR / "a1_RestaurantReviews_HistoricDump.tsv",
+    output_path: Path = REPORTS_DIR / "loadtest.json",
+):
+    """CLI entry point for load testing a running inference server."""
+    reviews = pd.read_csv(input_path, delimiter="\t", quoting=3)["Review"].tolist()
+    report, _ = asyncio.run(run_load(host, port, reviews, n_requests, concurrency))
+    logger.info(
+        f"{report['requests_per_sec']:.0f} requests/sec, "
+        f"p50 {report['p50_ms']:.1f} ms, p99 {report['p99_ms']:.1f} ms"
+    )
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Load test report saved to {output_path}")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,346 @@
+"""Classification metrics derived from one confusion matrix, built in a single pass."""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import stats
+
+
+def confusion_counts(y_true, y_pred, labels):
+    """
+    Counts the (true, predicted) label pairs with one bincount.
+
+    input:
+    - y_true: array-like, true labels
+    - y_pred: array-like, predicted labels
+    - labels: sorted array of every label that can occur
+    output:
+    - cm: int64 array of shape (n_labels, n_labels), rows are true labels
+    """
+    labels = np.asarray(labels)
+    n_labels = len(labels)
+    true_index = np.searchsorted(labels, y_true)
+    pred_index = np.searchsorted(labels, y_pred)
+    counts = np.bincount(true_index * n_labels + pred_index, minlength=n_labels**2)
+    return counts.reshape(n_labels, n_labels)
+
+
+def grouped_confusion(codes, n_groups, y_true, y_pred, labels):
+    """
+    Counts one confusion matrix per group with a single bincount.
+
+    input:
+    - codes: int array, the group of every row, in [0, n_groups)
+    - n_groups: int, number of groups
+    - y_true: array-like, true labels
+    - y_pred: array-like, predicted labels
+    - labels: sorted array of every label that can occur
+    output:
+    - cms: int64 array of shape (n_groups, n_labels, n_labels)
+    """
+    n_labels = len(labels)
+    cells = np.searchsorted(labels, y_true) * n_labels + np.searchsorted(labels, y_pred)
+    counts = np.bincount(
+        np.asarray(codes) * n_labels**2 + cells, minlength=n_groups * n_labels**2
+    )
+    return counts.reshape(n_groups, n_labels, n_labels)
+
+
+class ConfusionAccumulator:
+    """
+    Confusion matrix accumulated over chunks of labels and predictions.
+
+    Labels not seen before are added as they appear, so the matrix equals
+    sklearn.metrics.confusion_matrix of all chunks concatenated.
+    """
+
+    def __init__(self, labels=()):
+        self.labels = np.unique(np.asarray(labels))
+        self.matrix = np.zeros((len(self.labels), len(self.labels)), dtype=np.int64)
+
+    def update(self, y_true, y_pred):
+        """Add the counts of one chunk."""
+        y_true = np.asarray(y_true)
+        y_pred = np.asarray(y_pred)
+        labels = np.union1d(y_true, y_pred)
+        if len(self.labels):
+            labels = np.union1d(self.labels, labels)
+        if len(labels) != len(self.labels):
+            matrix = np.zeros((len(labels), len(labels)), dtype=np.int64)
+            index = np.searchsorted(labels, self.labels)
+            matrix[np.ix_(index, index)] = self.matrix
+            self.labels, self.matrix = labels, matrix
+        self.matrix += confusion_counts(y_true, y_pred, self.labels)
+        return self
+
+
+def _divide(numerator, denominator):
+    """Elementwise division that gives 0 where the denominator is 0."""
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    out = np.zeros(np.broadcast(numerator, denominator).shape)
+    return np.divide(numerator, denominator, out=out, where=denominator != 0)
+
+
+def per_class_metrics(cm):
+    """
+    Derives the per-class scores from a confusion matrix.
+
+    input:
+    - cm: array of shape (..., n_labels, n_labels), rows are true labels; leading
+      axes are batches of matrices
+    output:
+    - scores: dict of arrays of shape (..., n_labels) with precision, recall, f1 and
+      support
+    """
+    cm = np.asarray(cm)
+    true_positives = np.diagonal(cm, axis1=-2, axis2=-1)
+    predicted = cm.sum(axis=-2)
+    support = cm.sum(axis=-1)
+    precision = _divide(true_positives, predicted)
+    recall = _divide(true_positives, support)
+    return {
+        "precision": precision,
+        "recall": recall,
+        "f1": _divide(2 * precision * recall, precision + recall),
+        "support": support,
+    }
+
+
+def binary_metrics(cm, pos_index=-1):
+    """
+    Derives the evaluate.py metrics of a binary classifier from its confusion matrix.
+
+    With hard predictions the ROC curve has a single operating point, and its AUC
+    equals the mean of the recall of both classes.
+
+    input:
+    - cm: array of shape (..., 2, 2), rows are true labels
+    - pos_index: int, index of the positive label, the larger label by default
+    output:
+    - metrics: dict of accuracy, precision, recall, f1 and AUC ROC, floats for one
+      matrix or arrays for a batch
+    """
+    cm = np.asarray(cm)
+    scores = per_class_metrics(cm)
+    total = cm.sum(axis=(-2, -1))
+    accuracy = _divide(np.trace(cm, axis1=-2, axis2=-1), total)
+    metrics = {
+        "accuracy": accuracy,
+        "precision": scores["precision"][..., pos_index],
+        "recall": scores["recall"][..., pos_index],
+        "f1": scores["f1"][..., pos_index],
+        "AUC ROC": scores["recall"].mean(axis=-1),
+    }
+    if cm.ndim == 2:
+        return {name: float(value) for name, value in metrics.items()}
+    return metrics
+
+
+def classification_report_text(cm, labels, digits=2):
+    """
+    Formats the report of a confusion matrix as sklearn.metrics.classification_report.
+
+    input:
+    - cm: array of shape (n_labels, n_labels), rows are true labels
+    - labels: array, the label of every row
+    - digits: int, number of digits of the scores
+    output:
+    - report: str
+    """
+    scores = per_class_metrics(cm)
+    support = scores["support"]
+    total = support.sum()
+    names = [str(label) for label in labels]
+    width = max(max(len(name) for name in names), len("weighted avg"), digits)
+
+    headers = ["precision", "recall", "f1-score", "support"]
+    report = ("{:>{width}s} " + " {:>9}" * 4).format("", *headers, width=width)
+    report += "\n\n"
+    row_fmt = "{:>{width}s} " + " {:>9.{digits}f}" * 3 + " {:>9}\n"
+    for i, name in enumerate(names):
+        row = (scores["precision"][i], scores["recall"][i], scores["f1"][i])
+        report += row_fmt.format(name, *row, support[i], width=width, digits=digits)
+    report += "\n"
+
+    accuracy = float(_divide(np.trace(cm), total))
+    report += (
+        "{:>{width}s} " + " {:>9.{digits}}" * 2 + " {:>9.{digits}f}" + " {:>9}\n"
+    ).format("accuracy", "", "", accuracy, total, width=width, digits=digits)
+    weights = _divide(support, total)
+    for heading, average in (
+        ("macro avg", lambda values: values.mean()),
+        ("weighted avg", lambda values: (values * weights).sum()),
+    ):
+        row = [average(scores[name]) for name in ("precision", "recall", "f1")]
+        report += row_fmt.format(heading, *row, total, width=width, digits=digits)
+    return report
+
+
+def threshold_curves(y_true, scores, pos_label=1):
+    """
+    Computes the ROC and precision/recall curves at every distinct score in one pass.
+
+    The scores are sorted once, and the true and false positives of the rule
+    "positive if score >= threshold" at every threshold are cumulative sums over the
+    sorted labels.
+
+    input:
+    - y_true: array-like, true labels
+    - scores: array-like, predicted probability or score of the positive label
+    - pos_label: the positive label
+    output:
+    - curves: dict of arrays, one entry per threshold from high to low: threshold,
+      tp, fp, fpr, tpr, precision, recall and f1
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    order = np.argsort(-scores, kind="mergesort")
+    sorted_scores = scores[order]
+    positives_sorted = np.asarray(y_true)[order] == pos_label
+
+    # Last position of every run of equal scores
+    ends = np.r_[np.flatnonzero(np.diff(sorted_scores)), len(scores) - 1]
+    tp = np.cumsum(positives_sorted)[ends]
+    fp = ends + 1 - tp
+    precision = _divide(tp, tp + fp)
+    recall = _divide(tp, tp[-1])
+    return {
+        "threshold": sorted_scores[ends],
+        "tp": tp,
+        "fp": fp,
+        "fpr": _divide(fp, fp[-1]),
+        "tpr": recall,
+        "precision": precision,
+        "recall": recall,
+        "f1": _divide(2 * precision * recall, precision + recall),
+    }
+
+
+def curve_summary(curves):
+    """
+    Summarizes threshold curves into the areas and the F1-optimal threshold.
+
+    input:
+    - curves: dict from threshold_curves
+    output:
+    - summary: dict of AUC ROC, average precision, the best threshold by F1 and its
+      precision, recall and F1
+    """
+    fpr = np.r_[0.0, curves["fpr"]]
+    tpr = np.r_[0.0, curves["tpr"]]
+    recall = np.r_[0.0, curves["recall"]]
+    best = int(np.argmax(curves["f1"]))
+    return {
+        "AUC ROC": float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2)),
+        "average precision": float(np.sum(np.diff(recall) * curves["precision"])),
+        "best threshold": float(curves["threshold"][best]),
+        "best threshold precision": float(curves["precision"][best]),
+        "best threshold recall": float(curves["recall"][best]),
+        "best threshold f1": float(curves["f1"][best]),
+    }
+
+
+def _resample_confusion(job):
+    """Draw bootstrap confusion matrices, see bootstrap_confusion."""
+    cm, n_resamples, seed = job
+    cm = np.asarray(cm)
+    total = cm.sum()
+    draws = np.random.default_rng(seed).multinomial(
+        total, cm.ravel() / total, size=n_resamples
+    )
+    return draws.reshape(n_resamples, *cm.shape)
+
+
+def bootstrap_confusion(cm, n_resamples=10_000, seed=0, workers=1):
+    """
+    Draws the confusion matrices of bootstrap resamples of a test set.
+
+    Resampling N rows with replacement only changes how many rows fall in every cell
+    of the confusion matrix, and those cell counts are multinomial with the observed
+    cell frequencies. Drawing them directly gives the same bootstrap distribution
+    without touching the N rows.
+
+    input:
+    - cm: array of shape (n_labels, n_labels), the observed confusion matrix
+    - n_resamples: int, number of bootstrap resamples
+    - seed: int, seed of the resampling, results do not depend on workers
+    - workers: int, number of processes drawing resamples
+    output:
+    - cms: int64 array of shape (n_resamples, n_labels, n_labels)
+    """
+    # Fixed-size batches with their own seeds, so the draws do not depend on workers
+    batch_size = 1000
+    sizes = [
+        min(batch_size, n_resamples - start)
+        for start in range(0, n_resamples, batch_size)
+    ]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(cm, size, batch_seed) for size, batch_seed in zip(sizes, seeds)]
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_resample_confusion, jobs))
+    else:
+        parts = [_resample_confusion(job) for job in jobs]
+    return np.concatenate(parts)
+
+
+def bootstrap_intervals(cm, n_resamples=10_000, confidence=0.95, seed=0, workers=1):
+    """
+    Computes percentile bootstrap confidence intervals of the binary metrics.
+
+    input:
+    - cm: array of shape (2, 2), the observed confusion matrix
+    - n_resamples: int, number of bootstrap resamples
+    - confidence: float, coverage of the intervals
+    - seed: int, seed of the resampling
+    - workers: int, number of processes drawing resamples
+    output:
+    - intervals: dict with the [low, high] interval of every metric of binary_metrics
+    """
+    resampled = binary_metrics(bootstrap_confusion(cm, n_resamples, seed, workers))
+    tail = (1 - confidence) / 2 * 100
+    return {
+        name: [float(bound) for bound in np.percentile(values, [tail, 100 - tail])]
+        for name, values in resampled.items()
+    }
+
+
+def mcnemar_test(correct_a, correct_b, exact_below=25):
+    """
+    McNemar's test of whether two models have the same error rate on one test set.
+
+    Only the rows where exactly one model is correct count. With fewer than
+    exact_below such rows the exact binomial test is used, otherwise the chi-square
+    test with continuity correction.
+
+    input:
+    - correct_a: bool array, whether model A predicted each row correctly
+    - correct_b: bool array, whether model B predicted each row correctly
+    - exact_below: int, number of discordant rows below which the test is exact
+    output:
+    - result: dict with the discordant counts, the statistic, the p-value and the
+      test used
+    """
+    correct_a = np.asarray(correct_a, dtype=bool)
+    correct_b = np.asarray(correct_b, dtype=bool)
+    only_a = int(np.count_nonzero(correct_a & ~correct_b))
+    only_b = int(np.count_nonzero(~correct_a & correct_b))
+    discordant = only_a + only_b
+
+    if discordant == 0:
+        statistic, p_value, test = 0.0, 1.0, "exact"
+    elif discordant < exact_below:
+        statistic = float(min(only_a, only_b))
+        p_value = float(stats.binomtest(only_a, discordant, 0.5).pvalue)
+        test = "exact"
+    else:
+        statistic = (abs(only_a - only_b) - 1) ** 2 / discordant
+        p_value = float(stats.chi2.sf(statistic, df=1))
+        test = "chi2"
+    return {
+        "only_a_correct": only_a,
+        "only_b_correct": only_b,
+        "statistic": float(statistic),
+        "p_value": p_value,
+        "test": test,
+    }
@@ -0,0 +1,177 @@
+"""Sufficient statistics of Gaussian Naive Bayes models and their exact merge."""
+
+import numpy as np
+from sklearn.naive_bayes import GaussianNB
+
+from model_training.features import iter_row_blocks
+
+
+def pooled_variance(counts, means, variances):
+    """
+    Computes the variance over all rows from per-class statistics.
+
+    input:
+    - counts: array, number of rows of every class
+    - means: array, per-class feature means, one row per class
+    - variances: array, per-class feature variances, one row per class
+    output:
+    - variance: array, the variance of every feature over all rows
+    """
+    counts = np.asarray(counts, dtype=np.float64)[:, np.newaxis]
+    mean = (counts * means).sum(axis=0) / counts.sum()
+    return (counts * (variances + (means - mean) ** 2)).sum(axis=0) / counts.sum()
+
+
+def merge_statistics(a, b):
+    """
+    Merges the statistics of two disjoint sets of rows exactly.
+
+    Uses the pairwise update of Chan et al., so no rows need to be revisited.
+
+    input:
+    - a: dict, statistics as returned by class_statistics
+    - b: dict, statistics of other rows, with the same classes
+    output:
+    - stats: dict, the statistics of the rows of a and b together
+    """
+    if not np.array_equal(a["classes"], b["classes"]):
+        raise ValueError(f"Cannot merge classes {a['classes']} and {b['classes']}")
+
+    n_a = a["count"][:, np.newaxis]
+    n_b = b["count"][:, np.newaxis]
+    n = np.maximum(n_a + n_b, 1)
+    delta = b["mean"] - a["mean"]
+    return {
+        "classes": a["classes"],
+        "count": a["count"] + b["count"],
+        "mean": a["mean"] + delta * n_b / n,
+        "m2": a["m2"] + b["m2"] + delta**2 * n_a * n_b / n,
+    }
+
+
+def subtract_statistics(total, part):
+    """
+    Removes the statistics of some rows from the statistics of a superset of them.
+
+    This is the inverse of merge_statistics: merging the result with part gives total.
+
+    input:
+    - total: dict, statistics of all rows
+    - part: dict, statistics of the rows to remove, with the same classes
+    output:
+    - stats: dict, the statistics of the remaining rows
+    """
+    if not np.array_equal(total["classes"], part["classes"]):
+        raise ValueError(
+            f"Cannot subtract classes {part['classes']} from {total['classes']}"
+        )
+
+    n = total["count"][:, np.newaxis]
+    n_b = part["count"][:, np.newaxis]
+    n_a = n - n_b
+    if (n_a < 0).any():
+        raise ValueError("Cannot remove more rows of a class than it contains")
+
+    mean = np.where(
+        n_a > 0, (n * total["mean"] - n_b * part["mean"]) / np.maximum(n_a, 1), 0.0
+    )
+    delta = part["mean"] - mean
+    m2 = total["m2"] - part["m2"] - delta**2 * n_a * n_b / np.maximum(n, 1)
+    return {
+        "classes": total["classes"],
+        "count": total["count"] - part["count"],
+        "mean": mean,
+        # Rounding can leave tiny negative sums of squares for constant features
+        "m2": np.where(n_a > 0, np.maximum(m2, 0.0), 0.0),
+    }
+
+
+def empty_statistics(classes, n_features):
+    """Returns the statistics of no rows at all."""
+    return {
+        "classes": np.asarray(classes),
+        "count": np.zeros(len(classes)),
+        "mean": np.zeros((len(classes), n_features)),
+        "m2": np.zeros((len(classes), n_features)),
+    }
+
+
+def class_statistics(x, y, classes, block_size=2048):
+    """
+    Computes the per-class count, mean and sum of squared deviations of a feature set.
+
+    input:
+    - x: array-like or sparse matrix, the features, read one dense block at a time
+    - y: array-like, the labels
+    - classes: array, all classes, also those missing from y
+    - block_size: int, number of rows densified at once
+    output:
+    - stats: dict with the classes and per-class count, mean and m2 arrays
+    """
+    stats = empty_statistics(classes, x.shape[1])
+    y = np.asarray(y)
+    for start, block in zip(
+        range(0, x.shape[0], block_size), iter_row_blocks(x, block_size)
+    ):
+        labels = y[start : start + block_size]
+        part = empty_statistics(classes, x.shape[1])
+        for i, label in enumerate(stats["classes"]):
+            rows = block[labels == label].astype(np.float64)
+            if len(rows):
+                part["count"][i] = len(rows)
+                part["mean"][i] = rows.mean(axis=0)
+                part["m2"][i] = ((rows - part["mean"][i]) ** 2).sum(axis=0)
+        stats = merge_statistics(stats, part)
+    return stats
+
+
+def from_gaussian_nb(classifier):
+    """Returns the statistics a fitted GaussianNB was built from."""
+    counts = classifier.class_count_
+    return {
+        "classes": classifier.classes_,
+        "count": counts.copy(),
+        "mean": classifier.theta_.copy(),
+        "m2": (classifier.var_ - classifier.epsilon_) * counts[:, np.newaxis],
+    }
+
+
+def to_gaussian_nb(stats, var_smoothing=1e-9):
+    """
+    Builds a fitted GaussianNB from per-class statistics.
+
+    The variance smoothing is derived from the variance over all rows, as
+    GaussianNB.fit derives it, so the model equals a fit on all the rows.
+
+    input:
+    - stats: dict, statistics as returned by class_statistics
+    - var_smoothing: float, the var_smoothing of the model
+    output:
+    - classifier: GaussianNB, the fitted model
+    """
+    counts = stats["count"]
+    variances = stats["m2"] / counts[:, np.newaxis]
+
+    classifier = GaussianNB(var_smoothing=var_smoothing)
+    classifier.classes_ = stats["classes"]
+    classifier.class_count_ = counts.astype(np.float64)
+    classifier.class_prior_ = classifier.class_count_ / counts.sum()
+    classifier.theta_ = stats["mean"]
+    classifier.epsilon_ = (
+        var_smoothing * pooled_variance(counts, stats["mean"], variances).max()
+    )
+    classifier.var_ = variances + classifier.epsilon_
+    classifier.n_features_in_ = stats["mean"].shape[1]
+    return classifier
+
+
+def save_statistics(path, stats):
+    """Saves statistics as an .npz file."""
+    with open(path, "wb") as f:
+        np.savez(f, **stats)
+
+
+def load_statistics(path):
+    """Loads statistics saved by save_statistics."""
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
@@ -0,0 +1,225 @@
+"""Batch prediction over a stream of JSONL or TSV records."""
+
+import itertools
+import json
+import time
+from pathlib import Path
+
+import pandas as pd
+import typer
+from loguru import logger
+from sklearn.naive_bayes import GaussianNB
+
+from model_training.bundle import bundle_dir, load_bundle
+from model_training.config import PROCESSED_DATA_DIR
+from model_training.evaluate import predict_in_blocks
+from model_training.features import BOW_PATH
+from model_training.prediction_cache import PredictionCache, cached_predictor
+from model_training.preprocess_cache import open_cache
+from model_training.preprocessing import preprocess_data
+from model_training.registry import default_registry
+from model_training.scoring import NaiveBayesScorer
+
+app = typer.Typer()
+
+
+def tsv_columns(input_path):
+    """Return the header of a TSV file, empty if the file is empty."""
+    try:
+        return list(pd.read_csv(input_path, delimiter="\t", quoting=3, nrows=0).columns)
+    except pd.errors.EmptyDataError:
+        return []
+
+
+def iter_batches(input_path, batch_size, text_field="Review"):
+    """
+    Reads records from a JSONL or TSV file in batches, without loading the whole file.
+
+    input:
+    - input_path: str, a .tsv file with a header, or a file with one JSON object per
+      line
+    - batch_size: int, maximum number of records per batch
+    - text_field: str, the field holding the raw review
+    output:
+    - generator of lists of dicts, in file order
+    """
+    input_path = Path(input_path)
+    if input_path.suffix == ".tsv":
+        if text_field not in tsv_columns(input_path):
+            raise ValueError(f"{input_path} has no {text_field!r} column")
+        reader = pd.read_csv(
+            input_path, delimiter="\t", quoting=3, chunksize=batch_size
+        )
+        for chunk in reader:
+            if len(chunk):
+                yield chunk.to_dict("records")
+        return
+
+    with open(input_path, encoding="utf-8") as f:
+        records = (json.loads(line) for line in f if line.strip())
+        while batch := list(itertools.islice(records, batch_size)):
+            for record in batch:
+                if text_field not in record:
+                    raise ValueError(f"Record without {text_field!r} field: {record}")
+            yield batch
+
+
+def load_predictor(version, bow_path=BOW_PATH, use_bundle=False):
+    """
+    Loads a model version and returns a function predicting preprocessed reviews.
+
+    input:
+    - version: str, the model version in models/
+    - bow_path: str, the pickled vectorizer, not used with use_bundle
+    - use_bundle: bool, load the pickle-free bundle of the version instead
+    output:
+    - predict: function mapping a list of preprocessed reviews to predicted labels
+    """
+    if use_bundle:
+        bundle = load_bundle(bundle_dir(version))
+        return bundle.predict_texts
+
+    classifier, vectorizer = default_registry().load(version, bow_path)
+    if isinstance(classifier, GaussianNB):
+        # The CSR counts of the vectorizer are scored without densifying them
+        scorer = NaiveBayesScorer.from_classifier(classifier)
+        return lambda corpus: scorer.predict(vectorizer.transform(corpus))
+    return lambda corpus: predict_in_blocks(classifier, vectorizer.transform(corpus))
+
+
+class PredictionWriter:
+    """Appends records with their predictions to a JSONL or TSV file."""
+
+    def __init__(self, output_path):
+        self.output_path = Path(output_path)
+        self.rows = 0
+
+    def write(self, records):
+        """Append one batch of records."""
+        if self.output_path.suffix == ".tsv":
+            pd.DataFrame(records).to_csv(
+                self.output_path,
+                sep="\t",
+                index=False,
+                mode="w" if self.rows == 0 else "a",
+                header=self.rows == 0,
+            )
+        else:
+            with open(
+                self.output_path, "w" if self.rows == 0 else "a", encoding="utf-8"
+            ) as f:
+                for record in records:
+                    f.write(json.dumps(record, default=str) + "\n")
+        self.rows += len(records)
+
+    def finish(self, columns=()):
+        """Create the output file if no records were written, with a header for TSV."""
+        if self.rows:
+            return
+        if self.output_path.suffix == ".tsv":
+            pd.DataFrame(columns=[*columns, "prediction"]).to_csv(
+                self.output_path, sep="\t", index=False
+            )
+        else:
+            self.output_path.write_text("", encoding="utf-8")
+
+
+# pylint: disable=too-many-arguments, too-many-positional-arguments
+def predict_stream(
+    input_path,
+    output_path,
+    predict,
+    batch_size=1024,
+    text_field="Review",
+    cache=None,
+):
+    """
+    Predicts every record of an input file and streams the results to the output.
+
+    Each batch is preprocessed, vectorized and predicted with one call each, and
+    written out before the next batch is read, so memory use depends on the batch
+    size only. An input without records still creates the output file.
+
+    input:
+    - input_path: str, JSONL or TSV file with the raw reviews
+    - output_path: str, where to write the records with a prediction field, as TSV
+      if the suffix is .tsv, as JSONL otherwise
+    - predict: function from load_predictor
+    - batch_size: int, number of records scored at once
+    - text_field: str, the field holding the raw review
+    - cache: PreprocessCache, optional cache of previously preprocessed reviews
+    output:
+    - rows: int, number of records predicted
+    """
+    writer = PredictionWriter(output_path)
+    start = time.perf_counter()
+    for batch in iter_batches(input_path, batch_size, text_field):
+        reviews = pd.DataFrame({"Review": [str(r[text_field]) for r in batch]})
+        corpus = preprocess_data(reviews, cache=cache)
+        for record, label in zip(batch, predict(corpus)):
+            record["prediction"] = label.item()
+        writer.write(batch)
+
+        elapsed = time.perf_counter() - start
+        logger.info(
+            f"Predicted {writer.rows} records "
+            f"({writer.rows / elapsed if elapsed > 0 else float('inf'):.0f} rows/sec)"
+        )
+    is_tsv = Path(input_path).suffix == ".tsv"
+    writer.finish(tsv_columns(input_path) if is_tsv else ())
+    return writer.rows
+
+
+# pylint: disable=too-many-arguments, too-many-positional-arguments
+@app.command()
+def main(
+    input_path: Path,
+    output_path: Path,
+    version: str = typer.Option(..., help="Model version name (e.g., v1.0.0)"),
+    batch_size: int = typer.Option(1024, help="Records scored per batch"),
+    text_field: str = typer.Option("Review", help="Field holding the raw review"),
+    bow_path: Path = BOW_PATH,
+    bundle: bool = typer.Option(False, help="Use the pickle-free bundle of the model"),
+    cache: bool = typer.Option(True, help="Reuse previously preprocessed reviews"),
+    cache_path: Path = PROCESSED_DATA_DIR / "preprocess_cache.sqlite",
+    prediction_cache: bool = typer.Option(
+        True, help="Reuse the predictions of previously scored reviews"
+    ),
+    prediction_cache_path: Path = PROCESSED_DATA_DIR / "prediction_cache.json",
+    prediction_cache_size: int = typer.Option(
+        100_000, help="Most predictions kept in the prediction cache"
+    ),
+    prediction_cache_ttl: float = typer.Option(
+        None, help="Seconds a cached prediction stays valid, forever if not set"
+    ),
+):
+    """CLI entry point for scoring a JSONL or TSV file of reviews in batches."""
+    predict = load_predictor(version, bow_path, bundle)
+    labels_cache = None
+    if prediction_cache:
+        labels_cache = PredictionCache(
+            version, prediction_cache_size, prediction_cache_ttl
+        )
+        labels_cache.load(prediction_cache_path)
+        predict = cached_predictor(predict, labels_cache)
+
+    review_cache = open_cache(cache_path) if cache else None
+    try:
+        rows = predict_stream(
+            input_path, output_path, predict, batch_size, text_field, review_cache
+        )
+    finally:
+        if review_cache is not None:
+            review_cache.close()
+    logger.info(f"Saved {rows} predictions to {output_path}")
+
+    if labels_cache is not None:
+        logger.info(
+            f"Prediction cache hit rate: {labels_cache.hit_rate:.1%} "
+            f"({labels_cache.hits} hits, {labels_cache.misses} misses)"
+        )
+        labels_cache.save(prediction_cache_path)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,178 @@
+"""In-memory LRU/TTL cache of predictions keyed by the preprocessed review text."""
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+from loguru import logger
+
+
+class PredictionCache:
+    """
+    Maps preprocessed reviews to the label a model version predicted for them.
+
+    Keys are a hash of the model version plus the text after
+    Preprocessor.process_item, so retrained versions never serve stale labels. When
+    more than capacity entries are stored the least recently used ones are evicted,
+    and entries older than ttl_seconds are treated as misses.
+    """
+
+    def __init__(self, version, capacity=100_000, ttl_seconds=None, clock=time.time):
+        self.version = version
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key -> (label, time stored), least recently used first
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def key(self, text):
+        """Return the cache key of a preprocessed review."""
+        return hashlib.blake2b(
+            f"{self.version}\0{text}".encode("utf-8"), digest_size=16
+        ).hexdigest()
+
+    def _expired(self, stored, now):
+        """Return whether an entry stored at a given time is past its TTL."""
+        return self.ttl_seconds is not None and now - stored > self.ttl_seconds
+
+    def get_many(self, corpus):
+        """
+        Look up the predictions of many preprocessed reviews.
+
+        input:
+        - corpus: list, preprocessed reviews
+        output:
+        - labels: list, the cached label or None for every review not in the cache
+        """
+        now = self.clock()
+        labels = []
+        for text in corpus:
+            key = self.key(text)
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[1], now):
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                labels.append(None)
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                labels.append(entry[0])
+        return labels
+
+    def put_many(self, corpus, labels):
+        """
+        Store the predictions of many preprocessed reviews and evict if over capacity.
+
+        input:
+        - corpus: list, preprocessed reviews
+        - labels: array, the predicted label of each review
+        """
+        now = self.clock()
+        for text, label in zip(corpus, labels):
+            key = self.key(text)
+            self._entries[key] = (label.item(), now)
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    @property
+    def hit_rate(self):
+        """Share of lookups served from the cache."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        """Return the counters of the cache as a dict."""
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate,
+        }
+
+    def save(self, path):
+        """Write the unexpired entries to a JSON file, in LRU order."""
+        now = self.clock()
+        entries = [
+            [key, label, stored]
+            for key, (label, stored) in self._entries.items()
+            if not self._expired(stored, now)
+        ]
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "entries": entries}, f)
+        logger.info(f"Saved {len(entries)} cached predictions to {path}")
+
+    def load(self, path):
+        """
+        Read entries written by save, if the file exists and is for this version.
+
+        input:
+        - path: str, the JSON file
+        output:
+        - loaded: int, number of entries read
+        """
+        path = Path(path)
+        if not path.exists():
+            return 0
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data["version"] != self.version:
+            logger.info(f"Ignoring cached predictions of {data['version']} in {path}")
+            return 0
+
+        now = self.clock()
+        loaded = 0
+        for key, label, stored in data["entries"]:
+            if not self._expired(stored, now):
+                self._entries[key] = (label, stored)
+                self._entries.move_to_end(key)
+                loaded += 1
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+        return loaded
+
+
+def cached_predictor(predict, cache):
+    """
+    Wraps a predictor so repeated reviews skip vectorization and prediction.
+
+    input:
+    - predict: function mapping a list of preprocessed reviews to predicted labels
+    - cache: PredictionCache of the same model version
+    output:
+    - predict: function with the same signature that only scores cache misses
+    """
+
+    def predict_cached(corpus):
+        corpus = list(corpus)
+        labels = cache.get_many(corpus)
+        # Repeated reviews within one batch are scored once
+        misses = list(
+            dict.fromkeys(text for text, label in zip(corpus, labels) if label is None)
+        )
+        if misses:
+            predicted = predict(misses)
+            cache.put_many(misses, predicted)
+            scored = {text: label.item() for text, label in zip(misses, predicted)}
+            labels = [
+                scored[text] if label is None else label
+                for text, label in zip(corpus, labels)
+            ]
+        return np.array(labels)
+
+    return predict_cached
@@ -0,0 +1,182 @@
+"""On-disk cache of preprocessed reviews keyed by a hash of the raw review text."""
+
+import hashlib
+import sqlite3
+from importlib import metadata
+from pathlib import Path
+
+from loguru import logger
+
+# SQLite limits the number of host parameters per statement
+_BATCH_SIZE = 500
+
+
+def lib_ml_version():
+    """Return the installed lib_ml version, or None if it cannot be determined."""
+    try:
+        return metadata.version("lib_ml")
+    except metadata.PackageNotFoundError:
+        return None
+
+
+class PreprocessCache:
+    """
+    Key/value file mapping raw reviews to their preprocessed text.
+
+    Keys are a hash of the raw review plus the lib_ml version, so upgrading lib_ml
+    never serves output of an older Preprocessor; without a known version the cache
+    refuses to open. When the stored entries exceed max_bytes the least recently used
+    ones are evicted.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, version=None):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.version = version or lib_ml_version()
+        if self.version is None:
+            raise ValueError(
+                "Cannot determine the lib_ml version, cached reviews could be stale"
+            )
+        self.hits = 0
+        self.misses = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key BLOB PRIMARY KEY, value TEXT NOT NULL, "
+            "size INTEGER NOT NULL, used INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+        self._clock, self._size = self._conn.execute(
+            "SELECT COALESCE(MAX(used), 0), COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def key(self, text):
+        """Return the cache key of a raw review."""
+        return hashlib.blake2b(
+            f"{self.version}\0{text}".encode("utf-8"), digest_size=16
+        ).digest()
+
+    def get_many(self, texts):
+        """
+        Look up the preprocessed text of many raw reviews.
+
+        input:
+        - texts: list, the raw reviews
+        output:
+        - values: list, the preprocessed text or None for every review not in the cache
+        """
+        keys = [self.key(text) for text in texts]
+        found = {}
+        for start in range(0, len(keys), _BATCH_SIZE):
+            batch = keys[start : start + _BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            found.update(
+                self._conn.execute(
+                    f"SELECT key, value FROM entries WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+            )
+
+        self._clock += 1
+        self._conn.executemany(
+            "UPDATE entries SET used = ? WHERE key = ?",
+            [(self._clock, k) for k in found],
+        )
+
+        values = [found.get(k) for k in keys]
+        hits = sum(value is not None for value in values)
+        self.hits += hits
+        self.misses += len(values) - hits
+        return values
+
+    def put_many(self, texts, values):
+        """
+        Store the preprocessed text of many raw reviews and evict if over budget.
+
+        input:
+        - texts: list, the raw reviews
+        - values: list, the preprocessed text of each review
+        """
+        self._clock += 1
+        rows = {}
+        for text, value in zip(texts, values):
+            key = self.key(text)
+            rows[key] = (key, value, len(key) + len(value.encode("utf-8")), self._clock)
+
+        # Entries that are replaced no longer count towards the size
+        keys = list(rows)
+        for start in range(0, len(keys), _BATCH_SIZE):
+            batch = keys[start : start + _BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            self._size -= self._conn.execute(
+                f"SELECT COALESCE(SUM(size), 0) FROM entries "
+                f"WHERE key IN ({placeholders})",
+                batch,
+            ).fetchone()[0]
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", rows.values()
+        )
+        self._size += sum(row[2] for row in rows.values())
+        self._evict()
+        self._conn.commit()
+
+    def size_bytes(self):
+        """Return the total size of the stored keys and values."""
+        return self._size
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        excess = self._size - self.max_bytes
+        if excess <= 0:
+            return
+
+        evicted = []
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM entries ORDER BY used"
+        ):
+            evicted.append((key,))
+            excess -= size
+            self._size -= size
+            if excess <= 0:
+                break
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
+        logger.info(
+            f"Evicted {len(evicted)} entries from preprocessing cache {self.path}"
+        )
+
+    @property
+    def hit_rate(self):
+        """Share of lookups served from the cache."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def close(self):
+        """Commit pending writes and close the cache file."""
+        self._conn.commit()
+        self._conn.close()
+
+
+def open_cache(path, max_bytes=256 * 1024 * 1024):
+    """
+    Opens the preprocessing cache of the installed lib_ml version.
+
+    input:
+    - path: str, location of the cache file
+    - max_bytes: int, size budget of the cache
+    output:
+    - cache: PreprocessCache, or None if the lib_ml version is unknown
+    """
+    if lib_ml_version() is None:
+        logger.warning(
+            "Cannot determine the lib_ml version, preprocessing without the cache"
+        )
+        return None
+    return PreprocessCache(path, max_bytes=max_bytes)
@@ -1,70 +1,304 @@
 """Preprocessing utilities for the sentiment analysis model training pipeline."""
 
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-import joblib
-import numpy as np
 import pandas as pd
 import typer
 from lib_ml.preprocessing import Preprocessor
 from loguru import logger
-from sklearn.feature_extraction.text import CountVectorizer
 
 from model_training.config import PROCESSED_DATA_DIR, RAW_DATA_DIR
+from model_training.feature_store import FeatureStore
+from model_training.features import (
+    BOW_PATH,
+    BlockVectorizer,
+    build_vectorizer,
+    check_vocab_state,
+    vectorize_and_split,
+)
+from model_training.preprocess_cache import open_cache
+from model_training.vocabulary import incremental_vectorizer
 
 app = typer.Typer()
 
+# Preprocessor owned by the current worker process, see _init_worker
+_WORKER_PREPROCESSOR = None
 
-def preprocess_data(dataset):
+
+def _init_worker():
+    """Create the single Preprocessor instance used by a pool worker."""
+    global _WORKER_PREPROCESSOR  # pylint: disable=global-statement
+    _WORKER_PREPROCESSOR = Preprocessor()
+
+
+def _process_chunk(chunk):
+    """Preprocess one chunk of the dataset inside a pool worker."""
+    return _WORKER_PREPROCESSOR.process(chunk)
+
+
+def iter_chunks(dataset, chunk_size):
+    """
+    Splits the dataset into consecutive chunks with a fresh 0-based index.
+
+    input:
+    - dataset: DataFrame, the dataset to split
+    - chunk_size: int, maximum number of rows per chunk
+    output:
+    - generator of DataFrames, in the original row order
+    """
+    for start in range(0, len(dataset), chunk_size):
+        yield dataset.iloc[start : start + chunk_size].reset_index(drop=True)
+
+
+def _run_preprocessor(dataset, workers, chunk_size):
+    """Run the Preprocessor over the dataset, in a process pool if workers > 1."""
+    if workers > 1 and len(dataset) > chunk_size:
+        logger.info(f"Using {workers} workers with chunks of {chunk_size} rows")
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            corpus = []
+            for processed in pool.map(_process_chunk, iter_chunks(dataset, chunk_size)):
+                corpus.extend(processed)
+        return corpus
+
+    preprocessor = Preprocessor()
+    return preprocessor.process(dataset)
+
+
+def _run_cached(dataset, workers, chunk_size, cache):
+    """Serve reviews from the cache and only run the Preprocessor on the misses."""
+    texts = [str(text) for text in dataset["Review"]]
+    corpus = cache.get_many(texts)
+    missing = [i for i, processed in enumerate(corpus) if processed is None]
+
+    if missing:
+        subset = dataset.iloc[missing].reset_index(drop=True)
+        processed = _run_preprocessor(subset, workers, chunk_size)
+        cache.put_many([texts[i] for i in missing], processed)
+        for i, item in zip(missing, processed):
+            corpus[i] = item
+
+    hits = len(corpus) - len(missing)
+    logger.info(
+        f"Preprocessing cache: {hits} hits, {len(missing)} misses "
+        f"({hits / max(len(corpus), 1):.1%} hit rate)"
+    )
+    return corpus
+
+
+def preprocess_data(dataset, workers=1, chunk_size=10000, cache=None):
     """
     Preprocesses the dataset using the Preprocessor class.
 
+    With workers > 1 the dataset is split into chunks of chunk_size rows that are
+    processed in a process pool, one Preprocessor per worker. The chunks are put
+    back together in the original order, so the corpus is identical to the serial one.
+    With a cache only reviews that were not preprocessed before are processed.
+
     input:
     - dataset: DataFrame, the raw dataset containing the text data and labels
+    - workers: int, number of worker processes to use
+    - chunk_size: int, number of rows handed to a worker at once
+    - cache: PreprocessCache, optional cache of previously preprocessed reviews
     output:
     - corpus: list, the preprocessed text data
     """
-    preprocessor = Preprocessor()
     logger.info("Starting preprocessing...")
-    corpus = preprocessor.process(dataset)
-    logger.info("Preprocessing completed.")
+    start = time.perf_counter()
+
+    if cache is not None:
+        corpus = _run_cached(dataset, workers, chunk_size, cache)
+    else:
+        corpus = _run_preprocessor(dataset, workers, chunk_size)
+
+    elapsed = time.perf_counter() - start
+    rate = len(dataset) / elapsed if elapsed > 0 else float("inf")
+    logger.info(
+        f"Preprocessing completed: {len(dataset)} rows in {elapsed:.2f}s "
+        f"({rate:.0f} rows/sec)."
+    )
 
     return corpus
 
 
+def clean_processed(corpus, labels):
+    """
+    Builds the processed dataset and drops rows with missing or empty reviews.
+
+    input:
+    - corpus: list, the preprocessed text data
+    - labels: Series, the labels belonging to the corpus
+    output:
+    - processed_df: DataFrame, the cleaned dataset with Review and Liked columns
+    """
+    processed_df = pd.DataFrame({"Review": corpus, "Liked": labels})
+    processed_df.dropna(subset=["Review"], inplace=True)
+    return processed_df[processed_df["Review"].astype(str).str.strip() != ""]
+
+
+# pylint: disable=too-many-arguments, too-many-positional-arguments
+def preprocess_stream(
+    input_path,
+    output_path,
+    block_size,
+    workers=1,
+    chunk_size=10000,
+    cache=None,
+    on_block=None,
+):
+    """
+    Preprocesses the raw TSV block by block and appends each block to the output TSV.
+
+    Only one block of block_size rows is held in memory at a time, so memory use does
+    not grow with the size of the input file. Every cleaned block is also handed to
+    on_block, so later steps can consume it without reading the output TSV back.
+
+    input:
+    - input_path: str, the raw dataset
+    - output_path: str, where to store the preprocessed dataset
+    - block_size: int, number of rows read from the input at once
+    - workers: int, number of worker processes used per block
+    - chunk_size: int, number of rows handed to a worker at once
+    - cache: PreprocessCache, optional cache of previously preprocessed reviews
+    - on_block: callable, optional, called with the DataFrame of every cleaned block
+    output:
+    - rows_written: int, number of non-empty reviews written
+    """
+    rows_read = 0
+    rows_written = 0
+    output_written = False
+    try:
+        reader = pd.read_csv(
+            input_path, delimiter="\t", quoting=3, chunksize=block_size
+        )
+    except pd.errors.EmptyDataError:
+        reader = []
+    for i, block in enumerate(reader):
+        block = block.reset_index(drop=True)
+        corpus = preprocess_data(
+            block, workers=workers, chunk_size=chunk_size, cache=cache
+        )
+        processed_df = clean_processed(corpus, block["Liked"])
+        processed_df.to_csv(
+            output_path,
+            sep="\t",
+            index=False,
+            mode="w" if i == 0 else "a",
+            header=i == 0,
+        )
+        output_written = True
+        if on_block is not None:
+            on_block(processed_df)
+        rows_read += len(block)
+        rows_written += len(processed_df)
+        logger.info(
+            f"Streamed {rows_read} rows, {rows_written} written to {output_path}"
+        )
+
+    if not output_written:
+        # No blocks at all, still write the header so the output always exists
+        clean_processed([], []).to_csv(output_path, sep="\t", index=False)
+    return rows_written
+
+
+# pylint: disable=too-many-arguments, too-many-positional-arguments, too-many-locals
 @app.command()
 def main(
     input_path: Path = RAW_DATA_DIR / "a1_RestaurantReviews_HistoricDump.tsv",
     output_path: Path = PROCESSED_DATA_DIR / "a1_RestaurantReviews_HistoricDump.tsv",
     save_npy: bool = True,
+    workers: int = typer.Option(1, help="Number of preprocessing worker processes"),
+    chunk_size: int = typer.Option(10000, help="Rows per chunk handed to a worker"),
+    stream: bool = typer.Option(False, help="Read, preprocess and write in blocks"),
+    block_size: int = typer.Option(100000, help="Rows read per block in stream mode"),
+    cache: bool = typer.Option(True, help="Reuse previously preprocessed reviews"),
+    cache_path: Path = PROCESSED_DATA_DIR / "preprocess_cache.sqlite",
+    cache_max_mb: int = typer.Option(
+        256, help="Size budget of the preprocessing cache"
+    ),
+    bow_output_path: Path = BOW_PATH,
+    test_size: float = 0.2,
+    random_state: int = 1,
+    sparse: bool = typer.Option(False, help="Save features as sparse CSR .npz files"),
+    featurizer: str = typer.Option("count", help="Feature mode: count or hashing"),
+    n_features: int = typer.Option(
+        4096, help="Number of buckets of the hashing featurizer"
+    ),
+    store_dir: Path = typer.Option(
+        None, help="Save the splits to a feature store here"
+    ),
+    vocab_state: Path = typer.Option(
+        None, help="Update the count vocabulary incrementally from this state file"
+    ),
+    dtype: str = typer.Option("auto", help="Count dtype: auto, uint8, uint16 or int64"),
 ):
-    """CLI entry point for preprocessing the dataset."""
-    # Load raw data from file
-    logger.info(f"Loading dataset from: {input_path}")
-    dataset = pd.read_csv(input_path, delimiter="\t", quoting=3)
+    """
+    CLI entry point for preprocessing the dataset.
+
+    With --save-npy the preprocessed corpus is also vectorized and split into the
+    train/test arrays, so no separate feature extraction stage is needed.
+    """
+    check_vocab_state(featurizer, vocab_state)
+    review_cache = None
+    if cache:
+        review_cache = open_cache(cache_path, max_bytes=cache_max_mb * 1024 * 1024)
 
-    # Preprocess data
-    corpus = preprocess_data(dataset)
-    processed_df = pd.DataFrame({"Review": corpus, "Liked": dataset["Liked"]})
+    if stream:
+        logger.info(
+            f"Streaming dataset from: {input_path} in blocks of {block_size} rows"
+        )
+        # Vectorize every block as it streams by and spool its text to disk, so the
+        # text is never held in full
+        blocks = BlockVectorizer(
+            build_vectorizer(featurizer, n_features), workers, vocab_state
+        )
+        preprocess_stream(
+            input_path,
+            output_path,
+            block_size,
+            workers,
+            chunk_size,
+            review_cache,
+            blocks.add if save_npy else None,
+        )
+    else:
+        # Load raw data from file
+        logger.info(f"Loading dataset from: {input_path}")
+        dataset = pd.read_csv(input_path, delimiter="\t", quoting=3)
 
-    # Remove any rows with missing or empty reviews
-    processed_df.dropna(subset=["Review"], inplace=True)
-    processed_df = processed_df[processed_df["Review"].str.strip() != ""]
+        # Preprocess data and remove any rows with missing or empty reviews
+        corpus = preprocess_data(dataset, workers, chunk_size, review_cache)
+        processed_df = clean_processed(corpus, dataset["Liked"])
 
-    # Save cleaned data
-    processed_df.to_csv(output_path, sep="\t", index=False)
+        # Save cleaned data
+        processed_df.to_csv(output_path, sep="\t", index=False)
     logger.info(f"Saved preprocessed data to {output_path}")
 
+    if review_cache is not None:
+        logger.info(
+            f"Preprocessing cache hit rate: {review_cache.hit_rate:.1%} "
+            f"({review_cache.hits} hits, {review_cache.misses} misses)"
+        )
+        review_cache.close()
+
     if save_npy:
-        logger.info("Converting text to BoW features...")
-        vectorizer = CountVectorizer(max_features=1420)
-        x = vectorizer.fit_transform(processed_df["Review"]).toarray()
-        y = processed_df["Liked"].values
-
-        joblib.dump(vectorizer, PROCESSED_DATA_DIR / "c1_BoW_Sentiment_Model.pkl")
-        np.save(PROCESSED_DATA_DIR / "features_train.npy", x)
-        np.save(PROCESSED_DATA_DIR / "labels_train.npy", y)
-        logger.info("Saved features and labels as .npy files.")
+        if vocab_state and not stream:
+            corpus = processed_df["Review"].tolist()
+            vectorizer = incremental_vectorizer(corpus, vocab_state)
+        else:
+            vectorizer = build_vectorizer(featurizer, n_features)
+        vectorize_and_split(
+            blocks if stream else processed_df,
+            bow_output_path,
+            test_size,
+            random_state,
+            sparse,
+            vectorizer,
+            workers,
+            FeatureStore(store_dir) if store_dir else None,
+            dtype,
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,223 @@
+"""Registry of the trained model versions, loaded lazily and kept in an LRU."""
+
+import hashlib
+import json
+import os
+import pickle
+from collections import OrderedDict
+from pathlib import Path
+
+import joblib
+import typer
+from loguru import logger
+
+from model_training.config import MODELS_DIR, REPORTS_DIR
+from model_training.features import BOW_PATH
+
+app = typer.Typer()
+
+MANIFEST_NAME = "manifest.json"
+
+
+def model_path(version, models_dir=MODELS_DIR):
+    """Location of the model file of a version."""
+    return Path(models_dir) / version / f"{version}_Sentiment_Model.pkl"
+
+
+def metrics_path(version, reports_dir=REPORTS_DIR):
+    """Location of the evaluation metrics of a version."""
+    return Path(reports_dir) / f"{version}_metrics.json"
+
+
+def file_sha256(path, block_size=1 << 20):
+    """Return the hex SHA-256 of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    """
+    Index of the model versions in models_dir and an LRU of the loaded models.
+
+    The manifest lists the version, path, size, SHA-256 and evaluation metrics of every
+    model file. Only refresh scans the models and saves it next to them, and files
+    whose size and modification time did not change are not hashed again. Loading a
+    model never reads or writes the manifest, so a read-only models_dir can be served.
+    Models and vectorizers are unpickled on first use, and at most capacity models and
+    capacity vectorizers stay loaded.
+    """
+
+    def __init__(
+        self,
+        models_dir=MODELS_DIR,
+        bow_path=BOW_PATH,
+        reports_dir=REPORTS_DIR,
+        capacity=4,
+    ):
+        self.models_dir = Path(models_dir)
+        self.bow_path = Path(bow_path)
+        self.reports_dir = Path(reports_dir)
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._manifest = None
+        self._models = OrderedDict()
+        self._vectorizers = OrderedDict()
+
+    @property
+    def manifest_path(self):
+        """Location of the saved manifest."""
+        return self.models_dir / MANIFEST_NAME
+
+    def _read_saved_manifest(self):
+        """Return the saved manifest entries by version, empty if there are none."""
+        if not self.manifest_path.exists():
+            return {}
+        with open(self.manifest_path, encoding="utf-8") as f:
+            return {entry["version"]: entry for entry in json.load(f)["models"]}
+
+    def refresh(self):
+        """
+        Scans models_dir and rewrites the manifest.
+
+        output:
+        - manifest: dict, the manifest entry of every version, by version
+        """
+        saved = self._read_saved_manifest()
+        manifest = {}
+        for path in sorted(self.models_dir.glob("*/*_Sentiment_Model.pkl")):
+            version = path.parent.name
+            if path != model_path(version, self.models_dir):
+                continue
+            stat = path.stat()
+            entry = saved.get(version)
+            if (
+                entry is None
+                or entry["size_bytes"] != stat.st_size
+                or entry["modified"] != stat.st_mtime
+            ):
+                entry = {
+                    "version": version,
+                    "path": str(path.relative_to(self.models_dir)),
+                    "size_bytes": stat.st_size,
+                    "modified": stat.st_mtime,
+                    "sha256": file_sha256(path),
+                }
+
+            metrics_file = metrics_path(version, self.reports_dir)
+            entry["metrics"] = None
+            if metrics_file.exists():
+                with open(metrics_file, encoding="utf-8") as f:
+                    entry["metrics"] = json.load(f)
+            manifest[version] = entry
+
+        # Write then rename, so concurrent readers never see a partial manifest
+        self.models_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"models": list(manifest.values())}, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+        self._manifest = manifest
+        return manifest
+
+    @property
+    def manifest(self):
+        """Manifest entries by version, as last saved by refresh."""
+        if self._manifest is None:
+            self._manifest = self._read_saved_manifest()
+        return self._manifest
+
+    def versions(self):
+        """Return the registered versions, sorted by name."""
+        return sorted(self.manifest)
+
+    def entry(self, version):
+        """Return the manifest entry of a version."""
+        if version not in self.manifest:
+            raise KeyError(
+                f"Model version {version} not in {self.manifest_path}, "
+                f"run `python model_training/registry.py index`"
+            )
+        return self.manifest[version]
+
+    def model(self, version):
+        """
+        Returns the model of a version, loading it on first use.
+
+        input:
+        - version: str, the model version in models_dir
+        output:
+        - classifier: the unpickled model, shared by all callers
+        """
+        if version in self._models:
+            self.hits += 1
+            self._models.move_to_end(version)
+            return self._models[version]
+
+        self.misses += 1
+        path = model_path(version, self.models_dir)
+        if not path.exists():
+            raise KeyError(f"Model version {version} not found in {self.models_dir}")
+        logger.info(f"Loading model {version} from {path}")
+        return self._keep(self._models, version, joblib.load(path), "model")
+
+    def vectorizer(self, bow_path=None):
+        """Returns the BoW vectorizer, unpickled once per path and kept in the LRU."""
+        bow_path = Path(bow_path or self.bow_path)
+        if bow_path in self._vectorizers:
+            self._vectorizers.move_to_end(bow_path)
+            return self._vectorizers[bow_path]
+
+        with open(bow_path, "rb") as f:
+            vectorizer = pickle.load(f)
+        return self._keep(self._vectorizers, bow_path, vectorizer, "vectorizer")
+
+    def _keep(self, cache, key, value, kind):
+        """Adds a loaded object to an LRU and evicts the oldest beyond capacity."""
+        cache[key] = value
+        while len(cache) > self.capacity:
+            evicted, _ = cache.popitem(last=False)
+            logger.info(f"Unloaded {kind} {evicted}")
+        return value
+
+    def load(self, version, bow_path=None):
+        """Return the model of a version and the vectorizer it is used with."""
+        return self.model(version), self.vectorizer(bow_path)
+
+
+_DEFAULT_REGISTRY = None
+
+
+def default_registry():
+    """Return the registry of MODELS_DIR shared by the whole process."""
+    global _DEFAULT_REGISTRY  # pylint: disable=global-statement
+    if _DEFAULT_REGISTRY is None:
+        _DEFAULT_REGISTRY = ModelRegistry()
+    return _DEFAULT_REGISTRY
+
+
+@app.command("index")
+def index_command(models_dir: Path = MODELS_DIR):
+    """Scan the model versions and write the manifest."""
+    registry = ModelRegistry(models_dir)
+    manifest = registry.refresh()
+    logger.info(f"Indexed {len(manifest)} model versions in {registry.manifest_path}")
+
+
+@app.command("list")
+def list_command(models_dir: Path = MODELS_DIR):
+    """Scan the model versions, write the manifest and print every version."""
+    for entry in ModelRegistry(models_dir).refresh().values():
+        accuracy = (entry["metrics"] or {}).get("accuracy")
+        typer.echo(
+            f"{entry['version']}\t{entry['size_bytes']} bytes\t"
+            f"{entry['sha256'][:12]}\t"
+            f"accuracy {'-' if accuracy is None else f'{accuracy:.4f}'}"
+        )
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,356 @@
+"""Batched mutamorphic robustness testing of the sentiment analysis model."""
+
+import functools
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import joblib
+import nltk
+import numpy as np
+import pandas as pd
+import typer
+from loguru import logger
+from sklearn.feature_extraction.text import CountVectorizer
+
+from model_training.evaluate import predict_in_blocks
+from model_training.preprocessing import preprocess_data
+from model_training.registry import model_path as version_model_path
+
+app = typer.Typer()
+
+MUTAMORPHIC_DATA_FILENAME = "mutamorphic_data.tsv"
+
+# Metamorphic relations, in the order their quarter of the rows is transformed
+RELATIONS = ("synonyms", "negation", "shuffle", "irrelevant")
+
+NEUTRAL_PHRASES = (
+    "I had cereal today.",
+    "It's a sunny day.",
+    "The sky is blue.",
+    "I walked my dog this morning.",
+    "I like coffee.",
+    "Water boils at 100 degrees Celsius.",
+    "The train arrived on time.",
+    "I charged my phone last night.",
+    "She went to the grocery store.",
+    "It's currently Tuesday.",
+    "He wore a blue shirt.",
+    "There are 24 hours in a day.",
+    "My laptop is on the desk.",
+    "Birds can fly.",
+    "The light turned green.",
+    "They are watching a documentary.",
+    "The book is on the shelf.",
+    "I took the bus to work.",
+    "It rained last night.",
+    "The meeting starts at 10 a.m.",
+)
+
+# Description of every robustness metric, in report order
+METRICS = {
+    "CONSISTENCY_RATE": "Same predictions before and after transformation",
+    "LABEL_PRESERVATION_RATE": "Labels preserved where they should be",
+    "FLIPPING_RATE": "Predictions flipped where they should flip",
+    "ACCURACY_DROP": "Accuracy drop after mutamorphic transformation",
+}
+
+
+def download_wordnet():
+    """Download the WordNet corpora used for synonyms, if not present yet."""
+    nltk.download("wordnet", quiet=True)
+    nltk.download("omw-1.4", quiet=True)
+
+
+@functools.lru_cache(maxsize=None)
+def synonym_candidates(word):
+    """Return the lemmas of the first WordNet synset of a word, except the word."""
+    from nltk.corpus import wordnet  # pylint: disable=import-outside-toplevel
+
+    synsets = wordnet.synsets(word)
+    if not synsets:
+        return ()
+    return tuple(
+        lemma.name().replace("_", " ")
+        for lemma in synsets[0].lemmas()
+        if lemma.name().lower() != word.lower()
+    )
+
+
+def _candidates_chunk(words):
+    """Look up the synonym candidates of a chunk of words inside a pool worker."""
+    return [synonym_candidates(word) for word in words]
+
+
+def synonym_table(texts, seed=42, workers=1, chunk_size=2000):
+    """
+    Builds the synonym of every distinct token once.
+
+    input:
+    - texts: list, the texts to be transformed
+    - seed: int, seed of the choice among the synonyms of a word
+    - workers: int, number of processes looking up WordNet
+    - chunk_size: int, number of words handed to a worker at once
+    output:
+    - table: dict mapping every token that has a synonym to that synonym
+    """
+    words = sorted({token for text in texts for token in text.split()})
+    chunks = [words[i : i + chunk_size] for i in range(0, len(words), chunk_size)]
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            candidates = [
+                c for part in pool.map(_candidates_chunk, chunks) for c in part
+            ]
+    else:
+        candidates = [synonym_candidates(word) for word in words]
+
+    rng = np.random.default_rng(seed)
+    return {
+        word: options[rng.integers(len(options))]
+        for word, options in zip(words, candidates)
+        if options
+    }
+
+
+def replace_synonyms(texts, table):
+    """MR1: replace every token that has a synonym by it."""
+    return [
+        " ".join(table.get(token, token) for token in text.split()) for text in texts
+    ]
+
+
+def invert_negation(texts):
+    """MR2: drop "not" from texts that contain it, else insert it after one word."""
+    inverted = []
+    for text in texts:
+        tokens = text.split()
+        if "not" in tokens:
+            tokens = [token for token in tokens if token.lower() != "not"]
+        else:
+            tokens.insert(1 if len(tokens) > 1 else 0, "not")
+        inverted.append(" ".join(tokens))
+    return inverted
+
+
+def shuffle_word_order(texts, rng):
+    """MR3: shuffle the inner words, or all words of texts of up to three words."""
+    shuffled = []
+    for text in texts:
+        tokens = text.split()
+        if len(tokens) > 3:
+            tokens[1:-1] = rng.permutation(tokens[1:-1]).tolist()
+        else:
+            tokens = rng.permutation(tokens).tolist()
+        shuffled.append(" ".join(tokens))
+    return shuffled
+
+
+def add_irrelevant_info(texts, rng):
+    """MR4: append a random neutral sentence to every text."""
+    phrases = rng.choice(NEUTRAL_PHRASES, size=len(texts))
+    return (pd.Series(texts, dtype=object) + " " + phrases).tolist()
+
+
+def invert_labels(labels):
+    """Swap the 0 and 1 labels, whether stored as numbers or strings."""
+    labels = pd.Series(labels)
+    as_text = labels.astype(str)
+    inverted = as_text.map({"0": "1", "1": "0"}).fillna(as_text)
+    return inverted.astype(labels.dtype).values
+
+
+def generate_mutamorphic_dataset(df, seed=42, workers=1):
+    """
+    Transforms every quarter of the reviews with one metamorphic relation.
+
+    The rows are shuffled and dealt round-robin over RELATIONS, then every relation
+    transforms its whole column at once.
+
+    input:
+    - df: DataFrame with text and label columns
+    - seed: int, seed of the shuffle and the random transformations
+    - workers: int, number of processes building the synonym table
+    output:
+    - transformed_df: DataFrame with original_text, original_label, transformed_text
+      and transformed_label columns, grouped by relation
+    """
+    shuffled = df.sample(frac=1, random_state=seed).reset_index(drop=True)
+    relation = np.arange(len(shuffled)) % len(RELATIONS)
+    rng = np.random.default_rng(seed)
+
+    parts = []
+    for index, name in enumerate(RELATIONS):
+        subset = shuffled[relation == index]
+        texts = subset["text"].astype(str).tolist()
+        labels = subset["label"].values
+        if name == "synonyms":
+            transformed = replace_synonyms(texts, synonym_table(texts, seed, workers))
+        elif name == "negation":
+            transformed = invert_negation(texts)
+            labels = invert_labels(labels)
+        elif name == "shuffle":
+            transformed = shuffle_word_order(texts, rng)
+        else:
+            transformed = add_irrelevant_info(texts, rng)
+        parts.append(
+            pd.DataFrame(
+                {
+                    "original_text": subset["text"].values,
+                    "original_label": subset["label"].values,
+                    "transformed_text": transformed,
+                    "transformed_label": labels,
+                }
+            )
+        )
+    return pd.concat(parts, ignore_index=True)
+
+
+def preprocess_texts(texts, workers=1):
+    """
+    Preprocesses every distinct text once.
+
+    input:
+    - texts: iterable of raw texts, possibly repeated
+    - workers: int, number of preprocessing worker processes
+    output:
+    - processed: dict mapping every raw text to its preprocessed text
+    """
+    unique = list(dict.fromkeys(str(text) for text in texts))
+    corpus = preprocess_data(pd.DataFrame({"Review": unique}), workers=workers)
+    return dict(zip(unique, corpus))
+
+
+def robustness_metrics(df):
+    """
+    Computes the robustness metrics from the predictions before and after.
+
+    input:
+    - df: DataFrame from generate_mutamorphic_dataset with pred_original and
+      pred_transformed columns
+    output:
+    - values: dict with the value of every metric in METRICS that applies
+    """
+    original_label = df["original_label"].astype(str).values
+    transformed_label = df["transformed_label"].astype(str).values
+    pred_original = df["pred_original"].astype(str).values
+    pred_transformed = df["pred_transformed"].astype(str).values
+    same_prediction = pred_original == pred_transformed
+
+    values = {"CONSISTENCY_RATE": same_prediction.mean()}
+    preserved = original_label == transformed_label
+    if preserved.any():
+        values["LABEL_PRESERVATION_RATE"] = (
+            pred_transformed[preserved] == original_label[preserved]
+        ).mean()
+    if (~preserved).any():
+        values["FLIPPING_RATE"] = (~same_prediction[~preserved]).mean()
+    values["ACCURACY_DROP"] = (pred_original == original_label).mean() - (
+        pred_transformed == transformed_label
+    ).mean()
+    return {name: float(value) for name, value in values.items()}
+
+
+def run_robustness(model, df, workers=1, seed=42):
+    """
+    Generates the mutamorphic dataset of df and scores the model on it.
+
+    All original and transformed texts are preprocessed in one shared pass. The
+    vectorizer is fitted on the original texts and both columns are predicted with
+    one batched call each.
+
+    input:
+    - model: trained model
+    - df: DataFrame with text and label columns
+    - workers: int, number of worker processes for WordNet and preprocessing
+    - seed: int, seed of the transformations
+    output:
+    - results_df: DataFrame, the mutamorphic dataset with both predictions
+    - values: dict from robustness_metrics
+    """
+    results_df = generate_mutamorphic_dataset(df, seed, workers)
+    processed = preprocess_texts(
+        list(df["text"]) + list(results_df["transformed_text"]), workers
+    )
+
+    vectorizer = CountVectorizer(max_features=1420)
+    vectorizer.fit([processed[str(text)] for text in df["text"]])
+    for column in ("original", "transformed"):
+        corpus = [processed[str(text)] for text in results_df[f"{column}_text"]]
+        y_pred = predict_in_blocks(model, vectorizer.transform(corpus))
+        results_df[f"pred_{column}"] = y_pred
+    return results_df, robustness_metrics(results_df)
+
+
+def load_model(model_path):
+    """Load a model from a file path or the name of a version in models/."""
+    path = Path(model_path)
+    if not path.exists():
+        path = version_model_path(str(model_path))
+    if not path.exists():
+        raise FileNotFoundError(f"Model not found: {Path(model_path).resolve()}")
+    logger.info(f"Loading model from {path}")
+    return joblib.load(path)
+
+
+def run_and_save(input_path, model_path, workers=1):
+    """
+    Runs the robustness test on a TSV of texts and labels and saves its results.
+
+    The mutamorphic dataset, the predictions and the metrics are written next to the
+    input file, as mutamorphic_data.tsv, mutamorphic_predictions.tsv and
+    mutamorphic_metrics.csv.
+
+    input:
+    - input_path: str, TSV whose first two columns are the text and the label
+    - model_path: str, the model file or a version name
+    - workers: int, number of worker processes
+    output:
+    - results: list of dicts with the name, value, description and category of every
+      metric
+    """
+    input_path = Path(input_path)
+    base_dir = input_path.resolve().parent
+    df = pd.read_csv(input_path, sep="\t", names=["text", "label"])
+    model = load_model(model_path)
+
+    download_wordnet()
+    results_df, values = run_robustness(model, df, workers)
+    results_df[
+        ["original_text", "original_label", "transformed_text", "transformed_label"]
+    ].to_csv(base_dir / MUTAMORPHIC_DATA_FILENAME, sep="\t", index=False)
+    results_df.to_csv(base_dir / "mutamorphic_predictions.tsv", sep="\t", index=False)
+
+    results = [
+        {
+            "name": name,
+            "value": values[name],
+            "description": description,
+            "category": "MUTAMORPHIC_TESTING",
+        }
+        for name, description in METRICS.items()
+        if name in values
+    ]
+    pd.DataFrame(results).to_csv(
+        base_dir / "mutamorphic_metrics.csv", sep="\t", index=False
+    )
+    for result in results:
+        logger.info(f"{result['name']}: {result['value']:.3f}")
+    logger.info(f"Robustness results saved to {base_dir}")
+    return results
+
+
+@app.command()
+def main(
+    input_path: Path = typer.Option(
+        ..., "--input", help="TSV data file with text and label"
+    ),
+    model_version: str = typer.Option(
+        "test_model_dev", help="Model file or version name to load"
+    ),
+    workers: int = typer.Option(1, help="Number of worker processes"),
+):
+    """CLI entry point for the mutamorphic robustness test."""
+    run_and_save(input_path, model_version, workers)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,84 @@
+"""Sparse matrix-multiply scoring of Gaussian Naive Bayes models.
+
+Only NumPy is imported, so the bundle can score without sklearn or scipy; sparse
+input is any matrix with the scipy.sparse interface.
+"""
+
+import numpy as np
+
+
+def _is_sparse(x):
+    """Return whether x is a scipy.sparse matrix or array."""
+    return hasattr(x, "tocsr")
+
+
+class NaiveBayesScorer:
+    """
+    Scores feature rows with the parameters of a fitted GaussianNB.
+
+    The Gaussian log-likelihood of class c expands to
+
+        const_c + sum_j x_j * theta_cj / var_cj - 0.5 * sum_j x_j^2 / var_cj
+
+    so the per-class constants and the two weight matrices are computed once, and the
+    joint log-likelihood of a CSR matrix is two sparse-dense products in which zero
+    counts cost nothing.
+    """
+
+    def __init__(self, classes, class_prior, theta, var):
+        theta = np.asarray(theta, dtype=np.float64)
+        var = np.asarray(var, dtype=np.float64)
+        self.classes = np.asarray(classes)
+        self.n_features = theta.shape[1]
+        self.const = (
+            np.log(class_prior)
+            - 0.5 * np.sum(np.log(2.0 * np.pi * var), axis=1)
+            - 0.5 * np.sum(theta**2 / var, axis=1)
+        )
+        self.linear = np.ascontiguousarray((theta / var).T)
+        self.quadratic = np.ascontiguousarray((-0.5 / var).T)
+
+    @classmethod
+    def from_classifier(cls, classifier):
+        """Build a scorer from a fitted GaussianNB."""
+        return cls(
+            classifier.classes_,
+            classifier.class_prior_,
+            classifier.theta_,
+            classifier.var_,
+        )
+
+    def joint_log_likelihood(self, x):
+        """
+        Computes the log prior plus log-likelihood of every class for every row.
+
+        input:
+        - x: CSR matrix or dense array of features
+        output:
+        - jll: array of shape (n_rows, n_classes)
+        """
+        if _is_sparse(x):
+            x = x.tocsr().astype(np.float64)
+            squared = x.multiply(x)
+        else:
+            x = np.asarray(x, dtype=np.float64)
+            squared = x * x
+        return (
+            np.asarray(x @ self.linear)
+            + np.asarray(squared @ self.quadratic)
+            + self.const
+        )
+
+    def predict(self, x):
+        """Return the predicted class of every row."""
+        return self.classes[np.argmax(self.joint_log_likelihood(x), axis=1)]
+
+    def predict_log_proba(self, x):
+        """Return the log class probabilities of every row."""
+        jll = self.joint_log_likelihood(x)
+        top = jll.max(axis=1, keepdims=True)
+        return jll - (top + np.log(np.exp(jll - top).sum(axis=1, keepdims=True)))
+
+    def predict_proba(self, x):
+        """Return the class probabilities of every row."""
+        return np.exp(self.predict_log_proba(x))
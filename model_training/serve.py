@@ -0,0 +1,252 @@
+"""Local asyncio HTTP inference server that scores concurrent requests in batches."""
+
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+import typer
+from lib_ml.preprocessing import Preprocessor
+from loguru import logger
+
+from model_training.features import BOW_PATH
+from model_training.predict import load_predictor
+from model_training.prediction_cache import PredictionCache, cached_predictor
+
+app = typer.Typer()
+
+_STATUS = {
+    200: "200 OK",
+    400: "400 Bad Request",
+    404: "404 Not Found",
+    500: "500 Internal Server Error",
+}
+
+
+def make_scorer(predict):
+    """
+    Wraps a predictor so it scores raw reviews, one preprocessing call per batch.
+
+    input:
+    - predict: function from predict.load_predictor, on preprocessed reviews
+    output:
+    - score: function mapping a list of raw reviews to predicted labels
+    """
+    preprocessor = Preprocessor()
+
+    def score(texts):
+        corpus = preprocessor.process(pd.DataFrame({"Review": texts}))
+        return [label.item() for label in predict(corpus)]
+
+    return score
+
+
+class DynamicBatcher:
+    """
+    Collects concurrent requests and scores them together.
+
+    A batch is scored once max_batch_size requests are waiting, or max_delay_ms after
+    its first request arrived. Scoring runs in a worker thread, so the event loop keeps
+    accepting requests meanwhile. When scoring a batch fails, every request of that
+    batch gets the exception.
+    """
+
+    def __init__(self, score, max_batch_size=64, max_delay_ms=5.0):
+        self.score = score
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay_ms / 1000
+        self.requests = 0
+        self.batches = 0
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    async def submit(self, text):
+        """Queue one review and wait for its prediction."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _collect(self):
+        """Wait for the next batch of queued requests."""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_delay
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self):
+        """Score batches until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            texts = [text for text, _ in batch]
+            try:
+                labels = await loop.run_in_executor(self._executor, self.score, texts)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.requests += len(batch)
+            self.batches += 1
+            for (_, future), label in zip(batch, labels):
+                if not future.done():
+                    future.set_result(label)
+
+    @property
+    def mean_batch_size(self):
+        """Average number of requests scored together."""
+        return self.requests / self.batches if self.batches else 0.0
+
+    def close(self):
+        """Fail the requests still queued and shut down the worker thread."""
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Server is shutting down"))
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+class InferenceServer:
+    """
+    Minimal HTTP/1.1 server with keep-alive.
+
+    Routes:
+    - POST /predict with a JSON body {text_field: review} returns {"prediction": label}
+    - GET /health returns the server status, batching and prediction cache statistics
+    """
+
+    def __init__(self, batcher, version=None, text_field="Review", cache=None):
+        self.batcher = batcher
+        self.version = version
+        self.text_field = text_field
+        self.cache = cache
+        self._batcher_task = None
+
+    async def start(self, host="127.0.0.1", port=8080):
+        """Start the batcher and listen on host and port, 0 for any free port."""
+        self._batcher_task = asyncio.create_task(self.batcher.run())
+        return await asyncio.start_server(self._handle, host, port)
+
+    async def stop(self):
+        """Cancel the batcher and shut down its worker thread."""
+        if self._batcher_task is not None:
+            self._batcher_task.cancel()
+            try:
+                await self._batcher_task
+            except asyncio.CancelledError:
+                pass
+            self._batcher_task = None
+        self.batcher.close()
+
+    async def _route(self, method, target, body):
+        """Return the status code and JSON payload of a request."""
+        if method == "GET" and target == "/health":
+            health = {
+                "status": "ok",
+                "version": self.version,
+                "requests": self.batcher.requests,
+                "mean_batch_size": self.batcher.mean_batch_size,
+            }
+            if self.cache is not None:
+                health["prediction_cache"] = self.cache.stats()
+            return 200, health
+        if method != "POST" or target != "/predict":
+            return 404, {"error": f"No route for {method} {target}"}
+
+        try:
+            text = json.loads(body)[self.text_field]
+        except (ValueError, KeyError, TypeError):
+            return 400, {"error": f"Expected a JSON object with a {self.text_field!r}"}
+        try:
+            return 200, {"prediction": await self.batcher.submit(str(text))}
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.error(f"Scoring failed: {e!r}")
+            return 500, {"error": "Scoring failed"}
+
+    async def _handle(self, reader, writer):
+        """Serve the requests of one connection until it is closed."""
+        try:
+            while request_line := await reader.readline():
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                status, payload = await self._route(method, target, body)
+                data = json.dumps(payload).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {_STATUS[status]}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+# pylint: disable=too-many-arguments, too-many-positional-arguments
+async def serve(predict, version, host, port, max_batch_size, max_delay_ms, cache=None):
+    """Run the inference server until interrupted."""
+    if cache is not None:
+        predict = cached_predictor(predict, cache)
+    batcher = DynamicBatcher(make_scorer(predict), max_batch_size, max_delay_ms)
+    inference = InferenceServer(batcher, version, cache=cache)
+    server = await inference.start(host, port)
+    logger.info(
+        f"Serving {version} on http://{host}:{port} "
+        f"(batches of up to {max_batch_size}, {max_delay_ms} ms delay)"
+    )
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await inference.stop()
+
+
+# pylint: disable=too-many-arguments, too-many-positional-arguments
+@app.command()
+def main(
+    version: str = typer.Option(..., help="Model version name (e.g., v1.0.0)"),
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    max_batch_size: int = typer.Option(64, help="Most requests scored together"),
+    max_delay_ms: float = typer.Option(
+        5.0, help="Longest time a request waits for others to join its batch"
+    ),
+    bow_path: Path = BOW_PATH,
+    bundle: bool = typer.Option(False, help="Use the pickle-free bundle of the model"),
+    prediction_cache_size: int = typer.Option(
+        100_000, help="Most predictions kept in memory, 0 to disable the cache"
+    ),
+    prediction_cache_ttl: float = typer.Option(
+        None, help="Seconds a cached prediction stays valid, forever if not set"
+    ),
+):
+    """CLI entry point for serving a model version over HTTP on localhost."""
+    predict = load_predictor(version, bow_path, bundle)
+    cache = None
+    if prediction_cache_size > 0:
+        cache = PredictionCache(version, prediction_cache_size, prediction_cache_ttl)
+    asyncio.run(
+        serve(predict, version, host, port, max_batch_size, max_delay_ms, cache)
+    )
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,37 @@
+"""Sorted string tables stored as one UTF-8 byte array plus offsets."""
+
+import numpy as np
+
+
+def encode_strings(strings):
+    """
+    Packs strings into one UTF-8 byte table plus offsets.
+
+    input:
+    - strings: iterable of str
+    output:
+    - data: uint8 array, the concatenated UTF-8 bytes
+    - offsets: int64 array, string i is data[offsets[i]:offsets[i + 1]]
+    """
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(string) for string in encoded])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def decode_strings(data, offsets):
+    """
+    Unpacks strings packed by encode_strings.
+
+    input:
+    - data: uint8 array, the concatenated UTF-8 bytes, may be memory-mapped
+    - offsets: int64 array, the start of every string plus the end of the last one
+    output:
+    - strings: list of str
+    """
+    raw = np.asarray(data).tobytes()
+    offsets = np.asarray(offsets).tolist()
+    return [
+        raw[offsets[i] : offsets[i + 1]].decode("utf-8")
+        for i in range(len(offsets) - 1)
+    ]
@@ -0,0 +1,194 @@
+"""Parallel hyperparameter and model-family sweep over a shared feature matrix."""
+
+import itertools
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import typer
+from loguru import logger
+from numpy.lib.format import open_memmap
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import train_test_split
+from sklearn.naive_bayes import ComplementNB, GaussianNB, MultinomialNB
+
+from model_training.config import EXPERIMENTS_DIR, PROCESSED_DATA_DIR
+from model_training.features import gather_rows, load_features
+
+app = typer.Typer()
+
+# Model class and fixed keyword arguments of every family that can be swept
+MODEL_FAMILIES = {
+    "gaussian_nb": (GaussianNB, {}),
+    "multinomial_nb": (MultinomialNB, {}),
+    "complement_nb": (ComplementNB, {}),
+    "logistic_regression": (LogisticRegression, {"max_iter": 1000}),
+}
+
+DEFAULT_GRID = {
+    "gaussian_nb": {"var_smoothing": [1e-11, 1e-9, 1e-7, 1e-5, 1e-3]},
+    "multinomial_nb": {"alpha": [0.01, 0.1, 0.5, 1.0, 2.0]},
+    "complement_nb": {"alpha": [0.01, 0.1, 0.5, 1.0, 2.0]},
+    "logistic_regression": {"C": [0.01, 0.1, 1.0, 10.0]},
+}
+
+# Memory-mapped split shared by the sweep workers, see _init_worker
+_WORKER_DATA = None
+
+
+def _init_worker(shared_path, labels, n_train):
+    """Open the shared feature matrix once per pool worker."""
+    global _WORKER_DATA  # pylint: disable=global-statement
+    x = np.load(shared_path, mmap_mode="r")
+    _WORKER_DATA = (x[:n_train], x[n_train:], labels[:n_train], labels[n_train:])
+
+
+def expand_grid(grid):
+    """
+    Expands a grid into the candidates to evaluate.
+
+    input:
+    - grid: dict, per model family a dict of parameter names and lists of values
+    output:
+    - candidates: list of (family, params) tuples, one per parameter combination
+    """
+    candidates = []
+    for family, params in grid.items():
+        if family not in MODEL_FAMILIES:
+            raise ValueError(
+                f"Unknown model family {family!r}, expected one of "
+                f"{tuple(MODEL_FAMILIES)}"
+            )
+        names = sorted(params)
+        for values in itertools.product(*(params[name] for name in names)):
+            candidates.append((family, dict(zip(names, values))))
+    return candidates
+
+
+def _evaluate_candidate(candidate):
+    """Fit and score one candidate on the shared split inside a pool worker."""
+    family, params = candidate
+    x_train, x_val, y_train, y_val = _WORKER_DATA
+    model_class, fixed = MODEL_FAMILIES[family]
+    classifier = model_class(**fixed, **params)
+
+    start = time.perf_counter()
+    classifier.fit(x_train, y_train)
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    y_pred = classifier.predict(x_val)
+    predict_seconds = time.perf_counter() - start
+
+    return {
+        "family": family,
+        "params": params,
+        "accuracy": accuracy_score(y_val, y_pred),
+        "fit_seconds": fit_seconds,
+        "predict_us_per_row": predict_seconds / max(len(y_val), 1) * 1e6,
+    }
+
+
+def write_shared_split(x, y, path, test_size=0.2, random_state=0, block_size=4096):
+    """
+    Writes the train rows followed by the validation rows to one .npy file.
+
+    The rows are split as train.py splits them and copied block by block, so the
+    workers can memory-map both parts as contiguous zero-copy views.
+
+    input:
+    - x: array-like or sparse matrix, the feature set
+    - y: array-like, the labels
+    - path: str, where to write the shared matrix
+    - test_size: float, share of the rows used for validation
+    - random_state: int, seed used when splitting
+    - block_size: int, number of rows copied at once
+    output:
+    - labels: array, the labels in the order of the shared matrix
+    - n_train: int, number of training rows
+    """
+    train_index, val_index = train_test_split(
+        np.arange(x.shape[0]), test_size=test_size, random_state=random_state
+    )
+    order = np.concatenate([train_index, val_index])
+    shared = open_memmap(path, mode="w+", dtype=x.dtype, shape=x.shape)
+    gather_rows(x, order, shared, block_size).flush()
+    return np.asarray(y)[order], len(train_index)
+
+
+def run_sweep(x, y, grid=None, workers=1, workdir=None):
+    """
+    Evaluates every candidate of the grid in a process pool.
+
+    The feature matrix is written once to a shared .npy file that every worker
+    memory-maps, so the workers share one page-cached copy instead of each loading
+    the arrays.
+
+    input:
+    - x: array-like or sparse matrix, the training features
+    - y: array-like, the training labels
+    - grid: dict, per model family the parameter values to try, DEFAULT_GRID by default
+    - workers: int, number of worker processes to use
+    - workdir: str, where to create the temporary directory of the shared matrix
+    output:
+    - leaderboard: list of dicts, the candidates ranked by accuracy, then fit time
+    """
+    candidates = expand_grid(grid or DEFAULT_GRID)
+    logger.info(f"Sweeping {len(candidates)} candidates with {workers} workers")
+
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        shared_path = Path(tmp) / "sweep_features.npy"
+        labels, n_train = write_shared_split(x, y, shared_path)
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(shared_path, labels, n_train),
+        ) as pool:
+            results = list(pool.map(_evaluate_candidate, candidates))
+
+    leaderboard = sorted(results, key=lambda r: (-r["accuracy"], r["fit_seconds"]))
+    for rank, result in enumerate(leaderboard, start=1):
+        result["rank"] = rank
+    return leaderboard
+
+
+@app.command()
+def main(
+    features_path: Path = PROCESSED_DATA_DIR / "features_train.npy",
+    labels_path: Path = PROCESSED_DATA_DIR / "labels_train.npy",
+    grid_path: Path = typer.Option(
+        None, help="JSON file with the grid, the default grid if not given"
+    ),
+    workers: int = typer.Option(os.cpu_count(), help="Number of worker processes"),
+    output_path: Path = EXPERIMENTS_DIR / "sweep_leaderboard.json",
+):
+    """CLI entry point for sweeping model families and hyperparameters."""
+    grid = None
+    if grid_path:
+        with open(grid_path, encoding="utf-8") as f:
+            grid = json.load(f)
+
+    logger.info(f"Loading training data from {features_path}")
+    x = load_features(features_path, mmap_mode="r")
+    y = np.load(labels_path)
+
+    leaderboard = run_sweep(x, y, grid, workers)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(leaderboard, f, indent=2)
+
+    best = leaderboard[0]
+    logger.info(
+        f"Best candidate: {best['family']} {best['params']} "
+        f"with accuracy {best['accuracy']:.4f}"
+    )
+    logger.info(f"Leaderboard saved to {output_path}")
+
+
+if __name__ == "__main__":
+    app()
@@ -1,61 +1,407 @@
 """Train the sentiment analysis model using preprocessed .npy files."""
 
+import time
 from pathlib import Path
 
 import joblib
 import numpy as np
 import typer
 from loguru import logger
-from sklearn.metrics import accuracy_score, confusion_matrix
+from numpy.lib.format import open_memmap
+from scipy import sparse as sp
 from sklearn.model_selection import train_test_split
 from sklearn.naive_bayes import GaussianNB
 
-from model_training.config import MODELS_DIR, PROCESSED_DATA_DIR
+from model_training.config import PROCESSED_DATA_DIR
 from model_training.ensure_versioning import Ensurance
+from model_training.evaluate import predict_in_blocks
+from model_training.feature_store import FeatureStore
+from model_training.features import (
+    SPLIT_PATHS,
+    gather_rows,
+    iter_row_blocks,
+    load_features,
+    load_texts,
+    save_features,
+    save_texts,
+    text_paths,
+)
+from model_training.metrics import confusion_counts
+from model_training.naive_bayes import pooled_variance
+from model_training.registry import model_path as version_model_path
+from model_training.warm_start import (
+    hash_rows,
+    row_hashes,
+    training_rows_path,
+    warm_start_from_version,
+)
 
 app = typer.Typer()
 
 
+def refit_epsilon(classifier):
+    """
+    Recomputes the variance smoothing of a GaussianNB fitted with partial_fit.
+
+    partial_fit derives epsilon_ from the variance of each batch on its own. The
+    variance of all rows seen follows from the per-class counts, means and variances,
+    so epsilon_ is recomputed from it to match a single fit on the whole training set.
+
+    input:
+    - classifier: GaussianNB fitted with partial_fit
+    output:
+    - classifier: the same model with epsilon_ and var_ corrected
+    """
+    class_var = classifier.var_ - classifier.epsilon_
+    total_var = pooled_variance(classifier.class_count_, classifier.theta_, class_var)
+    classifier.epsilon_ = classifier.var_smoothing * total_var.max()
+    classifier.var_ = class_var + classifier.epsilon_
+    return classifier
+
+
+def fit_chunks(classifier, chunks, y, keep=None):
+    """
+    Fit a classifier with partial_fit on a stream of dense chunks of rows.
+
+    input:
+    - classifier: model supporting partial_fit
+    - chunks: iterable of dense arrays, consecutive rows of the feature set
+    - y: array-like, labels of all rows
+    - keep: boolean array, the rows to train on, all rows by default
+    output:
+    - classifier: the fitted model
+    """
+    classes = np.unique(y)
+    offset = 0
+    for chunk in chunks:
+        rows = slice(offset, offset + chunk.shape[0])
+        offset = rows.stop
+        if keep is None:
+            classifier.partial_fit(chunk, y[rows], classes=classes)
+        elif keep[rows].any():
+            mask = keep[rows]
+            classifier.partial_fit(chunk[mask], y[rows][mask], classes=classes)
+
+    if isinstance(classifier, GaussianNB):
+        refit_epsilon(classifier)
+    return classifier
+
+
+def fit_in_blocks(classifier, x, y, block_size=2048):
+    """
+    Fit a classifier with partial_fit on dense blocks of rows.
+
+    Used for sparse features, which GaussianNB cannot fit directly; only one block is
+    densified at a time.
+
+    input:
+    - classifier: model supporting partial_fit
+    - x: array-like or sparse matrix, training features
+    - y: array-like, training labels
+    - block_size: int, number of rows passed to partial_fit at once
+    output:
+    - classifier: the fitted model
+    """
+    return fit_chunks(classifier, iter_row_blocks(x, block_size), y)
+
+
+def split_index(n_rows):
+    """
+    Returns the rows train_test_split(x, y, test_size=0.2, random_state=0) selects.
+
+    input:
+    - n_rows: int, number of rows of the training features
+    output:
+    - train_index: array, the rows used for training
+    - test_index: array, the rows of the test split, in the order of x_test
+    """
+    return train_test_split(np.arange(n_rows), test_size=0.2, random_state=0)
+
+
+def split_texts(n_rows, source_dir, target_dir):
+    """
+    Saves the preprocessed reviews of the test rows split_index selects.
+
+    The reviews are taken from the texts_train.tsv saved with the training features.
+    When it is missing or not of these rows, a stale texts_test.tsv is removed instead.
+
+    input:
+    - n_rows: int, number of rows of the training features
+    - source_dir: str, directory of the training features and their reviews
+    - target_dir: str, where the test split is saved
+    """
+    train_path, test_path = text_paths(source_dir)[0], text_paths(target_dir)[1]
+    texts = load_texts(train_path) if train_path.exists() else None
+    if texts is None or len(texts) != n_rows:
+        if texts is not None:
+            logger.warning(f"{train_path} does not match the training features")
+        test_path.unlink(missing_ok=True)
+        return
+    _, test_index = split_index(n_rows)
+    test_path.parent.mkdir(parents=True, exist_ok=True)
+    save_texts(texts.iloc[test_index], test_path)
+
+
+def save_test_split(features_path, labels_path):
+    """
+    Saves the test split of the training features without loading them in memory.
+
+    The test rows are the ones split_index selects, and their preprocessed reviews
+    are saved with them, see split_texts.
+
+    input:
+    - features_path: str, the training features, .npy or .npz
+    - labels_path: str, the training labels
+    """
+    x = load_features(features_path, mmap_mode="r")
+    y = np.load(labels_path)
+    _, test_index = split_index(len(y))
+
+    SPLIT_PATHS[1].parent.mkdir(parents=True, exist_ok=True)
+    if sp.issparse(x):
+        save_features(SPLIT_PATHS[1], x[test_index])
+    else:
+        x_test = open_memmap(
+            SPLIT_PATHS[1],
+            mode="w+",
+            dtype=x.dtype,
+            shape=(len(test_index),) + x.shape[1:],
+        )
+        gather_rows(x, test_index, x_test).flush()
+    np.save(SPLIT_PATHS[3], y[test_index])
+    split_texts(len(y), Path(features_path).parent, SPLIT_PATHS[1].parent)
+
+
+def stream_features(features_path, store=None, chunk_size=2048):
+    """
+    Opens the training features for reading in chunks, without loading them.
+
+    input:
+    - features_path: str, a .npy or .npz feature file, read if store is None
+    - store: FeatureStore, read its features_train array instead
+    - chunk_size: int, maximum number of rows per chunk
+    output:
+    - shape: tuple, shape of the feature set
+    - dtype: numpy dtype of the feature set
+    - chunks: generator of dense arrays, in row order
+    """
+    if store is not None:
+        entry = store.entry("features_train")
+        chunks = (
+            block
+            for shard in store.iter_shards("features_train")
+            for block in iter_row_blocks(shard, chunk_size)
+        )
+        return tuple(entry["shape"]), np.dtype(entry["dtype"]), chunks
+
+    x = load_features(features_path, mmap_mode="r")
+    return x.shape, x.dtype, iter_row_blocks(x, chunk_size)
+
+
+def copy_rows(chunks, index, out):
+    """
+    Passes chunks through while copying the rows in index to out.
+
+    input:
+    - chunks: iterable of dense arrays, consecutive rows of the feature set
+    - index: array, row numbers to copy; out[i] receives row index[i]
+    - out: array, where to copy the rows to
+    output:
+    - generator of the unchanged chunks
+    """
+    order = np.argsort(index)
+    sorted_index = index[order]
+    offset = 0
+    for chunk in chunks:
+        lo, hi = np.searchsorted(sorted_index, [offset, offset + chunk.shape[0]])
+        out[order[lo:hi]] = chunk[sorted_index[lo:hi] - offset]
+        offset += chunk.shape[0]
+        yield chunk
+
+
+def hash_chunks(chunks, labels, out):
+    """
+    Passes chunks through while appending the hashes of their rows to out.
+
+    input:
+    - chunks: iterable of dense arrays, consecutive rows of the feature set
+    - labels: array-like, labels of all rows
+    - out: list, receives one array of row hashes per chunk, see hash_rows
+    output:
+    - generator of the unchanged chunks
+    """
+    offset = 0
+    for chunk in chunks:
+        out.append(hash_rows(chunk, labels[offset : offset + chunk.shape[0]]))
+        offset += chunk.shape[0]
+        yield chunk
+
+
+def train_streaming(
+    features_path, labels, store=None, chunk_size=2048, record_rows=False
+):
+    """
+    Trains a Gaussian Naive Bayes model out of core, one chunk of features at a time.
+
+    The rows are split as train_test_split(x, y, test_size=0.2, random_state=0) would
+    split them. The training rows are passed to partial_fit chunk by chunk and the test
+    rows are written to a memory-mapped .npy file in the same pass, so the feature set
+    never has to fit in memory.
+
+    input:
+    - features_path: str, a .npy or .npz feature file, read if store is None
+    - labels: array-like, labels of all rows
+    - store: FeatureStore, read features_train from the store and write the test split
+      to it
+    - chunk_size: int, number of rows read from disk at once
+    - record_rows: bool, also hash the training rows
+    output:
+    - classifier: the fitted model
+    - x_test: array, the test features
+    - y_test: array, the test labels
+    - train_hashes: uint64 array, hashes of the training rows, see row_hashes, or None
+      if record_rows is False
+    """
+    shape, dtype, chunks = stream_features(features_path, store, chunk_size)
+    train_index, test_index = split_index(shape[0])
+    keep = np.zeros(shape[0], dtype=bool)
+    keep[train_index] = True
+
+    test_path = SPLIT_PATHS[1]
+    if store is not None:
+        store.root.mkdir(parents=True, exist_ok=True)
+        test_path = store.root / "features_test.tmp.npy"
+    x_test = open_memmap(
+        test_path, mode="w+", dtype=dtype, shape=(len(test_index),) + shape[1:]
+    )
+
+    start = time.perf_counter()
+    hashes = []
+    chunks = copy_rows(chunks, test_index, x_test)
+    if record_rows:
+        chunks = hash_chunks(chunks, labels, hashes)
+    classifier = fit_chunks(GaussianNB(), chunks, labels, keep)
+    elapsed = time.perf_counter() - start
+    rate = shape[0] / elapsed if elapsed > 0 else float("inf")
+    logger.info(
+        f"Streamed {shape[0]} rows in chunks of {chunk_size} in {elapsed:.2f}s "
+        f"({rate:.0f} rows/sec)."
+    )
+
+    x_test.flush()
+    y_test = labels[test_index]
+    if store is not None:
+        store.write("features_test", x_test)
+        store.write("labels_test", y_test)
+        del x_test
+        test_path.unlink()
+        x_test = store.load("features_test")
+    else:
+        np.save(SPLIT_PATHS[3], y_test)
+    if not record_rows:
+        return classifier, x_test, y_test, None
+    train_hashes = np.concatenate(hashes)[train_index] if hashes else np.array([])
+    return classifier, x_test, y_test, train_hashes.astype(np.uint64)
+
+
+# pylint: disable=too-many-arguments, too-many-positional-arguments, too-many-locals
 @app.command()
 def train(
     features_path: Path = PROCESSED_DATA_DIR / "features_train.npy",
     labels_path: Path = PROCESSED_DATA_DIR / "labels_train.npy",
     version: str = None,
     evaluate: bool = True,
+    store_dir: Path = typer.Option(None, help="Read the features from a feature store"),
+    stream: bool = typer.Option(False, help="Train out of core with partial_fit"),
+    chunk_size: int = typer.Option(2048, help="Rows read per chunk in stream mode"),
+    from_version: str = typer.Option(
+        None, help="Update this previous version with the changed rows only"
+    ),
+    record_rows: bool = typer.Option(
+        False, help="Save hashes of the training rows for a later --from-version"
+    ),
 ):
     """
     Trains and saves a Gaussian Naive Bayes model.
 
-    Optionally evaluates the model if evaluate=True.
+    The training features can be a dense .npy array, a sparse .npz matrix or the
+    memory-mapped features_train array of a feature store. With --stream the features
+    are read chunk by chunk, so they do not have to fit in memory. With --from-version
+    the previous model is updated with the rows added and removed since, which gives
+    the same model as training from scratch; it needs the row hashes a run with
+    --record-rows saved for the previous version. Optionally evaluates the model if
+    evaluate=True.
     """
     version = version or Ensurance().return_version()
     logger.info(f"Using model version: {version}")
 
-    logger.info("Loading training data...")
-    x = np.load(features_path)
-    y = np.load(labels_path)
+    store = FeatureStore(store_dir) if store_dir else None
+    if store is not None:
+        y = np.asarray(store.load("labels_train"))
+    else:
+        y = np.load(labels_path)
 
-    x_train, x_test, y_train, y_test = train_test_split(
-        x, y, test_size=0.2, random_state=0
-    )
-    np.save(PROCESSED_DATA_DIR / "features_test.npy", x_test)
-    np.save(PROCESSED_DATA_DIR / "labels_test.npy", y_test)
+    model_path = version_model_path(version)
+    model_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Keep the reviews of the test rows next to the test features, for the slices
+    if store is not None:
+        split_texts(len(y), store.root, store.root)
+    else:
+        split_texts(len(y), Path(features_path).parent, SPLIT_PATHS[1].parent)
+
+    if stream:
+        if from_version:
+            logger.info("Warm start needs the features in memory, ignoring it")
+        logger.info("Training Gaussian Naive Bayes model on streamed chunks...")
+        classifier, x_test, y_test, train_hashes = train_streaming(
+            features_path, np.asarray(y), store, chunk_size, record_rows
+        )
+    else:
+        logger.info("Loading training data...")
+        if store is not None:
+            x = store.load("features_train")
+        else:
+            x = load_features(features_path)
+
+        x_train, x_test, y_train, y_test = train_test_split(
+            x, y, test_size=0.2, random_state=0
+        )
+        if store is not None:
+            store.write("features_test", x_test)
+            store.write("labels_test", y_test)
+        else:
+            save_features(SPLIT_PATHS[1], x_test)
+            np.save(SPLIT_PATHS[3], y_test)
 
-    model_dir = MODELS_DIR / version
-    model_dir.mkdir(parents=True, exist_ok=True)
-    model_path = model_dir / f"{version}_Sentiment_Model.pkl"
+        train_hashes = None
+        if record_rows or from_version:
+            train_hashes = row_hashes(x_train, y_train)
+        classifier = None
+        if from_version:
+            classifier = warm_start_from_version(
+                from_version, train_hashes, (x_train, y_train), (x_test, y_test)
+            )
+            if classifier is None:
+                logger.info("Falling back to training from scratch")
 
-    logger.info("Training Gaussian Naive Bayes model...")
-    classifier = GaussianNB()
-    classifier.fit(x_train, y_train)
+        if classifier is None:
+            logger.info("Training Gaussian Naive Bayes model...")
+            classifier = GaussianNB()
+            if sp.issparse(x_train):
+                fit_in_blocks(classifier, x_train, y_train)
+            else:
+                classifier.fit(x_train, y_train)
     joblib.dump(classifier, model_path)
+    if record_rows:
+        np.save(training_rows_path(version), np.sort(train_hashes))
     logger.info(f"Model saved to {model_path}")
 
     if evaluate:
         logger.info("Evaluating model...")
-        y_pred = classifier.predict(x_test)
-        acc = accuracy_score(y_test, y_pred)
-        cm = confusion_matrix(y_test, y_pred)
+        y_pred = predict_in_blocks(classifier, x_test)
+        cm = confusion_counts(y_test, y_pred, classifier.classes_)
+        acc = np.trace(cm) / cm.sum()
         logger.info(f"Accuracy: {acc}")
         logger.info(f"Confusion Matrix:\n{cm}")
 
@@ -0,0 +1,241 @@
+"""Incrementally maintained bag-of-words vocabulary for append-only review data."""
+
+import json
+from pathlib import Path
+
+import numpy as np
+from loguru import logger
+from scipy import sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer
+
+from model_training.string_table import decode_strings, encode_strings
+
+
+class IncrementalVocabulary:
+    """
+    Term statistics of every review seen so far, updated from new reviews only.
+
+    For every term the total count and the document frequency are kept, so the top-k
+    vocabulary of CountVectorizer(max_features=k) over all reviews can be derived
+    without re-tokenizing the history. CountVectorizer ranks terms by total count,
+    with ties resolved the same way here because the counts are kept in the same
+    alphabetical order.
+    """
+
+    def __init__(self, max_features=1420):
+        self.max_features = max_features
+        self.n_docs = 0
+        self.terms = np.array([], dtype=str)
+        self.term_counts = np.array([], dtype=np.int64)
+        self.doc_counts = np.array([], dtype=np.int64)
+
+    def update(self, corpus):
+        """
+        Adds the term statistics of new reviews.
+
+        input:
+        - corpus: list, the new preprocessed reviews only
+        """
+        self.add_counts(*count_terms(corpus))
+
+    def add_counts(self, x, new_terms):
+        """
+        Adds the term statistics of new reviews that were already counted.
+
+        input:
+        - x: CSR matrix, the term counts of the new reviews, one row per review
+        - new_terms: array, the sorted terms of the columns of x
+        """
+        self.n_docs += x.shape[0]
+        doc_totals = np.bincount(x.indices, minlength=len(new_terms))
+        # Terms that only occur in other rows of the block are not counted
+        present = np.flatnonzero(doc_totals)
+        if not len(present):
+            return
+        x = x[:, present]
+        new_terms = new_terms[present]
+
+        terms = np.union1d(self.terms, new_terms)
+        term_counts = np.zeros(len(terms), dtype=np.int64)
+        doc_counts = np.zeros(len(terms), dtype=np.int64)
+
+        old = np.searchsorted(terms, self.terms)
+        term_counts[old] = self.term_counts
+        doc_counts[old] = self.doc_counts
+
+        new = np.searchsorted(terms, new_terms)
+        term_counts[new] += np.asarray(x.sum(axis=0)).ravel()
+        doc_counts[new] += doc_totals[present]
+
+        self.terms, self.term_counts, self.doc_counts = terms, term_counts, doc_counts
+
+    def vocabulary(self):
+        """Return the sorted top max_features terms, as CountVectorizer selects them."""
+        if self.max_features is None or len(self.terms) <= self.max_features:
+            return self.terms
+        top = (-self.term_counts).argsort()[: self.max_features]
+        return np.sort(self.terms[top])
+
+    def to_vectorizer(self):
+        """Return a CountVectorizer with the current top-k vocabulary fixed."""
+        return CountVectorizer(vocabulary=self.vocabulary().tolist())
+
+    def save(self, path):
+        """Persist the term statistics as a compact .npz file."""
+        data, offsets = encode_strings(self.terms)
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                terms_data=data,
+                terms_offsets=offsets,
+                term_counts=self.term_counts,
+                doc_counts=self.doc_counts,
+                n_docs=self.n_docs,
+                max_features=-1 if self.max_features is None else self.max_features,
+            )
+
+    @classmethod
+    def load(cls, path):
+        """Load term statistics persisted by save."""
+        with np.load(path) as state:
+            max_features = int(state["max_features"])
+            vocabulary = cls(None if max_features < 0 else max_features)
+            vocabulary.n_docs = int(state["n_docs"])
+            vocabulary.terms = np.array(
+                decode_strings(state["terms_data"], state["terms_offsets"]), dtype=str
+            )
+            vocabulary.term_counts = state["term_counts"]
+            vocabulary.doc_counts = state["doc_counts"]
+        return vocabulary
+
+
+def count_terms(corpus):
+    """
+    Counts the terms of a corpus against its own sorted vocabulary.
+
+    input:
+    - corpus: list, preprocessed reviews
+    output:
+    - x: CSR matrix, the term counts, one row per review
+    - terms: array, the sorted terms of the columns of x
+    """
+    counter = CountVectorizer()
+    try:
+        x = counter.fit_transform(corpus).tocsr()
+    except ValueError:
+        # No tokens at all, e.g. an empty block
+        return sp.csr_matrix((len(corpus), 0), dtype=np.int64), np.array([], dtype=str)
+    return x, counter.get_feature_names_out().astype(str)
+
+
+def remap_columns(x, terms, vocabulary):
+    """
+    Maps the columns of a count matrix onto another sorted vocabulary.
+
+    Columns of terms outside the vocabulary are dropped and vocabulary terms missing
+    from terms get an empty column.
+
+    input:
+    - x: CSR matrix, term counts with one column per entry of terms
+    - terms: array, the sorted terms of the columns of x
+    - vocabulary: array, the sorted terms of the result columns
+    output:
+    - x: CSR matrix with one column per vocabulary term
+    """
+    columns = np.searchsorted(vocabulary, terms)
+    known = columns < len(vocabulary)
+    known[known] = vocabulary[columns[known]] == terms[known]
+
+    kept = x[:, np.flatnonzero(known)].tocsr()
+    # Both term lists are sorted, so the remapped column indices stay sorted
+    return sp.csr_matrix(
+        (kept.data, columns[known][kept.indices], kept.indptr),
+        shape=(x.shape[0], len(vocabulary)),
+    )
+
+
+def load_vocabulary(state_path, max_features=1420):
+    """Load the persisted term statistics, or start empty ones if there are none."""
+    state_path = Path(state_path)
+    if state_path.exists():
+        return IncrementalVocabulary.load(state_path)
+    return IncrementalVocabulary(max_features)
+
+
+def save_vocabulary(state, state_path, old_vocabulary, n_new):
+    """
+    Persists updated term statistics and the columns that changed with them.
+
+    input:
+    - state: IncrementalVocabulary, the updated statistics
+    - state_path: str, location of the persisted term statistics
+    - old_vocabulary: array, the vocabulary before the update
+    - n_new: int, number of reviews added by the update
+    """
+    state_path = Path(state_path)
+    state.save(state_path)
+
+    changes = vocabulary_changes(old_vocabulary, state.vocabulary())
+    changes_path = state_path.with_suffix(".changes.json")
+    with open(changes_path, "w", encoding="utf-8") as f:
+        json.dump(changes, f, indent=2)
+    logger.info(
+        f"Updated vocabulary with {n_new} new reviews: "
+        f"{len(changes['changed_columns'])} changed columns, see {changes_path}"
+    )
+
+
+def vocabulary_changes(old_vocabulary, new_vocabulary):
+    """
+    Compares two vocabularies column by column.
+
+    input:
+    - old_vocabulary: array-like, the sorted terms of the previous vocabulary
+    - new_vocabulary: array-like, the sorted terms of the new vocabulary
+    output:
+    - changes: dict, the changed feature columns and the added and removed terms
+    """
+    old_vocabulary, new_vocabulary = list(old_vocabulary), list(new_vocabulary)
+    width = max(len(old_vocabulary), len(new_vocabulary))
+    old_padded = old_vocabulary + [None] * (width - len(old_vocabulary))
+    new_padded = new_vocabulary + [None] * (width - len(new_vocabulary))
+    return {
+        "changed_columns": [i for i in range(width) if old_padded[i] != new_padded[i]],
+        "added_terms": sorted(set(new_vocabulary) - set(old_vocabulary)),
+        "removed_terms": sorted(set(old_vocabulary) - set(new_vocabulary)),
+    }
+
+
+def incremental_vectorizer(corpus, state_path, max_features=1420):
+    """
+    Updates the persisted vocabulary with the reviews appended since the last run.
+
+    The dataset is assumed to be append-only: the first n_docs reviews of the corpus
+    are the ones already counted, only the rest is tokenized. The changed columns are
+    written next to the state file, so downstream artifacts can be rebuilt selectively.
+
+    input:
+    - corpus: list, all preprocessed reviews, old ones first
+    - state_path: str, location of the persisted term statistics
+    - max_features: int, vocabulary size
+    output:
+    - vectorizer: CountVectorizer with the updated vocabulary fixed
+    """
+    state = load_vocabulary(state_path, max_features)
+    check_appended(len(corpus), state.n_docs, state_path)
+
+    old_vocabulary = state.vocabulary()
+    new_docs = corpus[state.n_docs :]
+    state.update(new_docs)
+    save_vocabulary(state, state_path, old_vocabulary, len(new_docs))
+
+    return state.to_vectorizer()
+
+
+def check_appended(n_reviews, n_counted, state_path):
+    """Raise a ValueError if the corpus is shorter than the reviews already counted."""
+    if n_reviews < n_counted:
+        raise ValueError(
+            f"Corpus has {n_reviews} reviews but {n_counted} were already "
+            f"counted; remove {state_path} to rebuild the vocabulary from scratch"
+        )
@@ -0,0 +1,271 @@
+"""Warm-start retraining of a Gaussian Naive Bayes model from a previous version."""
+
+import hashlib
+from pathlib import Path
+
+import joblib
+import numpy as np
+from loguru import logger
+from scipy import sparse as sp
+from sklearn.naive_bayes import GaussianNB
+
+from model_training.config import MODELS_DIR
+from model_training.features import iter_row_blocks
+from model_training.naive_bayes import (
+    class_statistics,
+    from_gaussian_nb,
+    merge_statistics,
+    subtract_statistics,
+    to_gaussian_nb,
+)
+from model_training.registry import model_path
+
+
+def training_rows_path(version, models_dir=MODELS_DIR):
+    """Location of the record of the rows a model version was trained on."""
+    return Path(models_dir) / version / f"{version}_training_rows.npy"
+
+
+def _mix(words):
+    """Scrambles uint64 words with the splitmix64 finalizer, which maps 0 to 0."""
+    words = words ^ (words >> np.uint64(30))
+    words = words * np.uint64(0xBF58476D1CE4E5B9)
+    words = words ^ (words >> np.uint64(27))
+    words = words * np.uint64(0x94D049BB133111EB)
+    return words ^ (words >> np.uint64(31))
+
+
+def _column_keys(n_columns):
+    """Return an odd, fixed pseudo-random multiplier for every column."""
+    columns = np.arange(1, n_columns + 1, dtype=np.uint64)
+    return _mix(columns * np.uint64(0x9E3779B97F4A7C15)) | np.uint64(1)
+
+
+def _value_words(values):
+    """Return the float64 bit patterns of values as uint64 words."""
+    values = np.ascontiguousarray(values, dtype=np.float64) + 0.0  # -0.0 becomes 0.0
+    return np.frombuffer(values.tobytes(), dtype=np.uint64).reshape(values.shape)
+
+
+def _with_labels(hashes, labels):
+    """Combines row hashes with the hash of every row's label."""
+    names, inverse = np.unique(np.asarray(labels).astype(str), return_inverse=True)
+    label_keys = np.array(
+        [
+            int.from_bytes(
+                hashlib.blake2b(name.encode("utf-8"), digest_size=8).digest(), "little"
+            )
+            for name in names
+        ],
+        dtype=np.uint64,
+    )
+    return _mix(hashes ^ label_keys[inverse.reshape(-1)])
+
+
+def _hash_values(values, columns, indptr, n_columns, labels):
+    """
+    Hashes rows given by their nonzero values, like the arrays of a CSR matrix.
+
+    Every value is scrambled and multiplied by a key of its column, and the products
+    of a row are summed, all in numpy. Zeros would add nothing to the sum, so they can
+    be left out.
+    """
+    terms = _mix(_value_words(values)) * _column_keys(n_columns)[columns]
+    sums = np.concatenate([np.zeros(1, np.uint64), np.cumsum(terms, dtype=np.uint64)])
+    return _with_labels(sums[indptr[1:]] - sums[indptr[:-1]], labels)
+
+
+def hash_rows(block, labels):
+    """
+    Hashes every row of a dense block together with its label.
+
+    The values are hashed as float64, so the hash of a row does not depend on the dtype
+    the features were stored with. Only the nonzero values are read, so a sparse row
+    hashes the same, see row_hashes.
+
+    input:
+    - block: array, dense feature rows
+    - labels: array-like, the label of every row
+    output:
+    - hashes: uint64 array, one hash per row
+    """
+    block = np.asarray(block)
+    n_rows, n_columns = block.shape
+    flat = np.flatnonzero(block)
+    indptr = np.searchsorted(flat, np.arange(n_rows + 1) * n_columns)
+    return _hash_values(
+        block.ravel()[flat], flat % n_columns, indptr, n_columns, labels
+    )
+
+
+def _hash_sparse_rows(x, labels):
+    """Hashes the rows of a sparse matrix from its stored values only."""
+    x = sp.csr_matrix(x, copy=True)
+    x.sum_duplicates()
+    return _hash_values(x.data, x.indices, x.indptr, x.shape[1], labels)
+
+
+def row_hashes(x, y, block_size=2048):
+    """
+    Hashes every row of a feature set together with its label.
+
+    input:
+    - x: array-like or sparse matrix, the feature set
+    - y: array-like, the labels
+    - block_size: int, number of dense rows hashed at once
+    output:
+    - hashes: uint64 array, one hash per row
+    """
+    y = np.asarray(y)
+    if sp.issparse(x):
+        return _hash_sparse_rows(x, y)
+    hashes = [
+        hash_rows(block, y[start : start + block_size])
+        for start, block in zip(
+            range(0, x.shape[0], block_size), iter_row_blocks(x, block_size)
+        )
+    ]
+    return np.concatenate(hashes) if hashes else np.array([], dtype=np.uint64)
+
+
+def _counts_of(keys, unique, counts):
+    """Return the count of every key, 0 for keys not in unique."""
+    result = np.zeros(len(keys), dtype=np.int64)
+    result[np.searchsorted(keys, unique)] = counts
+    return result
+
+
+def pick_rows(hashes, keys, copies):
+    """
+    Picks rows by hash.
+
+    input:
+    - hashes: uint64 array, the hash of every candidate row
+    - keys: sorted uint64 array, the hashes to pick
+    - copies: int array, how many rows to pick of every key
+    output:
+    - rows: sorted array of row numbers, None if there are not enough candidates
+    """
+    order = np.argsort(hashes, kind="stable")
+    sorted_hashes = hashes[order]
+    occurrence = np.arange(len(sorted_hashes)) - np.searchsorted(
+        sorted_hashes, sorted_hashes
+    )
+
+    position = np.minimum(np.searchsorted(keys, sorted_hashes), max(len(keys) - 1, 0))
+    wanted = np.zeros(len(sorted_hashes), dtype=np.int64)
+    if len(keys):
+        match = keys[position] == sorted_hashes
+        wanted[match] = copies[position[match]]
+
+    rows = np.sort(order[occurrence < wanted])
+    return rows if len(rows) == copies.sum() else None
+
+
+def _take(x_train, x_test, rows):
+    """Return rows of x_train and x_test as if they were stacked."""
+    n_train = x_train.shape[0]
+    parts = [x_train[rows[rows < n_train]], x_test[rows[rows >= n_train] - n_train]]
+    return sp.vstack(parts) if sp.issparse(x_train) else np.concatenate(parts)
+
+
+# pylint: disable=too-many-locals
+def warm_start(previous, previous_rows, train_hashes, train_split, test_split):
+    """
+    Updates a previous model with the rows the new training set adds and removes.
+
+    The training rows are compared with the record of the rows the previous model was
+    trained on, by hash. Only the added rows and the removed ones are read to update
+    the per-class statistics, which gives the model a fit on the training split would
+    give. Removed rows are looked up in the current training and test features, the
+    test features are only hashed when there are any; when one is no longer there its
+    features are unknown and None is returned.
+
+    input:
+    - previous: GaussianNB, the model of the previous version
+    - previous_rows: uint64 array, hashes of the rows it was trained on
+    - train_hashes: uint64 array, hashes of the new training rows, see row_hashes
+    - train_split: tuple, the new training features and labels
+    - test_split: tuple, the new test features and labels
+    output:
+    - classifier: GaussianNB equal to a fit on the training split, or None if a full
+      retrain is needed
+    """
+    (x_train, y_train), (x_test, y_test) = train_split, test_split
+    y_train, y_test = np.asarray(y_train), np.asarray(y_test)
+    classes = np.unique(y_train)
+    if (
+        not isinstance(previous, GaussianNB)
+        or not np.array_equal(previous.classes_, classes)
+        or previous.theta_.shape[1] != x_train.shape[1]
+    ):
+        logger.info("Previous model does not match the training data")
+        return None
+
+    new_keys, new_counts = np.unique(train_hashes, return_counts=True)
+    old_keys, old_counts = np.unique(previous_rows, return_counts=True)
+    keys = np.union1d(new_keys, old_keys)
+    diff = _counts_of(keys, new_keys, new_counts) - _counts_of(
+        keys, old_keys, old_counts
+    )
+
+    added = pick_rows(train_hashes, keys[diff > 0], diff[diff > 0])
+    removed = np.array([], dtype=np.int64)
+    if (diff < 0).any():
+        # Only hash the test split when removed rows have to be looked up
+        removed = pick_rows(
+            np.concatenate([train_hashes, row_hashes(x_test, y_test)]),
+            keys[diff < 0],
+            -diff[diff < 0],
+        )
+    if removed is None:
+        logger.info(
+            "Rows of the previous training set are no longer available, for example "
+            "because the vocabulary changed and the previous statistics are of other "
+            "columns"
+        )
+        return None
+    logger.info(
+        f"Warm start: {len(added)} rows added and {len(removed)} rows removed "
+        f"since the previous version"
+    )
+
+    labels = np.concatenate([y_train, y_test])
+    stats = merge_statistics(
+        from_gaussian_nb(previous),
+        class_statistics(x_train[added], y_train[added], classes),
+    )
+    stats = subtract_statistics(
+        stats,
+        class_statistics(_take(x_train, x_test, removed), labels[removed], classes),
+    )
+    return to_gaussian_nb(stats, previous.var_smoothing)
+
+
+def warm_start_from_version(
+    version, train_hashes, train_split, test_split, models_dir=MODELS_DIR
+):
+    """
+    Warm-starts from a saved model version, see warm_start.
+
+    input:
+    - version: str, the previous version, saved in models_dir/<version>/
+    - train_hashes: uint64 array, hashes of the new training rows
+    - train_split: tuple, the new training features and labels
+    - test_split: tuple, the new test features and labels
+    - models_dir: str, directory with one subdirectory per version
+    output:
+    - classifier: GaussianNB equal to a fit on the training split, or None if a full
+      retrain is needed
+    """
+    previous_path = model_path(version, models_dir)
+    logger.info(f"Warm-starting from {previous_path}")
+    previous = joblib.load(previous_path)
+
+    rows_path = training_rows_path(version, models_dir)
+    if not rows_path.exists():
+        logger.info(f"No record of the training rows of {version} at {rows_path}")
+        return None
+    return warm_start(
+        previous, np.load(rows_path), train_hashes, train_split, test_split
+    )
@@ -5,6 +5,7 @@ import os
 import numpy as np
 import pytest
 
+from model_training.preprocess_cache import PreprocessCache, lib_ml_version
 from model_training.train import train
 
 
@@ -40,3 +41,17 @@ def trained_model_file(tmp_path_factory):
         )
 
     return model_path
+
+
+@pytest.fixture(scope="session", name="preprocess_cache")
+def shared_preprocess_cache(tmp_path_factory):
+    """
+    Fixture sharing one preprocessing cache between the tests of a session.
+
+    Reviews preprocessed by an earlier test are not processed again. The cache lives in
+    a temporary directory, so test runs never write to the pipeline's cache. It only
+    lives for one session, so the lib_ml version cannot change under it.
+    """
+    path = tmp_path_factory.mktemp("preprocess_cache") / "preprocess_cache.sqlite"
+    with PreprocessCache(path, version=lib_ml_version() or "session") as cache:
+        yield cache
@@ -0,0 +1,89 @@
+"""Tests for the pickle-free model and vectorizer bundle."""
+
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer
+from sklearn.naive_bayes import GaussianNB
+from utils.log_metrics import log_metric
+
+from model_training.bundle import export_bundle, load_bundle
+from model_training.config import PROJ_ROOT
+
+category = "INFRASTRUCTURE_TESTING"
+
+CORPUS = [
+    "wow love place",
+    "crust good",
+    "tasti textur nasti",
+    "stop late may bank holiday rick steve recommend love",
+    "select menu great price",
+    "get angri want damn pho",
+    "honeslti tast fresh",
+    "potato like rubber could tell made ahead time kept warmer",
+    "fri great",
+    "great touch",
+]
+LABELS = np.array([1, 0, 0, 1, 1, 0, 0, 0, 1, 1])
+
+
+@pytest.fixture(name="fitted")
+def fitted_model():
+    """Fit a vectorizer and model on a small preprocessed corpus."""
+    vectorizer = CountVectorizer(max_features=20)
+    x = vectorizer.fit_transform(CORPUS).toarray()
+    return vectorizer, GaussianNB().fit(x, LABELS)
+
+
+def test_bundle_matches_sklearn(fitted, tmp_path):
+    """Check that the bundle vectorizes and predicts exactly like the sklearn objects."""
+    vectorizer, classifier = fitted
+    bundle = load_bundle(export_bundle(classifier, vectorizer, tmp_path, "v_test"))
+    texts = CORPUS + ["Great great LOVE, and an unknown word", ""]
+
+    expected = vectorizer.transform(texts).toarray()
+    np.testing.assert_array_equal(bundle.transform(texts), expected)
+    np.testing.assert_array_equal(
+        bundle.predict(expected), classifier.predict(expected)
+    )
+    np.testing.assert_allclose(
+        bundle.predict_proba(expected), classifier.predict_proba(expected), atol=1e-12
+    )
+    assert bundle.version == "v_test"
+
+
+def test_bundle_loads_without_sklearn(fitted, tmp_path):
+    """Check that loading a bundle in a fresh process never imports sklearn."""
+    vectorizer, classifier = fitted
+    export_bundle(classifier, vectorizer, tmp_path, "v_test")
+    script = (
+        "import sys\n"
+        "from model_training.bundle import load_bundle\n"
+        f"bundle = load_bundle({str(tmp_path)!r})\n"
+        "bundle.predict_texts(['great place'])\n"
+        "print(any(name.startswith('sklearn') for name in sys.modules))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        capture_output=True,
+        check=True,
+        text=True,
+        cwd=PROJ_ROOT,
+    )
+    sklearn_imported = result.stdout.strip().splitlines()[-1] == "True"
+    log_metric(
+        "BUNDLE_LOAD_IMPORTS_SKLEARN",
+        sklearn_imported,
+        message="Loading a bundle must not import sklearn",
+        category=category,
+    )
+    assert not sklearn_imported
+
+
+def test_bundle_rejects_hashing_vectorizer(fitted, tmp_path):
+    """Check that vectorizers the bundle cannot reproduce are refused."""
+    _, classifier = fitted
+    with pytest.raises(ValueError):
+        export_bundle(classifier, HashingVectorizer(), tmp_path, "v_test")
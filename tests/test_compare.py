@@ -0,0 +1,101 @@
+"""Tests for comparing model versions on one shared test set."""
+
+import joblib
+import numpy as np
+import pytest
+from scipy import sparse as sp
+from scipy import stats
+from sklearn.metrics import accuracy_score
+from sklearn.naive_bayes import GaussianNB
+from utils.log_metrics import log_metric
+
+from model_training import compare
+from model_training.compare import compare_versions, share_sparse
+from model_training.metrics import mcnemar_test
+from model_training.registry import model_path
+
+category = "MODEL_DEVELOPMENT"
+
+
+def test_versions_scored_on_shared_test_set(tmp_path):
+    """Check the per-version metrics and the pairwise tests of a parallel compare."""
+    rng = np.random.default_rng(0)
+    y = rng.integers(0, 2, 1000)
+    x = rng.poisson(np.where(y[:, np.newaxis] == 1, 0.4, 0.1) * np.ones(20))
+    features_path = tmp_path / "features_test.npy"
+    labels_path = tmp_path / "labels_test.npy"
+    np.save(features_path, x[500:].astype(np.float64))
+    np.save(labels_path, y[500:])
+
+    versions = {"v1": 50, "v2": 200, "v3": 500}
+    for version, n_train in versions.items():
+        path = model_path(version, tmp_path / "models")
+        path.parent.mkdir(parents=True)
+        joblib.dump(GaussianNB().fit(x[:n_train], y[:n_train]), path)
+
+    comparison = compare_versions(
+        list(versions),
+        features_path,
+        labels_path,
+        workers=2,
+        models_dir=tmp_path / "models",
+    )
+    for version in versions:
+        classifier = joblib.load(model_path(version, tmp_path / "models"))
+        expected = accuracy_score(y[500:], classifier.predict(x[500:]))
+        assert np.isclose(comparison["metrics"][version]["accuracy"], expected)
+    assert [(t["a"], t["b"]) for t in comparison["pairwise"]] == [
+        ("v1", "v2"),
+        ("v1", "v3"),
+        ("v2", "v3"),
+    ]
+
+    sparse_path = tmp_path / "features_test.npz"
+    sp.save_npz(sparse_path, sp.csr_matrix(x[500:].astype(np.float64)))
+    assert (
+        compare_versions(
+            list(versions), sparse_path, labels_path, 2, tmp_path / "models"
+        )
+        == comparison
+    )
+    with pytest.raises(KeyError):
+        compare_versions(["v9"], features_path, labels_path, 1, tmp_path / "models")
+    assert not (tmp_path / "models" / "manifest.json").exists()
+
+    log_metric(
+        "COMPARE_MIN_MCNEMAR_P",
+        min(t["p_value"] for t in comparison["pairwise"]),
+        message="Smallest McNemar p-value between the compared versions",
+        category=category,
+        precision=4,
+    )
+
+
+def test_workers_memory_map_sparse_features(tmp_path):
+    """Check that workers open a shared CSR matrix without copying its arrays."""
+    x = sp.random(50, 8, density=0.3, format="csr", random_state=0)
+    share_sparse(x, tmp_path)
+
+    compare._init_worker(tmp_path, x.shape)
+    shared = compare._WORKER_FEATURES
+    for name in compare._CSR_ARRAYS:
+        array = getattr(shared, name)
+        while isinstance(array.base, np.ndarray):
+            array = array.base
+        assert isinstance(array, np.memmap)
+    assert (shared != x).nnz == 0
+
+
+def test_mcnemar_test():
+    """Check McNemar's test against its definition on the discordant rows."""
+    correct_a = np.array([True] * 30 + [False] * 10 + [True] * 60)
+    correct_b = np.array([False] * 30 + [True] * 10 + [True] * 60)
+    result = mcnemar_test(correct_a, correct_b)
+    assert (result["only_a_correct"], result["only_b_correct"]) == (30, 10)
+    assert result["test"] == "chi2"
+    assert np.isclose(result["p_value"], stats.chi2.sf((20 - 1) ** 2 / 40, df=1))
+
+    small = mcnemar_test(correct_a[25:], correct_b[25:])
+    assert small["test"] == "exact"
+    assert np.isclose(small["p_value"], stats.binomtest(5, 15, 0.5).pvalue)
+    assert mcnemar_test(correct_a, correct_a)["p_value"] == 1.0
@@ -10,6 +10,7 @@ import pytest
 from lib_ml.preprocessing import Preprocessor
 from sklearn.feature_extraction.text import CountVectorizer
 
+from model_training.preprocessing import clean_processed, preprocess_data, preprocess_stream
 from utils.log_metrics import log_metric
 
 # Adjust this path if DVC moves the file or if renamed in preprocessing stage
@@ -101,3 +102,77 @@ def test_feature_preprocessing_latency():
         category=category,
         precision=5
     )
+
+
+def test_parallel_preprocessing_matches_serial():
+    """Check that chunked multi-process preprocessing keeps the serial output and order."""
+    if not os.path.exists(DATA_PATH):
+        pytest.skip(f"Test data not found: {DATA_PATH}")
+
+    dataset = pd.read_csv(DATA_PATH, delimiter="\t", quoting=3)
+
+    serial = preprocess_data(dataset)
+    parallel = preprocess_data(dataset, workers=2, chunk_size=64)
+
+    identical = list(serial) == list(parallel)
+    log_metric(
+        "PARALLEL_PREPROCESSING_IDENTICAL",
+        identical,
+        message="Parallel preprocessing output matches the serial path",
+        category=category,
+    )
+    assert identical, "Parallel preprocessing output differs from the serial path"
+
+
+def test_streaming_preprocessing_matches_in_memory(tmp_path):
+    """Check that block-wise streaming writes the same TSV as the in-memory path."""
+    if not os.path.exists(DATA_PATH):
+        pytest.skip(f"Test data not found: {DATA_PATH}")
+
+    dataset = pd.read_csv(DATA_PATH, delimiter="\t", quoting=3)
+    in_memory_path = tmp_path / "in_memory.tsv"
+    streamed_path = tmp_path / "streamed.tsv"
+
+    processed_df = clean_processed(preprocess_data(dataset), dataset["Liked"])
+    processed_df.to_csv(in_memory_path, sep="\t", index=False)
+    preprocess_stream(DATA_PATH, streamed_path, block_size=128)
+
+    identical = in_memory_path.read_text() == streamed_path.read_text()
+    log_metric(
+        "STREAMING_PREPROCESSING_IDENTICAL",
+        identical,
+        message="Streamed preprocessing output matches the in-memory path",
+        category=category,
+    )
+    assert identical, "Streamed preprocessing output differs from the in-memory path"
+
+
+def test_streamed_blocks_handed_to_consumer(tmp_path):
+    """Check that the cleaned blocks passed to on_block are exactly the written TSV."""
+    raw_path = tmp_path / "raw.tsv"
+    streamed_path = tmp_path / "streamed.tsv"
+    reviews = ["Wow... Loved this place.", "Crust is not good.", "!!!"] * 20
+    pd.DataFrame({"Review": reviews, "Liked": [1, 0, 1] * 20}).to_csv(
+        raw_path, sep="\t", index=False
+    )
+
+    blocks = []
+    rows_written = preprocess_stream(
+        raw_path, streamed_path, block_size=16, on_block=blocks.append
+    )
+
+    consumed = pd.concat(blocks, ignore_index=True)
+    written = pd.read_csv(streamed_path, delimiter="\t")
+    assert len(blocks) == 4 and len(consumed) == rows_written
+    pd.testing.assert_frame_equal(consumed, written)
+
+
+def test_streaming_empty_input_writes_header(tmp_path):
+    """Check that streaming a dataset without rows still writes the TSV header."""
+    raw_path = tmp_path / "raw.tsv"
+    streamed_path = tmp_path / "streamed.tsv"
+    for content in ("Review\tLiked\n", ""):
+        raw_path.write_text(content)
+        assert preprocess_stream(raw_path, streamed_path, block_size=16) == 0
+        assert streamed_path.read_text() == "Review\tLiked\n"
+        streamed_path.unlink()
@@ -0,0 +1,124 @@
+"""Tests for map-reduce training by merging Naive Bayes sufficient statistics."""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+from sklearn.model_selection import train_test_split
+from sklearn.naive_bayes import GaussianNB
+from utils.log_metrics import log_metric
+
+from model_training import train
+from model_training.distributed import fit_shard, reduce_shards, shard_stats_path
+from model_training.features import SPLIT_PATHS, load_texts, save_texts, text_paths
+from model_training.naive_bayes import from_gaussian_nb, to_gaussian_nb
+
+category = "MODEL_DEVELOPMENT"
+
+
+def make_counts(n_rows=1000, n_features=40, seed=0):
+    """Build a count matrix whose rows depend on their binary label."""
+    rng = np.random.default_rng(seed)
+    y = rng.integers(0, 2, n_rows)
+    rates = np.where(y[:, np.newaxis] == 1, 0.3, 0.1) * np.linspace(0.5, 2, n_features)
+    return rng.poisson(rates).astype(np.uint8), y
+
+
+@pytest.fixture(name="training_files")
+def saved_training_files(tmp_path):
+    """Save a synthetic training set as .npy files."""
+    x, y = make_counts()
+    np.save(tmp_path / "features_train.npy", x)
+    np.save(tmp_path / "labels_train.npy", y)
+    return x, y, tmp_path
+
+
+def test_merged_shards_equal_full_fit(training_files):
+    """Check that merging the statistics of shards fitted in parallel gives the full fit."""
+    x, y, tmp_path = training_files
+    num_shards = 3
+    jobs = [
+        (
+            tmp_path / "features_train.npy",
+            tmp_path / "labels_train.npy",
+            shard_index,
+            num_shards,
+            tmp_path / "stats",
+            64,
+        )
+        for shard_index in range(num_shards)
+    ]
+    with ProcessPoolExecutor(max_workers=num_shards) as pool:
+        list(pool.map(fit_shard, *zip(*jobs)))
+    merged = reduce_shards(tmp_path / "stats")
+
+    x_train, x_test, y_train, _ = train_test_split(x, y, test_size=0.2, random_state=0)
+    full = GaussianNB().fit(x_train, y_train)
+
+    np.testing.assert_array_equal(merged.classes_, full.classes_)
+    np.testing.assert_array_equal(merged.class_count_, full.class_count_)
+    np.testing.assert_allclose(merged.class_prior_, full.class_prior_)
+    np.testing.assert_allclose(merged.theta_, full.theta_)
+    np.testing.assert_allclose(merged.var_, full.var_)
+    np.testing.assert_allclose(merged.epsilon_, full.epsilon_)
+    np.testing.assert_array_equal(merged.predict(x_test), full.predict(x_test))
+    np.testing.assert_allclose(
+        merged.predict_proba(x_test), full.predict_proba(x_test), atol=1e-10
+    )
+
+    log_metric(
+        "MERGED_MODEL_MAX_THETA_DIFF",
+        float(np.abs(merged.theta_ - full.theta_).max()),
+        precision=12,
+        message="Largest mean difference between merged shards and full fit",
+        category=category,
+    )
+
+
+def test_statistics_round_trip_through_model():
+    """Check that a fitted model can be turned back into its statistics."""
+    x, y = make_counts(n_rows=300)
+    full = GaussianNB().fit(x, y)
+    rebuilt = to_gaussian_nb(from_gaussian_nb(full))
+
+    np.testing.assert_allclose(rebuilt.var_, full.var_)
+    np.testing.assert_array_equal(rebuilt.predict(x), full.predict(x))
+
+
+def test_reduce_rejects_missing_shards(training_files):
+    """Check that the reducer refuses to merge an incomplete set of shards."""
+    _, _, tmp_path = training_files
+    fit_shard(
+        tmp_path / "features_train.npy",
+        tmp_path / "labels_train.npy",
+        0,
+        2,
+        tmp_path / "stats",
+    )
+    assert shard_stats_path(tmp_path / "stats", 0, 2).exists()
+    with pytest.raises(ValueError):
+        reduce_shards(tmp_path / "stats")
+
+
+def test_test_split_keeps_reviews_of_test_rows(training_files, monkeypatch):
+    """Check that the saved test split has the reviews of its own rows."""
+    x, y, tmp_path = training_files
+    save_texts([f"review {i}" for i in range(len(y))], text_paths(tmp_path)[0])
+    test_dir = tmp_path / "test"
+    monkeypatch.setattr(
+        train,
+        "SPLIT_PATHS",
+        tuple(test_dir / path.name for path in SPLIT_PATHS),
+    )
+
+    train.save_test_split(
+        tmp_path / "features_train.npy", tmp_path / "labels_train.npy"
+    )
+
+    _, x_test, _, y_test = train_test_split(x, y, test_size=0.2, random_state=0)
+    _, test_index = train.split_index(len(y))
+    np.testing.assert_array_equal(np.load(test_dir / "features_test.npy"), x_test)
+    np.testing.assert_array_equal(np.load(test_dir / "labels_test.npy"), y_test)
+    assert list(load_texts(text_paths(test_dir)[1])) == [
+        f"review {i}" for i in test_index
+    ]
@@ -0,0 +1,62 @@
+"""Tests for the sharded, memory-mapped feature store."""
+
+import numpy as np
+from scipy import sparse as sp
+
+from model_training.feature_store import FeatureStore, ShardedArray
+
+
+def test_store_round_trip_over_shards(tmp_path):
+    """Check that shards and views reproduce the stored array in row order."""
+    x = np.arange(250 * 4, dtype=np.int64).reshape(250, 4)
+    store = FeatureStore(tmp_path)
+    entry = store.write("features_train", x, shard_rows=100)
+
+    assert [shard["rows"] for shard in entry["shards"]] == [100, 100, 50]
+    assert store.names() == ["features_train"]
+    np.testing.assert_array_equal(
+        np.concatenate(list(store.iter_shards("features_train"))), x
+    )
+    np.testing.assert_array_equal(store.view("features_train", 90, 210), x[90:210])
+    np.testing.assert_array_equal(store.load("features_train"), x)
+
+
+def test_store_views_within_a_shard_are_memory_mapped(tmp_path):
+    """Check that rows inside one shard are served without copying them into RAM."""
+    store = FeatureStore(tmp_path)
+    store.write("features_test", np.ones((10, 3)), shard_rows=100)
+
+    view = store.view("features_test", 2, 8)
+    assert isinstance(view, np.memmap) or isinstance(view.base, np.memmap)
+    assert view.shape == (6, 3)
+
+
+def test_store_densifies_sparse_input_with_fixed_dtype(tmp_path):
+    """Check that sparse matrices are stored densely with the requested dtype."""
+    x = sp.random(40, 6, density=0.2, format="csr", random_state=0) * 5
+    store = FeatureStore(tmp_path)
+    store.write("features_train", x.astype(np.int64), shard_rows=16, dtype=np.uint8)
+
+    loaded = store.load("features_train")
+    assert loaded.dtype == np.uint8
+    np.testing.assert_array_equal(loaded, x.astype(np.int64).toarray())
+
+
+def test_store_loads_many_shards_lazily(tmp_path):
+    """Check that a multi-shard array is opened as a view over the shards, not a copy."""
+    x = np.arange(250 * 4, dtype=np.int64).reshape(250, 4)
+    store = FeatureStore(tmp_path)
+    store.write("features_train", x, shard_rows=100)
+
+    loaded = store.load("features_train")
+    assert isinstance(loaded, ShardedArray)
+    assert all(isinstance(shard, np.memmap) for shard in loaded.shards)
+    assert loaded.shape == x.shape and len(loaded) == 250
+
+    index = np.array([249, 0, 120, 120, -1])
+    np.testing.assert_array_equal(loaded[index], x[index])
+    np.testing.assert_array_equal(loaded[x[:, 0] % 3 == 0], x[x[:, 0] % 3 == 0])
+    np.testing.assert_array_equal(loaded[95:105, 1], x[95:105, 1])
+    np.testing.assert_array_equal(loaded[::7], x[::7])
+    np.testing.assert_array_equal(loaded[150], x[150])
+    assert isinstance(loaded[10:20].base, np.memmap)
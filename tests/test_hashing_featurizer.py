@@ -0,0 +1,70 @@
+"""Tests for the stateless hashing featurizer."""
+
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+from utils.log_metrics import log_metric
+
+from model_training.features import (
+    BlockVectorizer,
+    build_vectorizer,
+    check_vocab_state,
+    hash_transform,
+    transform_data,
+)
+
+category = "DATA_AND_FEATURES"
+
+CORPUS = [
+    "wow love place",
+    "crust not good",
+    "not tasti textur nasti",
+    "stop late may bank holiday rick steve recommend love",
+    "select menu great price",
+] * 40
+
+
+def test_parallel_hashing_matches_serial():
+    """Check that chunks hashed in worker processes give the serial feature matrix."""
+    vectorizer = build_vectorizer("hashing", n_features=256)
+    serial = hash_transform(vectorizer, CORPUS)
+    parallel = hash_transform(vectorizer, CORPUS, workers=2, chunk_size=32)
+
+    assert serial.shape == (len(CORPUS), 256)
+    np.testing.assert_array_equal(serial.toarray(), parallel.toarray())
+
+
+def test_hashing_counts_tokens_like_count_vectorizer(tmp_path):
+    """Check that hashed features hold raw counts and the saved artifact is small."""
+    dataset = pd.DataFrame({"Review": CORPUS, "Liked": [1, 0, 0, 1, 1] * 40})
+    bow_path = tmp_path / "bow.pkl"
+    x_hash, _ = transform_data(
+        dataset, bow_path, vectorizer=build_vectorizer("hashing")
+    )
+    x_count, _ = transform_data(dataset, None)
+
+    np.testing.assert_array_equal(x_hash.sum(axis=1), x_count.sum(axis=1))
+    with open(bow_path, "rb") as f:
+        assert pickle.load(f).transform(CORPUS[:1]).shape == (1, 4096)
+
+    artifact_bytes = bow_path.stat().st_size
+    log_metric(
+        "HASHING_ARTIFACT_BYTES",
+        artifact_bytes,
+        message="Size of the pickled HashingVectorizer",
+        category=category,
+    )
+    assert artifact_bytes < 2048
+
+
+def test_vocabulary_state_rejected_for_hashing(tmp_path):
+    """Check that a vocabulary state is not silently ignored by the hashing mode."""
+    state_path = tmp_path / "vocabulary.npz"
+    check_vocab_state("count", state_path)
+    check_vocab_state("hashing", None)
+    with pytest.raises(ValueError, match="count featurizer"):
+        check_vocab_state("hashing", state_path)
+    with pytest.raises(ValueError, match="count featurizer"):
+        BlockVectorizer(build_vectorizer("hashing"), state_path=state_path)
@@ -0,0 +1,196 @@
+"""Tests for the single-pass confusion-matrix metrics."""
+
+import time
+
+import numpy as np
+from sklearn.metrics import (
+    accuracy_score,
+    average_precision_score,
+    classification_report,
+    confusion_matrix,
+    f1_score,
+    precision_recall_curve,
+    precision_score,
+    recall_score,
+    roc_auc_score,
+    roc_curve,
+)
+from utils.log_metrics import log_metric
+
+from model_training.evaluate import (
+    LENGTH_EDGES,
+    bucket_slice,
+    cross_slices,
+    label_slice,
+    slice_report,
+)
+from model_training.metrics import (
+    ConfusionAccumulator,
+    binary_metrics,
+    bootstrap_intervals,
+    classification_report_text,
+    curve_summary,
+    grouped_confusion,
+    threshold_curves,
+)
+
+category = "MODEL_DEVELOPMENT"
+
+
+def test_chunked_metrics_match_sklearn():
+    """Check that metrics accumulated over chunks equal the sklearn metrics."""
+    rng = np.random.default_rng(0)
+    y_true = rng.integers(0, 2, 10_000)
+    y_pred = np.where(rng.random(10_000) < 0.8, y_true, 1 - y_true)
+
+    accumulator = ConfusionAccumulator()
+    for start in range(0, len(y_true), 999):
+        accumulator.update(y_true[start : start + 999], y_pred[start : start + 999])
+    cm = accumulator.matrix
+    np.testing.assert_array_equal(cm, confusion_matrix(y_true, y_pred))
+    assert classification_report_text(cm, accumulator.labels) == (
+        classification_report(y_true, y_pred)
+    )
+
+    metrics = binary_metrics(cm)
+    expected = {
+        "accuracy": accuracy_score(y_true, y_pred),
+        "precision": precision_score(y_true, y_pred),
+        "recall": recall_score(y_true, y_pred),
+        "f1": f1_score(y_true, y_pred),
+        "AUC ROC": roc_auc_score(y_true, y_pred),
+    }
+    for name, value in expected.items():
+        assert np.isclose(metrics[name], value), name
+
+
+def test_labels_seen_late_and_multiclass_report():
+    """Check that labels first seen in a later chunk are added to the matrix."""
+    y_true = np.array([0, 1, 1, 2, 2, 2, 0])
+    y_pred = np.array([0, 1, 0, 2, 1, 2, 2])
+    accumulator = ConfusionAccumulator()
+    accumulator.update(y_true[:3], y_pred[:3]).update(y_true[3:], y_pred[3:])
+    np.testing.assert_array_equal(accumulator.matrix, confusion_matrix(y_true, y_pred))
+    assert classification_report_text(
+        accumulator.matrix, accumulator.labels, digits=4
+    ) == classification_report(y_true, y_pred, digits=4)
+
+
+def test_single_pass_speedup():
+    """Compare one confusion-matrix pass against the separate sklearn calls."""
+    rng = np.random.default_rng(1)
+    y_true = rng.integers(0, 2, 1_000_000)
+    y_pred = rng.integers(0, 2, 1_000_000)
+
+    start = time.perf_counter()
+    for score in (accuracy_score, precision_score, recall_score, f1_score):
+        score(y_true, y_pred)
+    confusion_matrix(y_true, y_pred)
+    sklearn_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    binary_metrics(ConfusionAccumulator((0, 1)).update(y_true, y_pred).matrix)
+    single_pass_seconds = time.perf_counter() - start
+
+    log_metric(
+        "SINGLE_PASS_METRICS_SPEEDUP",
+        sklearn_seconds / single_pass_seconds,
+        message="Speedup of one confusion-matrix pass over separate sklearn metrics",
+        category=category,
+        precision=1,
+    )
+
+
+def test_threshold_curves_match_sklearn():
+    """Check the one-pass threshold sweep against the sklearn curves and areas."""
+    rng = np.random.default_rng(2)
+    y_true = rng.integers(0, 2, 5000)
+    scores = np.round(rng.random(5000) * 0.5 + y_true * 0.3, 3)
+
+    curves = threshold_curves(y_true, scores)
+    fpr, tpr, thresholds = roc_curve(y_true, scores, drop_intermediate=False)
+    np.testing.assert_allclose(curves["threshold"], thresholds[1:])
+    np.testing.assert_allclose(curves["fpr"], fpr[1:])
+    np.testing.assert_allclose(curves["tpr"], tpr[1:])
+    precision, _, pr_thresholds = precision_recall_curve(y_true, scores)
+    np.testing.assert_allclose(
+        curves["precision"][-len(pr_thresholds) :], precision[:-1][::-1]
+    )
+
+    summary = curve_summary(curves)
+    assert np.isclose(summary["AUC ROC"], roc_auc_score(y_true, scores))
+    assert np.isclose(
+        summary["average precision"], average_precision_score(y_true, scores)
+    )
+    best = scores >= summary["best threshold"]
+    assert np.isclose(summary["best threshold f1"], f1_score(y_true, best))
+    log_metric(
+        "THRESHOLD_SWEEP_POINTS",
+        len(curves["threshold"]),
+        message="Thresholds evaluated in one sorted pass",
+        category=category,
+    )
+
+
+def test_bootstrap_intervals():
+    """Check the multinomial bootstrap against resampling the rows themselves."""
+    rng = np.random.default_rng(3)
+    y_true = rng.integers(0, 2, 100_000)
+    y_pred = np.where(rng.random(100_000) < 0.8, y_true, 1 - y_true)
+    cm = confusion_matrix(y_true, y_pred)
+
+    start = time.perf_counter()
+    intervals = bootstrap_intervals(cm, n_resamples=10_000, workers=2)
+    seconds = time.perf_counter() - start
+    assert intervals == bootstrap_intervals(cm, n_resamples=10_000, workers=1)
+
+    accuracy = binary_metrics(cm)["accuracy"]
+    low, high = intervals["accuracy"]
+    assert low < accuracy < high
+    correct = y_true == y_pred
+    row_accuracies = [
+        correct[rng.integers(0, len(correct), len(correct))].mean() for _ in range(200)
+    ]
+    row_low, row_high = np.percentile(row_accuracies, [2.5, 97.5])
+    assert np.isclose(high - low, row_high - row_low, rtol=0.3)
+
+    log_metric(
+        "BOOTSTRAP_10K_SECONDS",
+        seconds,
+        message="Seconds for 10,000 bootstrap resamples of a 100k-row test set",
+        category=category,
+        precision=3,
+    )
+
+
+def test_slice_metrics_match_per_slice_sklearn():
+    """Check grouped slice metrics against sklearn on every bucket separately."""
+    rng = np.random.default_rng(4)
+    y_true = rng.integers(0, 2, 5000)
+    y_pred = np.where(rng.random(5000) < 0.7, y_true, 1 - y_true)
+    lengths = rng.integers(0, 60, 5000)
+    by_label = label_slice(y_true, np.array([0, 1]))
+    slices = {
+        "length": bucket_slice(lengths, LENGTH_EDGES),
+        "label & length": cross_slices(by_label, bucket_slice(lengths, LENGTH_EDGES)),
+    }
+
+    slice_cms = {
+        name: grouped_confusion(codes, len(names), y_true, y_pred, np.array([0, 1]))
+        for name, (codes, names) in slices.items()
+    }
+    report = slice_report(slice_cms, slices, np.array([0, 1]))
+    assert len(report) == 5 + 10
+    for row in report:
+        codes, names = slices[row["slice"]]
+        rows = codes == names.index(row["bucket"])
+        assert row["rows"] == rows.sum()
+        assert np.isclose(row["accuracy"], accuracy_score(y_true[rows], y_pred[rows]))
+        # Buckets of one true label are scored for that label
+        label = int(row["class"])
+        assert label == (int(row["bucket"][0]) if row["slice"] != "length" else 1)
+        assert np.isclose(
+            row["f1"],
+            f1_score(y_true[rows], y_pred[rows], pos_label=label, zero_division=0),
+        )
+        assert row["f1"] > 0
@@ -6,17 +6,17 @@ import tracemalloc
 import joblib
 import pandas as pd
 import pytest
-from lib_ml.preprocessing import Preprocessor
 from sklearn.feature_extraction.text import CountVectorizer
 from sklearn.metrics import accuracy_score
 from sklearn.model_selection import train_test_split
-from sklearn.naive_bayes import GaussianNB
 
+from model_training.evaluate import label_slice, score_blocks, slice_report
+from model_training.preprocessing import preprocess_data
 from utils.log_metrics import log_metric
 
 category = "MODEL_DEVELOPMENT"
 
-def test_model_prediction_accuracy(model_file):
+def test_model_prediction_accuracy(model_file, preprocess_cache):
     """
     Test the accuracy of the trained model on a test set.
 
@@ -28,8 +28,7 @@ def test_model_prediction_accuracy(model_file):
 
     classifier = joblib.load(model_file)
     dataset = pd.read_csv(data_path, delimiter="\t", quoting=3)
-    preprocessor = Preprocessor()
-    corpus = preprocessor.process(dataset)
+    corpus = preprocess_data(dataset, cache=preprocess_cache)
     vectorizer = joblib.load("bow/c1_BoW_Sentiment_Model.pkl")
     x = vectorizer.transform(corpus).toarray()
     y = dataset.iloc[:, -1].values
@@ -41,54 +40,31 @@ def test_model_prediction_accuracy(model_file):
     log_metric("MODEL_ACCURACY", acc, message="Accuracy on test set", category=category)
 
 
-def get_accuracy(corpus, labels):
-    """
-    Helper function to compute accuracy of a Naive Bayes classifier on a given corpus
-    and labels.
-
-    This function preprocesses the corpus, vectorizes it, and trains a Gaussian Naive
-    Bayes classifier. It returns the accuracy score on a test set.
-    """
-    corpus = [doc for doc in corpus if doc.strip()]
-    if len(corpus) < 5:
-        pytest.skip("Too few valid documents after preprocessing")
-    vectorizer = CountVectorizer(max_features=1420)
-    try:
-        x = vectorizer.fit_transform(corpus).toarray()
-    except ValueError as e:
-        pytest.skip(f"Vectorizer failed: {e}")
-    y = labels[: len(x)]
-    x_train, x_test, y_train, y_test = train_test_split(
-        x, y, test_size=0.2, random_state=0
-    )
-    clf = GaussianNB().fit(x_train, y_train)
-    return accuracy_score(y_test, clf.predict(x_test))
-
-
-def test_model_consistency_on_labels():
+def test_model_consistency_on_labels(model_file, preprocess_cache):
     """
     Test the model's performance on positive and negative samples.
 
     This test checks if the model performs similarly on both classes. It computes the
-    accuracy for positive and negative samples separately and asserts that the
-    difference in accuracy is less than 15%.
+    accuracy for positive and negative samples separately from one pass of the slicing
+    engine and asserts that the difference in accuracy is less than 15%.
     """
     data_path = "data/raw/a1_RestaurantReviews_HistoricDump.tsv"
     if not os.path.exists(data_path):
         pytest.skip(f"Test data not found: {data_path}")
 
+    classifier = joblib.load(model_file)
     df = pd.read_csv(data_path, delimiter="\t", quoting=3)
-    preprocessor = Preprocessor()
-    corpus = preprocessor.process(df)
-    df["cleaned"] = corpus
-
-    pos_df = df[df["Liked"] == 1].reset_index(drop=True)
-    neg_df = df[df["Liked"] == 0].reset_index(drop=True)
-    pos_corpus = pos_df["cleaned"].tolist()
-    neg_corpus = neg_df["cleaned"].tolist()
+    corpus = preprocess_data(df, cache=preprocess_cache)
+    vectorizer = joblib.load("bow/c1_BoW_Sentiment_Model.pkl")
+    x = vectorizer.transform(corpus)
+    y = df["Liked"].values
+    _, x_test, _, y_test = train_test_split(x, y, test_size=0.2, random_state=0)
 
-    acc_pos = get_accuracy(pos_corpus, pos_df["Liked"])
-    acc_neg = get_accuracy(neg_corpus, neg_df["Liked"])
+    slices = {"label": label_slice(y_test, classifier.classes_)}
+    _, _, slice_cms = score_blocks(classifier, x_test, y_test, slices=slices)
+    report = slice_report(slice_cms, slices)
+    accuracy = {row["bucket"]: row["accuracy"] for row in report}
+    acc_pos, acc_neg = accuracy["1"], accuracy["0"]
     print(f"[Slice Test] Accuracy Positive: {acc_pos:.2f}, Negative: {acc_neg:.2f}")
     log_metric("ACCURACY_POSITIVE", acc_pos, message="Accuracy on positive samples", category=category)
     log_metric("ACCURACY_NEGATIVE", acc_neg, message="Accuracy on negative samples", category=category)
@@ -97,7 +73,7 @@ def test_model_consistency_on_labels():
     ), f"Model performs differently on pos vs neg samples: {acc_pos:.2f} vs {acc_neg:.2f}"
 
 
-def test_model_prediction_determinism(model_file):
+def test_model_prediction_determinism(model_file, preprocess_cache):
     """
     Test that the model produces the same predictions on the same input across multiple
     runs.
@@ -110,8 +86,7 @@ def test_model_prediction_determinism(model_file):
 
     clf = joblib.load(model_file)
     dataset = pd.read_csv(data_path, delimiter="\t", quoting=3)
-    preprocessor = Preprocessor()
-    corpus = preprocessor.process(dataset)
+    corpus = preprocess_data(dataset, cache=preprocess_cache)
     vectorizer = joblib.load("bow/c1_BoW_Sentiment_Model.pkl")
     x = vectorizer.transform(corpus).toarray()
     y = dataset.iloc[:, -1].values
@@ -124,7 +99,7 @@ def test_model_prediction_determinism(model_file):
 
 
 
-def test_memory_usage_during_vectorization():
+def test_memory_usage_during_vectorization(preprocess_cache):
     """
     Test the memory usage during the vectorization process.
 
@@ -135,8 +110,7 @@ def test_memory_usage_during_vectorization():
         pytest.skip(f"Test data not found: {data_path}")
 
     df = pd.read_csv(data_path, delimiter="\t", quoting=3)
-    preprocessor = Preprocessor()
-    corpus = preprocessor.process(df)
+    corpus = preprocess_data(df, cache=preprocess_cache)
 
     vectorizer = CountVectorizer(max_features=1420)
     tracemalloc.start()
@@ -1,13 +1,14 @@
 """Unit tests as check that a model exists and can be run."""
 
 import os
+import shutil
 
-import joblib
 import numpy as np
 import pytest
 from sklearn.naive_bayes import GaussianNB
 
-from model_training.config import MODELS_DIR, PROCESSED_DATA_DIR
+from model_training import registry
+from model_training.config import PROCESSED_DATA_DIR
 from utils.log_metrics import log_metric
 
 # Define test model version (should match your training invocation)
@@ -17,12 +18,22 @@ category = "INFRASTRUCTURE_TESTING"
 
 @pytest.fixture(scope="module")
 def model_path():
-    path = MODELS_DIR / MODEL_VERSION / f"{MODEL_VERSION}_Sentiment_Model.pkl"
+    path = registry.model_path(MODEL_VERSION)
     if not path.exists():
         pytest.skip(f"Trained model not found at: {path}")
     return path
 
 
+@pytest.fixture(scope="module")
+def model_registry(model_path, tmp_path_factory):
+    """Registry of a temporary models directory holding a copy of the model."""
+    models_dir = tmp_path_factory.mktemp("models")
+    copy = registry.model_path(MODEL_VERSION, models_dir)
+    copy.parent.mkdir(parents=True)
+    shutil.copy(model_path, copy)
+    return registry.ModelRegistry(models_dir)
+
+
 def test_model_file_exists(model_path):
     """Check that the model file exists."""
     exists = os.path.exists(model_path)
@@ -30,22 +41,22 @@ def test_model_file_exists(model_path):
     assert exists, f"Model file not found: {model_path}"
 
 
-def test_model_can_be_loaded(model_path):
+def test_model_can_be_loaded(model_registry):
     """Check that the model file is loadable and of correct type."""
-    model = joblib.load(model_path)
+    model = model_registry.model(MODEL_VERSION)
     correct_type = isinstance(model, GaussianNB)
     assert correct_type, "Loaded model is not a GaussianNB instance"
     log_metric("MODEL_LOADABLE", correct_type, message="Model loaded and is GaussianNB", category=category)
 
 
-def test_model_can_predict(model_path):
+def test_model_can_predict(model_registry):
     """Optional: Load test features and check model predicts without error."""
     x_test_path = PROCESSED_DATA_DIR / "features_test.npy"
     if not x_test_path.exists():
         pytest.skip(f"Test features not found: {x_test_path}")
     x_test = np.load(x_test_path)
 
-    model = joblib.load(model_path)
+    model = model_registry.model(MODEL_VERSION)
     try:
         y_pred = model.predict(x_test)
         success = y_pred.shape[0] == x_test.shape[0]
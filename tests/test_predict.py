@@ -0,0 +1,107 @@
+"""Tests for batch prediction over streamed JSONL and TSV records."""
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from lib_ml.preprocessing import Preprocessor
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.naive_bayes import GaussianNB
+from utils.log_metrics import log_metric
+
+from model_training.predict import iter_batches, predict_stream
+
+category = "MONITORING_TESTING"
+
+REVIEWS = [
+    "Wow... Loved this place.",
+    "Crust is not good.",
+    "Not tasty and the texture was just nasty.",
+    "The selection on the menu was great and so were the prices.",
+    "Now I am getting angry and I want my damn pho.",
+    "Honeslty it didn't taste THAT fresh.)",
+    "The fries were great too.",
+]
+LABELS = [1, 0, 0, 1, 0, 0, 1]
+
+
+@pytest.fixture(name="predict")
+def fitted_predict():
+    """Fit a small model and return a function predicting preprocessed reviews."""
+    preprocessor = Preprocessor()
+    corpus = [preprocessor.process_item(review) for review in REVIEWS]
+    vectorizer = CountVectorizer()
+    classifier = GaussianNB().fit(vectorizer.fit_transform(corpus).toarray(), LABELS)
+    return lambda batch: classifier.predict(vectorizer.transform(batch).toarray())
+
+
+def test_jsonl_predictions_match_one_shot_scoring(tmp_path, predict):
+    """Check that micro-batched predictions equal scoring all records at once."""
+    input_path = tmp_path / "requests.jsonl"
+    with open(input_path, "w", encoding="utf-8") as f:
+        for i, review in enumerate(REVIEWS):
+            f.write(json.dumps({"id": i, "text": review}) + "\n")
+
+    batches = list(iter_batches(input_path, batch_size=3, text_field="text"))
+    assert [len(batch) for batch in batches] == [3, 3, 1]
+
+    output_path = tmp_path / "predictions.jsonl"
+    rows = predict_stream(input_path, output_path, predict, 3, "text")
+    with open(output_path, encoding="utf-8") as f:
+        results = [json.loads(line) for line in f]
+
+    preprocessor = Preprocessor()
+    expected = predict([preprocessor.process_item(review) for review in REVIEWS])
+    assert rows == len(REVIEWS)
+    assert [r["id"] for r in results] == list(range(len(REVIEWS)))
+    assert [r["prediction"] for r in results] == expected.tolist()
+
+    log_metric(
+        "BATCH_PREDICTION_ROWS",
+        rows,
+        message="Records scored by the streaming prediction CLI",
+        category=category,
+    )
+
+
+def test_tsv_predictions_are_streamed(tmp_path, predict):
+    """Check that a TSV input is scored in batches into a TSV output."""
+    input_path = tmp_path / "reviews.tsv"
+    pd.DataFrame({"Review": REVIEWS, "Liked": LABELS}).to_csv(
+        input_path, sep="\t", index=False
+    )
+
+    output_path = tmp_path / "predictions.tsv"
+    predict_stream(input_path, output_path, predict, batch_size=2)
+    results = pd.read_csv(output_path, delimiter="\t")
+
+    assert list(results.columns) == ["Review", "Liked", "prediction"]
+    assert len(results) == len(REVIEWS)
+    assert np.isin(results["prediction"], [0, 1]).all()
+
+
+def test_tsv_without_text_column_is_rejected(tmp_path, predict):
+    """Check that a TSV input missing the text field fails before scoring."""
+    input_path = tmp_path / "reviews.tsv"
+    pd.DataFrame({"text": REVIEWS}).to_csv(input_path, sep="\t", index=False)
+
+    with pytest.raises(ValueError, match="'Review' column"):
+        predict_stream(input_path, tmp_path / "predictions.tsv", predict)
+    assert not (tmp_path / "predictions.tsv").exists()
+
+
+def test_empty_input_creates_output(tmp_path, predict):
+    """Check that an input without records still writes an output file."""
+    input_path = tmp_path / "reviews.tsv"
+    pd.DataFrame({"Review": [], "Liked": []}).to_csv(input_path, sep="\t", index=False)
+    output_path = tmp_path / "predictions.tsv"
+
+    assert predict_stream(input_path, output_path, predict) == 0
+    results = pd.read_csv(output_path, delimiter="\t")
+    assert list(results.columns) == ["Review", "Liked", "prediction"]
+    assert results.empty
+
+    (tmp_path / "requests.jsonl").write_text("\n", encoding="utf-8")
+    predict_stream(tmp_path / "requests.jsonl", tmp_path / "out.jsonl", predict)
+    assert (tmp_path / "out.jsonl").read_text(encoding="utf-8") == ""
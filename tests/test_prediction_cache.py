@@ -0,0 +1,70 @@
+"""Tests for the LRU/TTL prediction cache."""
+
+import numpy as np
+from utils.log_metrics import log_metric
+
+from model_training.prediction_cache import PredictionCache, cached_predictor
+
+category = "INFRASTRUCTURE_TESTING"
+
+
+class CountingPredictor:
+    """Predicts the parity of the review length and records every scored review."""
+
+    def __init__(self):
+        self.scored = []
+
+    def __call__(self, corpus):
+        self.scored.extend(corpus)
+        return np.array([len(text) % 2 for text in corpus])
+
+
+def test_cached_predictions_match_and_skip_repeats():
+    """Check that repeated reviews are served from the cache with the same labels."""
+    predictor = CountingPredictor()
+    cache = PredictionCache("v_test")
+    predict = cached_predictor(predictor, cache)
+    corpus = ["love place", "crust good", "love place", "fri great", "crust good"]
+
+    first = predict(corpus)
+    second = predict(corpus)
+    np.testing.assert_array_equal(first, CountingPredictor()(corpus))
+    np.testing.assert_array_equal(second, first)
+    assert sorted(predictor.scored) == ["crust good", "fri great", "love place"]
+    assert cache.hits == len(corpus) and cache.misses == len(corpus)
+
+    log_metric(
+        "PREDICTION_CACHE_HIT_RATE",
+        cache.hit_rate,
+        message="Hit rate after scoring the same batch twice",
+        category=category,
+        precision=2,
+    )
+
+
+def test_lru_eviction_and_ttl():
+    """Check that the least recently used entry is evicted and old entries expire."""
+    now = [0.0]
+    cache = PredictionCache("v_test", capacity=2, ttl_seconds=10, clock=lambda: now[0])
+    cache.put_many(["a", "b"], np.array([0, 1]))
+    assert cache.get_many(["a"]) == [0]
+    cache.put_many(["c"], np.array([1]))
+    assert cache.get_many(["a", "b", "c"]) == [0, None, 1]
+    assert cache.evictions == 1
+
+    now[0] = 11.0
+    assert cache.get_many(["a", "c"]) == [None, None]
+    assert len(cache) == 0
+
+
+def test_persistence_between_runs(tmp_path):
+    """Check that saved predictions are reloaded for the same model version only."""
+    path = tmp_path / "prediction_cache.json"
+    cache = PredictionCache("v_test")
+    cache.put_many(["love place", "crust good"], np.array([1, 0]))
+    cache.save(path)
+
+    reloaded = PredictionCache("v_test")
+    assert reloaded.load(path) == 2
+    assert reloaded.get_many(["crust good", "love place"]) == [0, 1]
+    assert PredictionCache("v_other").load(path) == 0
@@ -0,0 +1,74 @@
+"""Unit tests for the on-disk cache of preprocessed reviews."""
+
+import pytest
+from utils.log_metrics import log_metric
+
+from model_training import preprocess_cache
+from model_training.preprocess_cache import PreprocessCache, open_cache
+
+category = "DATA_AND_FEATURES"
+
+
+def test_cache_hits_after_put(tmp_path):
+    """Check that stored reviews are served from the cache, also after reopening it."""
+    texts = ["Wow... Loved this place.", "Crust is not good."]
+    processed = ["wow love place", "crust not good"]
+
+    with PreprocessCache(tmp_path / "cache.sqlite", version="1.0.0") as cache:
+        assert cache.get_many(texts) == [None, None]
+        cache.put_many(texts, processed)
+
+    with PreprocessCache(tmp_path / "cache.sqlite", version="1.0.0") as cache:
+        values = cache.get_many(texts + ["Not tasty and the texture was just nasty."])
+        hit_rate = cache.hit_rate
+
+    assert values == processed + [None]
+    log_metric(
+        "PREPROCESS_CACHE_HIT_RATE",
+        hit_rate,
+        message="Hit rate after reopening",
+        category=category,
+    )
+    assert cache.hits == 2 and cache.misses == 1
+
+
+def test_cache_is_keyed_on_lib_ml_version(tmp_path):
+    """Check that entries written by another lib_ml version are not reused."""
+    with PreprocessCache(tmp_path / "cache.sqlite", version="1.0.0") as cache:
+        cache.put_many(["Crust is not good."], ["crust not good"])
+
+    with PreprocessCache(tmp_path / "cache.sqlite", version="2.0.0") as cache:
+        assert cache.get_many(["Crust is not good."]) == [None]
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    """Check that the cache stays within its size budget and keeps recently used entries."""
+    with PreprocessCache(
+        tmp_path / "cache.sqlite", max_bytes=150, version="1.0.0"
+    ) as cache:
+        cache.put_many(["first"], ["a" * 50])
+        cache.put_many(["second"], ["b" * 50])
+        cache.get_many(["first"])
+        cache.put_many(["third"], ["c" * 50])
+
+        assert cache.size_bytes() <= 150
+        # Replacing an entry must not count its old size twice
+        cache.put_many(["third", "third"], ["d" * 50, "d" * 50])
+        assert (
+            cache.size_bytes()
+            == cache._conn.execute("SELECT SUM(size) FROM entries").fetchone()[0]
+        )
+        assert cache.get_many(["first", "second", "third"]) == [
+            "a" * 50,
+            None,
+            "d" * 50,
+        ]
+
+
+def test_cache_disabled_without_lib_ml_version(tmp_path, monkeypatch):
+    """Check that the cache is not used when the lib_ml version is unknown."""
+    monkeypatch.setattr(preprocess_cache, "lib_ml_version", lambda: None)
+    assert open_cache(tmp_path / "cache.sqlite") is None
+    with pytest.raises(ValueError):
+        PreprocessCache(tmp_path / "cache.sqlite")
+    assert not (tmp_path / "cache.sqlite").exists()
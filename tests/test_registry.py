@@ -0,0 +1,99 @@
+"""Tests for the model registry and its LRU of loaded models."""
+
+import json
+import pickle
+import time
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.naive_bayes import GaussianNB
+from utils.log_metrics import log_metric
+
+from model_training.registry import ModelRegistry, file_sha256, metrics_path, model_path
+
+category = "INFRASTRUCTURE_TESTING"
+
+VERSIONS = ["v0.0.1", "v0.0.2", "v0.0.3"]
+
+
+@pytest.fixture(name="registry")
+def saved_versions(tmp_path):
+    """Save a few model versions, a vectorizer and one metrics file."""
+    rng = np.random.default_rng(0)
+    for version in VERSIONS:
+        path = model_path(version, tmp_path / "models")
+        path.parent.mkdir(parents=True)
+        x = rng.random((40, 5))
+        joblib.dump(GaussianNB().fit(x, rng.integers(0, 2, 40)), path)
+
+    bow_path = tmp_path / "models" / "bow.pkl"
+    with open(bow_path, "wb") as f:
+        pickle.dump(CountVectorizer().fit(["great place", "bad food"]), f)
+
+    (tmp_path / "reports").mkdir()
+    with open(metrics_path("v0.0.2", tmp_path / "reports"), "w", encoding="utf-8") as f:
+        json.dump({"accuracy": 0.75}, f)
+    return ModelRegistry(
+        tmp_path / "models", bow_path, tmp_path / "reports", capacity=2
+    )
+
+
+def test_manifest_lists_every_version(registry):
+    """Check that the manifest records the size, hash and metrics of every version."""
+    assert registry.versions() == []
+    registry.refresh()
+    assert registry.versions() == VERSIONS
+    entry = registry.entry("v0.0.2")
+    path = model_path("v0.0.2", registry.models_dir)
+    assert entry["size_bytes"] == path.stat().st_size
+    assert entry["sha256"] == file_sha256(path)
+    assert entry["metrics"] == {"accuracy": 0.75}
+    assert registry.entry("v0.0.1")["metrics"] is None
+
+    with open(registry.manifest_path, encoding="utf-8") as f:
+        saved = json.load(f)["models"]
+    assert [e["version"] for e in saved] == VERSIONS
+    with pytest.raises(KeyError):
+        registry.entry("v9.9.9")
+
+
+def test_models_are_loaded_once_and_evicted(registry):
+    """Check that models are loaded from their path, LRU cached and never indexed."""
+    classifier, vectorizer = registry.load("v0.0.1")
+    assert registry.load("v0.0.1") == (classifier, vectorizer)
+    registry.model("v0.0.2")
+    registry.model("v0.0.3")
+    assert registry.hits == 1 and registry.misses == 3
+    assert registry.model("v0.0.1") is not classifier
+    assert not registry.manifest_path.exists()
+    with pytest.raises(KeyError):
+        registry.model("v9.9.9")
+
+    start = time.perf_counter()
+    for _ in range(100):
+        for version in VERSIONS[1:]:
+            registry.model(version)
+    seconds = time.perf_counter() - start
+    log_metric(
+        "REGISTRY_CACHED_LOAD_US",
+        seconds / 200 * 1e6,
+        message="Microseconds per model lookup served from the LRU",
+        category=category,
+        precision=1,
+    )
+
+
+def test_vectorizers_are_evicted(registry, tmp_path):
+    """Check that vectorizers share the capacity of the LRU, like the models."""
+    paths = [tmp_path / f"bow_{i}.pkl" for i in range(3)]
+    for path in paths:
+        with open(path, "wb") as f:
+            pickle.dump(CountVectorizer().fit(["great place"]), f)
+
+    first = registry.vectorizer(paths[0])
+    assert registry.vectorizer(paths[0]) is first
+    registry.vectorizer(paths[1])
+    registry.vectorizer(paths[2])
+    assert registry.vectorizer(paths[0]) is not first
@@ -0,0 +1,78 @@
+"""Tests for the batched mutamorphic robustness module."""
+
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.naive_bayes import GaussianNB
+from utils.log_metrics import log_metric
+
+from model_training import robustness
+from model_training.robustness import (
+    add_irrelevant_info,
+    invert_labels,
+    invert_negation,
+    preprocess_texts,
+    replace_synonyms,
+    run_robustness,
+    shuffle_word_order,
+)
+
+category = "MUTAMORPHIC_TESTING"
+
+
+def test_transformations():
+    """Check every metamorphic relation on a whole column of texts."""
+    texts = ["the food was good", "not bad at all", "great"]
+    assert (
+        replace_synonyms(texts, {"good": "beneficial"})[0] == "the food was beneficial"
+    )
+    assert invert_negation(texts) == [
+        "the not food was good",
+        "bad at all",
+        "not great",
+    ]
+    shuffled = shuffle_word_order(texts, np.random.default_rng(0))
+    assert [sorted(s.split()) for s in shuffled] == [sorted(t.split()) for t in texts]
+    assert shuffled[0].startswith("the ") and shuffled[0].endswith(" good")
+
+    # One draw for the whole column, so the rows do not all get the same sentence
+    extended = add_irrelevant_info(["ok"] * 200, np.random.default_rng(0))
+    assert len(set(extended)) > 1
+    assert all(e.startswith("ok ") for e in extended)
+
+    assert invert_labels(np.array([0, 1, 1])).tolist() == [1, 0, 0]
+    assert invert_labels(np.array(["0", "1", "x"], dtype=object)).tolist() == [
+        "1",
+        "0",
+        "x",
+    ]
+
+
+def test_robustness_metrics_on_model(monkeypatch):
+    """Run the robustness test end to end, without WordNet."""
+    monkeypatch.setattr(robustness, "synonym_candidates", lambda word: ())
+    rng = np.random.default_rng(0)
+    positive = ["great tasty food", "lovely friendly staff", "amazing good place"]
+    negative = ["awful cold food", "rude slow staff", "terrible dirty place"]
+    labels = rng.integers(0, 2, 200)
+    texts = [" ".join(rng.choice(positive if y else negative, 2)) for y in labels]
+    df = pd.DataFrame({"text": texts, "label": labels})
+
+    processed = preprocess_texts(texts)
+    vectorizer = CountVectorizer(max_features=1420)
+    x = vectorizer.fit_transform([processed[text] for text in texts]).toarray()
+    model = GaussianNB().fit(x, labels)
+
+    results_df, values = run_robustness(model, df)
+    assert len(results_df) == len(df)
+    assert set(values) == set(robustness.METRICS)
+    assert 0.0 <= values["CONSISTENCY_RATE"] <= 1.0
+    negated = results_df.iloc[len(df) // 4 : len(df) // 2]
+    assert (negated["transformed_label"] != negated["original_label"]).all()
+
+    log_metric(
+        "ROBUSTNESS_CONSISTENCY_RATE",
+        values["CONSISTENCY_RATE"],
+        message="Same predictions before and after transformation on synthetic data",
+        category=category,
+    )
@@ -0,0 +1,96 @@
+"""Tests for the sparse matrix-multiply Naive Bayes scoring engine."""
+
+import time
+
+import numpy as np
+import pytest
+from scipy import sparse as sp
+from sklearn.naive_bayes import GaussianNB
+from utils.log_metrics import log_metric
+
+from model_training.evaluate import predict_in_blocks, score_blocks
+from model_training.scoring import NaiveBayesScorer
+
+category = "INFRASTRUCTURE_TESTING"
+
+
+@pytest.fixture(name="fitted")
+def fitted_model():
+    """Fit a model on sparse random term counts."""
+    rng = np.random.default_rng(0)
+    x = sp.random(
+        600,
+        400,
+        density=0.02,
+        format="csr",
+        random_state=1,
+        data_rvs=lambda n: rng.integers(1, 4, n),
+    )
+    y = rng.integers(0, 2, 600)
+    return GaussianNB().fit(x.toarray(), y), x
+
+
+def test_scorer_matches_sklearn(fitted):
+    """Check that sparse and dense scoring give sklearn's predictions and scores."""
+    classifier, x = fitted
+    dense = x.toarray()
+    scorer = NaiveBayesScorer.from_classifier(classifier)
+
+    for features in (x, dense):
+        np.testing.assert_array_equal(
+            scorer.predict(features), classifier.predict(dense)
+        )
+        np.testing.assert_allclose(
+            scorer.predict_proba(features),
+            classifier.predict_proba(dense),
+            atol=1e-9,
+        )
+    np.testing.assert_allclose(
+        scorer.joint_log_likelihood(x),
+        classifier.predict_joint_log_proba(dense),
+        rtol=1e-9,
+    )
+    np.testing.assert_array_equal(
+        predict_in_blocks(classifier, x, block_size=128), classifier.predict(dense)
+    )
+
+
+def test_scorer_built_once_per_evaluation(fitted, monkeypatch):
+    """Check that block-wise evaluation computes the per-class terms only once."""
+    classifier, x = fitted
+    calls = []
+    from_classifier = NaiveBayesScorer.from_classifier
+    monkeypatch.setattr(
+        NaiveBayesScorer,
+        "from_classifier",
+        lambda model: calls.append(model) or from_classifier(model),
+    )
+
+    y = classifier.predict(x.toarray())
+    accumulator, scores, _ = score_blocks(classifier, x, y, block_size=64, curves=True)
+    assert len(calls) == 1
+    assert np.trace(accumulator.matrix) == len(y) and len(scores) == len(y)
+
+
+def test_scorer_speedup(fitted):
+    """Compare sparse scoring against densifying and calling classifier.predict."""
+    classifier, x = fitted
+    scorer = NaiveBayesScorer.from_classifier(classifier)
+
+    start = time.perf_counter()
+    for _ in range(5):
+        classifier.predict(x.toarray())
+    dense_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(5):
+        scorer.predict(x)
+    sparse_seconds = time.perf_counter() - start
+
+    log_metric(
+        "SPARSE_SCORING_SPEEDUP",
+        dense_seconds / sparse_seconds,
+        message="Sparse scoring speedup over dense GaussianNB.predict",
+        category=category,
+        precision=1,
+    )
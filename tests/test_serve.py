@@ -0,0 +1,108 @@
+"""Tests for the asyncio inference server with dynamic request batching."""
+
+import asyncio
+import json
+
+from lib_ml.preprocessing import Preprocessor
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.naive_bayes import GaussianNB
+from utils.log_metrics import log_metric
+
+from model_training.loadtest import run_load
+from model_training.serve import DynamicBatcher, InferenceServer, make_scorer
+
+category = "INFRASTRUCTURE_TESTING"
+
+REVIEWS = [
+    "Wow... Loved this place.",
+    "Crust is not good.",
+    "Not tasty and the texture was just nasty.",
+    "The selection on the menu was great and so were the prices.",
+    "Now I am getting angry and I want my damn pho.",
+    "The fries were great too.",
+]
+LABELS = [1, 0, 0, 1, 0, 1]
+
+
+def fitted_predict():
+    """Fit a small model and return a function predicting preprocessed reviews."""
+    preprocessor = Preprocessor()
+    corpus = [preprocessor.process_item(review) for review in REVIEWS]
+    vectorizer = CountVectorizer()
+    classifier = GaussianNB().fit(vectorizer.fit_transform(corpus).toarray(), LABELS)
+    return lambda batch: classifier.predict(vectorizer.transform(batch).toarray())
+
+
+async def load_test_server(n_requests, concurrency):
+    """Start a server on a free port, load test it and shut it down."""
+    score = make_scorer(fitted_predict())
+    batcher = DynamicBatcher(score, max_batch_size=16, max_delay_ms=5)
+    inference = InferenceServer(batcher, "v_test")
+    server = await inference.start("127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        report, predictions = await run_load(
+            "127.0.0.1", port, REVIEWS, n_requests, concurrency
+        )
+    await inference.stop()
+    return report, predictions, batcher, score(REVIEWS)
+
+
+def test_concurrent_requests_are_batched():
+    """Check that concurrent requests are answered correctly and scored together."""
+    report, predictions, batcher, expected = asyncio.run(load_test_server(120, 12))
+
+    assert predictions == [expected[i % len(REVIEWS)] for i in range(120)]
+    assert batcher.requests == 120
+    assert batcher.batches < 120
+    assert report["p50_ms"] <= report["p99_ms"]
+
+    log_metric(
+        "SERVER_MEAN_BATCH_SIZE",
+        batcher.mean_batch_size,
+        precision=2,
+        message="Average number of concurrent requests scored together",
+        category=category,
+    )
+
+
+async def post(port, body):
+    """Send one POST /predict and return the status code and JSON response."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"POST /predict HTTP/1.1\r\nContent-Length: {len(body)}\r\n"
+        f"Connection: close\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, data = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(data)
+
+
+async def failing_server():
+    """Serve with a scorer that fails on one review, then shut the server down."""
+
+    def score(texts):
+        if "fail" in texts:
+            raise RuntimeError("scorer broke")
+        return [len(text) for text in texts]
+
+    batcher = DynamicBatcher(score, max_batch_size=1)
+    inference = InferenceServer(batcher, "v_test")
+    server = await inference.start("127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        failed = await post(port, b'{"Review": "fail"}')
+        scored = await post(port, b'{"Review": "good"}')
+    await inference.stop()
+    return failed, scored, batcher
+
+
+def test_scoring_errors_answer_500_and_stop_shuts_down():
+    """Check that a failing batch gets a 500 and that stop releases the worker."""
+    failed, scored, batcher = asyncio.run(failing_server())
+
+    assert failed == (500, {"error": "Scoring failed"})
+    assert scored == (200, {"prediction": 4})
+    assert batcher._executor._shutdown
@@ -0,0 +1,154 @@
+"""Tests for the sparse bag-of-words path through splitting, training and evaluation."""
+
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse as sp
+from sklearn.naive_bayes import GaussianNB
+from utils.log_metrics import log_metric
+
+from model_training.evaluate import predict_in_blocks
+from model_training.feature_store import FeatureStore
+from model_training.features import (
+    BlockVectorizer,
+    TextSpool,
+    compact_counts,
+    load_features,
+    load_texts,
+    save_features,
+    split_data,
+    text_paths,
+    vectorize_and_split,
+)
+from model_training.train import fit_in_blocks, split_index, split_texts
+
+category = "DATA_AND_FEATURES"
+
+
+def make_counts(n_rows=500, n_features=60, seed=0):
+    """Build a mostly-zero count matrix with binary labels."""
+    rng = np.random.default_rng(seed)
+    x = rng.poisson(0.05, size=(n_rows, n_features))
+    y = rng.integers(0, 2, n_rows)
+    return x, y
+
+
+def test_sparse_split_matches_dense(tmp_path):
+    """Check that a CSR matrix is split and stored without densifying or reordering."""
+    x, y = make_counts()
+    dense_splits = split_data(x, y, test_size=0.2, random_state=1)
+    sparse_splits = split_data(sp.csr_matrix(x), y, test_size=0.2, random_state=1)
+
+    for dense, sparse in zip(dense_splits[:2], sparse_splits[:2]):
+        assert sp.issparse(sparse)
+        path = save_features(tmp_path / "features.npy", sparse)
+        assert path.suffix == ".npz"
+        np.testing.assert_array_equal(load_features(path).toarray(), dense)
+
+    sparse_bytes = path.stat().st_size
+    dense_bytes = save_features(tmp_path / "dense.npy", dense_splits[1]).stat().st_size
+    log_metric(
+        "SPARSE_STORAGE_RATIO",
+        sparse_bytes / dense_bytes,
+        precision=4,
+        message="Size of the sparse test features relative to the dense .npy",
+        category=category,
+    )
+
+
+def test_sparse_training_matches_dense():
+    """Check that block-wise training and prediction on CSR input match the dense fit."""
+    x, y = make_counts()
+    dense = GaussianNB().fit(x, y)
+    blocked = fit_in_blocks(GaussianNB(), sp.csr_matrix(x), y, block_size=64)
+
+    np.testing.assert_allclose(blocked.theta_, dense.theta_)
+    np.testing.assert_allclose(blocked.var_, dense.var_, rtol=1e-6)
+    np.testing.assert_array_equal(
+        predict_in_blocks(blocked, sp.csr_matrix(x), block_size=64), dense.predict(x)
+    )
+
+
+def test_compact_counts_picks_smallest_dtype():
+    """Check that counts are narrowed to uint8/uint16 and overflow is refused."""
+    x, _ = make_counts()
+    assert compact_counts(x).dtype == np.uint8
+    assert compact_counts(sp.csr_matrix(x)).dtype == np.uint8
+
+    x[0, 0] = 300
+    assert compact_counts(x).dtype == np.uint16
+    with pytest.raises(ValueError):
+        compact_counts(x, "uint8")
+
+
+def test_compact_counts_do_not_change_the_model():
+    """Check that a model fit on uint8 counts equals the one fit on int64 counts."""
+    x, y = make_counts()
+    compact = compact_counts(x)
+    reference = GaussianNB().fit(x, y)
+    model = GaussianNB().fit(compact, y)
+
+    np.testing.assert_array_equal(model.theta_, reference.theta_)
+    np.testing.assert_array_equal(model.var_, reference.var_)
+    np.testing.assert_array_equal(model.predict(compact), reference.predict(x))
+    log_metric(
+        "COMPACT_DTYPE_SIZE_RATIO",
+        compact.nbytes / x.nbytes,
+        precision=4,
+        message="Size of uint8 count features relative to int64",
+        category=category,
+    )
+
+
+def test_saved_reviews_follow_their_feature_rows(tmp_path):
+    """Check that the reviews of every split are saved in the order of its features."""
+    rng = np.random.default_rng(0)
+    terms = [f"term{i}" for i in range(50)]
+    dataset = pd.DataFrame(
+        {
+            "Review": [" ".join(rng.choice(terms, 6)) for _ in range(300)],
+            "Liked": rng.integers(0, 2, 300),
+        }
+    )
+
+    blocks = BlockVectorizer()
+    for start in range(0, len(dataset), 70):
+        blocks.add(dataset[start : start + 70])
+    assert isinstance(blocks.texts, TextSpool) and len(blocks.texts) == len(dataset)
+    for name, source in (("frame", dataset), ("blocks", blocks)):
+        store = FeatureStore(tmp_path / name)
+        vectorize_and_split(source, tmp_path / f"{name}.pkl", store=store)
+        with open(tmp_path / f"{name}.pkl", "rb") as f:
+            vectorizer = pickle.load(f)
+        for split, path in zip(("train", "test"), text_paths(store.root)):
+            texts = load_texts(path)
+            np.testing.assert_array_equal(
+                vectorizer.transform(texts).toarray(),
+                store.load(f"features_{split}"),
+            )
+
+    # Training splits off its own test set and saves its reviews alongside
+    texts_train = load_texts(text_paths(store.root)[0])
+    split_texts(len(texts_train), store.root, tmp_path / "train")
+    _, test_index = split_index(len(texts_train))
+    assert load_texts(text_paths(tmp_path / "train")[1]).tolist() == (
+        texts_train.iloc[test_index].tolist()
+    )
+    split_texts(len(texts_train) + 1, store.root, tmp_path / "train")
+    assert not text_paths(tmp_path / "train")[1].exists()
+
+
+def test_text_spool_reads_rows_back_in_any_order():
+    """Check that spooled texts are read back by row number, including empty ones."""
+    texts = ["crust not good", "", "wow love place", "naïve café"] * 3
+    spool = TextSpool()
+    spool.extend(texts[:5])
+    spool.extend([])
+    spool.extend(texts[5:])
+
+    index = np.array([11, 0, 1, 3, 3, 7])
+    assert len(spool) == len(texts)
+    assert spool.take(index) == [texts[i] for i in index]
+    spool.close()
@@ -0,0 +1,77 @@
+"""Tests for out-of-core training with partial_fit over streamed feature chunks."""
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+from sklearn.naive_bayes import GaussianNB
+from utils.log_metrics import log_metric
+
+from model_training.feature_store import FeatureStore
+from model_training.train import copy_rows, fit_chunks, stream_features, train_streaming
+from model_training.warm_start import row_hashes
+
+category = "MODEL_DEVELOPMENT"
+
+
+def make_counts(n_rows=1000, n_features=40, seed=0):
+    """Build a count matrix whose rows depend on their binary label."""
+    rng = np.random.default_rng(seed)
+    y = rng.integers(0, 2, n_rows)
+    rates = np.where(y[:, np.newaxis] == 1, 0.3, 0.1) * np.linspace(0.5, 2, n_features)
+    return rng.poisson(rates).astype(np.uint8), y
+
+
+def test_streamed_fit_matches_single_fit(tmp_path):
+    """Check that partial_fit over mmap chunks reproduces the split and the model."""
+    x, y = make_counts()
+    np.save(tmp_path / "features.npy", x)
+    x_train, x_test, y_train, _ = train_test_split(x, y, test_size=0.2, random_state=0)
+    single = GaussianNB().fit(x_train, y_train)
+
+    shape, dtype, chunks = stream_features(tmp_path / "features.npy", chunk_size=97)
+    train_index, test_index = train_test_split(
+        np.arange(shape[0]), test_size=0.2, random_state=0
+    )
+    keep = np.zeros(shape[0], dtype=bool)
+    keep[train_index] = True
+    streamed_test = np.empty((len(test_index), shape[1]), dtype=dtype)
+    streamed = fit_chunks(
+        GaussianNB(), copy_rows(chunks, test_index, streamed_test), y, keep
+    )
+
+    np.testing.assert_array_equal(streamed_test, x_test)
+    np.testing.assert_allclose(streamed.theta_, single.theta_)
+    np.testing.assert_allclose(streamed.var_, single.var_)
+    np.testing.assert_allclose(streamed.epsilon_, single.epsilon_)
+    np.testing.assert_array_equal(streamed.predict(x_test), single.predict(x_test))
+
+    log_metric(
+        "STREAMED_FIT_MAX_VAR_DIFF",
+        float(np.abs(streamed.var_ - single.var_).max()),
+        precision=12,
+        message="Largest variance difference between streamed and single fit",
+        category=category,
+    )
+
+
+def test_streamed_training_from_feature_store(tmp_path):
+    """Check that stream mode reads store shards and writes the test split to it."""
+    x, y = make_counts()
+    store = FeatureStore(tmp_path / "store")
+    store.write("features_train", x, shard_rows=300)
+
+    classifier, x_test, y_test, train_hashes = train_streaming(
+        None, y, store, chunk_size=128, record_rows=True
+    )
+    x_train, expected_test, y_train, expected_labels = train_test_split(
+        x, y, test_size=0.2, random_state=0
+    )
+
+    np.testing.assert_array_equal(store.load("features_test"), expected_test)
+    np.testing.assert_array_equal(store.load("labels_test"), expected_labels)
+    np.testing.assert_array_equal(x_test, expected_test)
+    np.testing.assert_array_equal(y_test, expected_labels)
+    np.testing.assert_array_equal(classifier.class_count_, np.bincount(y_train))
+    np.testing.assert_array_equal(
+        np.sort(train_hashes), np.sort(row_hashes(x_train, y_train))
+    )
+    assert not list(store.root.glob("*.tmp.npy"))
@@ -0,0 +1,103 @@
+"""Tests for the incrementally updated bag-of-words vocabulary."""
+
+import json
+import random
+
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import CountVectorizer
+from utils.log_metrics import log_metric
+
+from model_training.features import BlockVectorizer, build_vectorizer
+from model_training.vocabulary import incremental_vectorizer
+
+category = "DATA_AND_FEATURES"
+
+
+def make_corpus(n_docs=1200, n_terms=300, seed=1):
+    """Build reviews with a skewed term distribution and plenty of count ties."""
+    rng = random.Random(seed)
+    terms = [f"term{i}" for i in range(n_terms)]
+    weights = [1 / (i + 1) for i in range(n_terms)]
+    return [
+        " ".join(rng.choices(terms, weights, k=rng.randint(0, 10)))
+        for _ in range(n_docs)
+    ]
+
+
+def test_incremental_vocabulary_matches_full_refit(tmp_path):
+    """Check that updating batch by batch yields the vocabulary of a full refit."""
+    corpus = make_corpus()
+    state_path = tmp_path / "vocabulary.npz"
+
+    for stop in (400, 400, 900, len(corpus)):
+        vectorizer = incremental_vectorizer(corpus[:stop], state_path, max_features=40)
+
+    full = CountVectorizer(max_features=40).fit(corpus)
+    assert list(vectorizer.get_feature_names_out()) == list(
+        full.get_feature_names_out()
+    )
+    assert (vectorizer.transform(corpus) != full.transform(corpus)).nnz == 0
+
+
+def test_incremental_vocabulary_reports_changed_columns(tmp_path):
+    """Check that the change report lists the columns whose term moved."""
+    corpus = make_corpus()
+    state_path = tmp_path / "vocabulary.npz"
+
+    before = incremental_vectorizer(corpus[:300], state_path, max_features=40)
+    after = incremental_vectorizer(corpus, state_path, max_features=40)
+    with open(tmp_path / "vocabulary.changes.json", encoding="utf-8") as f:
+        changes = json.load(f)
+
+    old_terms = before.get_feature_names_out()
+    new_terms = after.get_feature_names_out()
+    expected = [i for i in range(40) if old_terms[i] != new_terms[i]]
+    assert changes["changed_columns"] == expected
+    assert set(changes["added_terms"]) == set(new_terms) - set(old_terms)
+    log_metric(
+        "VOCABULARY_CHANGED_COLUMNS",
+        len(expected),
+        message="Columns changed after adding reviews",
+        category=category,
+    )
+
+
+def stream_blocks(vectorizer, corpus, starts):
+    """Feed the corpus to vectorizer in blocks beginning at starts."""
+    for start, stop in zip(starts, list(starts[1:]) + [len(corpus)]):
+        block = corpus[start:stop]
+        vectorizer.add(pd.DataFrame({"Review": block, "Liked": [1] * len(block)}))
+    return vectorizer.finish()
+
+
+def test_block_vectorizer_matches_full_fit(tmp_path):
+    """Check that block-wise counting gives the counts of a fit on the whole corpus."""
+    corpus = make_corpus()
+    corpus[500:520] = [""] * 20
+    starts = [0, 333, 500, 520, 1001]
+
+    full = CountVectorizer(max_features=40)
+    expected = full.fit_transform(corpus)
+    vectorizer, x, y = stream_blocks(
+        BlockVectorizer(CountVectorizer(max_features=40)), corpus, starts
+    )
+    assert list(vectorizer.get_feature_names_out()) == list(
+        full.get_feature_names_out()
+    )
+    assert (x != expected).nnz == 0 and len(y) == len(corpus)
+
+    hashing = build_vectorizer("hashing", n_features=64)
+    _, hashed, _ = stream_blocks(BlockVectorizer(hashing), corpus, starts)
+    assert (hashed != hashing.transform(corpus)).nnz == 0
+
+    # Persisted statistics only take the rows after the ones already counted
+    state_path = tmp_path / "vocabulary.npz"
+    incremental_vectorizer(corpus[:600], state_path, max_features=40)
+    updated, x, _ = stream_blocks(
+        BlockVectorizer(CountVectorizer(max_features=40), state_path=state_path),
+        corpus,
+        starts,
+    )
+    assert np.array_equal(updated.get_feature_names_out(), full.get_feature_names_out())
+    assert (x != expected).nnz == 0
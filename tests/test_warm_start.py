@@ -0,0 +1,81 @@
+"""Tests for warm-start retraining from a previous model version."""
+
+import numpy as np
+from scipy import sparse as sp
+from sklearn.model_selection import train_test_split
+from sklearn.naive_bayes import GaussianNB
+from utils.log_metrics import log_metric
+
+from model_training.warm_start import row_hashes, warm_start
+
+category = "MODEL_DEVELOPMENT"
+
+
+def make_counts(n_rows, n_features=40, seed=0):
+    """Build a count matrix whose rows depend on their binary label."""
+    rng = np.random.default_rng(seed)
+    y = rng.integers(0, 2, n_rows)
+    rates = np.where(y[:, np.newaxis] == 1, 0.3, 0.1) * np.linspace(0.5, 2, n_features)
+    return rng.poisson(rates).astype(np.uint8), y
+
+
+def fit_version(x, y):
+    """Train a version as train.py does and return the model, splits and record."""
+    x_train, x_test, y_train, y_test = train_test_split(
+        x, y, test_size=0.2, random_state=0
+    )
+    model = GaussianNB().fit(x_train, y_train)
+    return model, (x_train, y_train), (x_test, y_test), row_hashes(x_train, y_train)
+
+
+def test_warm_start_equals_full_retrain():
+    """Check that updating the previous version with appended reviews gives a full fit."""
+    x_old, y_old = make_counts(800)
+    x_new, y_new = make_counts(200, seed=1)
+    previous, _, _, previous_rows = fit_version(x_old, y_old)
+
+    x, y = np.concatenate([x_old, x_new]), np.concatenate([y_old, y_new])
+    full, train_split, test_split, train_hashes = fit_version(x, y)
+    warm = warm_start(previous, previous_rows, train_hashes, train_split, test_split)
+
+    np.testing.assert_array_equal(warm.class_count_, full.class_count_)
+    np.testing.assert_allclose(warm.theta_, full.theta_)
+    np.testing.assert_allclose(warm.var_, full.var_)
+    np.testing.assert_allclose(warm.epsilon_, full.epsilon_)
+    np.testing.assert_array_equal(
+        warm.predict(test_split[0]), full.predict(test_split[0])
+    )
+
+    log_metric(
+        "WARM_START_MAX_VAR_DIFF",
+        float(np.abs(warm.var_ - full.var_).max()),
+        precision=12,
+        message="Largest variance difference between warm start and full retrain",
+        category=category,
+    )
+
+
+def test_warm_start_falls_back_when_rows_disappear():
+    """Check that a full retrain is requested when old training rows were deleted."""
+    x, y = make_counts(800)
+    previous, _, _, previous_rows = fit_version(x, y)
+    _, train_split, test_split, train_hashes = fit_version(x[100:], y[100:])
+
+    assert (
+        warm_start(previous, previous_rows, train_hashes, train_split, test_split)
+        is None
+    )
+
+
+def test_row_hashes_ignore_storage():
+    """Check that a row hashes the same whether stored dense, sparse or as floats."""
+    x, y = make_counts(500)
+    hashes = row_hashes(x, y, block_size=64)
+
+    np.testing.assert_array_equal(row_hashes(sp.csr_matrix(x), y), hashes)
+    np.testing.assert_array_equal(row_hashes(x.astype(np.float32), y), hashes)
+    assert len(np.unique(hashes)) == len(np.unique(np.column_stack([x, y]), axis=0))
+
+    # Moving a value to another column or changing the label changes the hash
+    moved = row_hashes(np.array([[1, 2, 0], [2, 1, 0], [1, 2, 0]]), [1, 1, 0])
+    assert len(np.unique(moved)) == 3